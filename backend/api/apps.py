@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from .utils.db_tuning import configure_sqlite
+        from .utils.metrics import install_query_counter
+        from .utils.query_budget import install_query_recorder
+        from .utils.serializer_cache import check_shared_cache
+
+        # Tune every SQLite connection (WAL, busy timeout, ...) as it is opened
+        connection_created.connect(configure_sqlite, dispatch_uid='api.configure_sqlite')
+        # Count each request's queries for the metrics endpoint
+        connection_created.connect(install_query_counter, dispatch_uid='api.install_query_counter')
+        # Record each request's queries for budgets and N+1 detection
+        connection_created.connect(install_query_recorder, dispatch_uid='api.install_query_recorder')
+        # Warn about a per-process serializer cache in deployment checks
+        checks.register(check_shared_cache, checks.Tags.caches, deploy=True)
@@ -0,0 +1,282 @@
+"""
+Async views for the mask_generator API.
+
+These are ASGI-native variants of the upload, mask-save and list endpoints in
+views.py. They accept and return the same payloads, but never block the event
+loop: image decoding runs in a bounded decode pool, file writes run in an I/O
+thread pool and database access uses Django's async ORM. Under an ASGI server
+one worker can keep hundreds of slow uploads in flight.
+
+DRF's APIView is synchronous, so these are plain Django views and render
+with FastJSONRenderer directly.
+"""
+import contextlib
+import os
+import tempfile
+import time
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from .models import Image, Mask, ImageLease, image_storage, mask_storage
+from .serializers import ImageSerializer, MaskSerializer
+from .renderers import FastJSONRenderer
+from .utils.image_processing import process_image_file
+from .utils.conditional import conditional_on
+from .utils.idempotency import idempotent, unhandled
+from .utils.query_budget import query_budget
+from .utils.async_offload import run_decode, run_io, run_storage
+from .utils import serializer_cache
+from .utils import work_queue
+from .utils import admission
+from .utils import metrics
+from .utils import timing
+from .views import filter_images, get_sparse_options, expanded_tables
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """Render data as a JSON response."""
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status_code, content_type='application/json'
+    )
+
+
+@contextlib.asynccontextmanager
+async def upload_on_disk(uploaded_file):
+    """
+    Provide the path of an upload's contents on disk, without reading it into memory.
+
+    Large uploads are already spooled to a temporary file by Django's upload
+    handlers; smaller ones are copied to one chunk by chunk in the I/O pool
+    and removed afterwards.
+    """
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        yield uploaded_file.temporary_file_path()
+        return
+
+    def spool():
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as spooled:
+            for chunk in uploaded_file.chunks():
+                spooled.write(chunk)
+        return spooled.name
+
+    path = await run_io(spool)
+    try:
+        yield path
+    finally:
+        await run_io(os.remove, path)
+
+
+class AsyncAPIView(View):
+    """
+    Base class for the async API views.
+
+    Like DRF's APIView, views are exempt from CSRF checks; the multipart body
+    is parsed off the event loop before the handler runs.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def parse_body(self, request):
+        """Parse request.POST/request.FILES in the I/O pool."""
+        with timing.phase('parse'):
+            await run_io(lambda: request.FILES)
+
+
+class AsyncImageUploadView(AsyncAPIView):
+    """
+    Async variant of ImageUploadView.
+
+    The upload is read and written in the I/O pool and MPO conversion and
+    metadata extraction run in the decode pool, once admitted against the
+    upload pixel budget.
+    """
+    http_method_names = ['post', 'options']
+
+    @query_budget(14)
+    @idempotent('image-upload')
+    async def post(self, request, format=None):
+        await self.parse_body(request)
+
+        # Check if a file was uploaded
+        if 'file' not in request.FILES:
+            return json_response({'error': 'No file provided'}, status.HTTP_400_BAD_REQUEST)
+
+        uploaded_file = request.FILES['file']
+
+        # Validate file type
+        if not (uploaded_file.content_type.startswith('image/jpeg') or
+                uploaded_file.name.lower().endswith('.mpo')):
+            return json_response({'error': 'Invalid file type. Only JPEG and MPO images are supported.'},
+                                 status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Decode off the event loop - convert MPO to JPEG if needed and extract metadata
+            pixels = await run_io(admission.estimate_pixels, uploaded_file)
+            metrics.UPLOAD_BYTES.observe(uploaded_file.size)
+            metrics.UPLOAD_PIXELS.observe(pixels)
+            async with upload_on_disk(uploaded_file) as path, admission.get_budget().aadmit(pixels):
+                with timing.phase('decode'):
+                    started = time.perf_counter()
+                    converted, name, metadata = await run_decode(process_image_file, path, uploaded_file.name)
+                    decode_seconds = time.perf_counter() - started
+
+            # Check if the file was originally MPO
+            is_mpo = uploaded_file.name.lower().endswith('.mpo') or metadata.get('format') == 'MPO'
+            metrics.DECODE_SECONDS.observe(decode_seconds, format='mpo' if is_mpo else 'jpeg')
+
+            # Write the file in the I/O pool; the row then just references it
+            content = ContentFile(converted, name=name) if converted is not None else uploaded_file
+            with timing.phase('storage'):
+                stored_name = await run_storage(image_storage, image_storage.save, name, content)
+
+            image = Image(
+                file=stored_name,
+                original_filename=uploaded_file.name,
+                width=metadata['width'],
+                height=metadata['height'],
+                is_mpo=is_mpo,
+            )
+            image.set_metadata(metadata)
+            with timing.phase('db'):
+                await image.asave()
+
+            with timing.phase('serialize'):
+                payload = ImageSerializer(image).data
+            return json_response(payload, status.HTTP_201_CREATED)
+
+        except admission.Saturated as e:
+            metrics.ADMISSION_REJECTED.inc()
+            response = json_response({'error': str(e)}, status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception as e:
+            # Handle any errors during processing or saving
+            return unhandled(json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST))
+
+
+class AsyncMaskSaveView(AsyncAPIView):
+    """
+    Async variant of MaskSaveView.
+
+    The mask file is written off the event loop (see run_storage) under the
+    same paired name Mask.save() would give it.
+    """
+    http_method_names = ['post', 'options']
+
+    @query_budget(32)  # Includes the pack index write with MASK_PACK_STORE
+    @idempotent('mask-save')
+    async def post(self, request, format=None):
+        await self.parse_body(request)
+
+        # Validate required fields are present
+        errors = {}
+
+        if 'file' not in request.FILES:
+            errors['file'] = ["No mask file provided"]
+
+        if 'image' not in request.POST:
+            errors['image'] = ["Image ID is required"]
+
+        if errors:
+            return json_response(errors, status.HTTP_400_BAD_REQUEST)
+
+        # Validate image ID exists
+        try:
+            with timing.phase('db'):
+                image = await Image.objects.aget(pk=request.POST.get('image'))
+        except (Image.DoesNotExist, ValueError):
+            return json_response({'image': ["Image with this ID does not exist"]},
+                                 status.HTTP_400_BAD_REQUEST)
+
+        # Credit the mask to the named annotator, or to whoever leased the image
+        annotator = request.POST.get('annotator')
+        if not annotator:
+            with timing.phase('db'):
+                annotator = await ImageLease.objects.filter(image=image).values_list(
+                    'holder', flat=True
+                ).afirst() or ''
+
+        try:
+            # Use exactly the same name and extension as the image
+            base_name, ext = os.path.splitext(os.path.basename(image.original_filename))
+            with timing.phase('storage'):
+                stored_name = await run_storage(mask_storage, mask_storage.save,
+                                                f"{base_name}{ext or '.jpg'}", request.FILES['file'])
+
+            with timing.phase('db'):
+                mask = await Mask.objects.acreate(
+                    file=stored_name,
+                    image=image,
+                    original_width=request.POST.get('original_width', image.width),
+                    original_height=request.POST.get('original_height', image.height),
+                    annotator=annotator
+                )
+
+                # The image is no longer waiting in the work queue
+                await work_queue.arelease_image(image.id)
+            metrics.MASK_BYTES.observe(request.FILES['file'].size)
+
+            with timing.phase('serialize'):
+                data = MaskSerializer(mask).data
+            return json_response(data, status.HTTP_201_CREATED)
+
+        except Exception as e:
+            return unhandled(json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST))
+
+
+class AsyncImageListView(AsyncAPIView):
+    """
+    Async variant of ImageListView, with the same filters and fields/expand options.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    @query_budget(3)
+    @conditional_on('image', prefix='ImageListView', extra_tables=expanded_tables({'masks': 'mask'}))
+    async def get(self, request, format=None):
+        images, errors = filter_images(Image.objects.all(), request.GET)
+        fields, expand, option_errors = get_sparse_options(request, ImageSerializer)
+        errors.update(option_errors)
+        if errors:
+            return json_response(errors, status.HTTP_400_BAD_REQUEST)
+
+        with timing.phase('serialize'):
+            if fields is None and not expand:
+                data = await serializer_cache.aserialize_many(images, ImageSerializer, 'image')
+            else:
+                images = ImageSerializer.optimize_queryset(images, fields, expand)
+                objects = [image async for image in images]
+                data = ImageSerializer(objects, many=True, fields=fields, expand=expand).data
+
+        return json_response(data)
+
+
+class AsyncMaskListView(AsyncAPIView):
+    """
+    Async variant of MaskListView, with the same fields/expand options.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    @query_budget(3)
+    @conditional_on('mask', prefix='MaskListView', extra_tables=expanded_tables({'image': 'image'}))
+    async def get(self, request, format=None):
+        fields, expand, errors = get_sparse_options(request, MaskSerializer)
+        if errors:
+            return json_response(errors, status.HTTP_400_BAD_REQUEST)
+
+        masks = Mask.objects.all()
+
+        with timing.phase('serialize'):
+            if fields is None and not expand:
+                data = await serializer_cache.aserialize_many(masks, MaskSerializer, 'mask')
+            else:
+                masks = MaskSerializer.optimize_queryset(masks, fields, expand)
+                objects = [mask async for mask in masks]
+                data = MaskSerializer(objects, many=True, fields=fields, expand=expand).data
+
+        return json_response(data)
@@ -0,0 +1,36 @@
+"""
+Management command to compact mask pack files.
+
+Overwriting or deleting a packed mask only drops its index row; the old
+bytes stay in their pack until that pack is compacted. This command rewrites
+every pack (except the one open for appends) whose superseded share is at
+least --min-garbage, moving its live masks to the current pack:
+
+    python manage.py compact_packs
+    python manage.py compact_packs --min-garbage 0.2 --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Mask
+
+
+class Command(BaseCommand):
+    help = "Reclaim space in mask pack files left by overwritten or deleted masks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-garbage', type=float, default=0.5,
+                            help='Compact packs with at least this fraction of dead bytes (default: 0.5)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be reclaimed without rewriting anything')
+
+    def handle(self, *args, **options):
+        pack_store = Mask._meta.get_field('file').storage.pack_store
+        if pack_store is None:
+            raise CommandError("Mask pack files are not enabled (settings.MASK_PACK_STORE)")
+
+        result = pack_store.compact(options['min_garbage'], dry_run=options['dry_run'])
+
+        prefix = "[dry run] " if options['dry_run'] else ""
+        self.stdout.write(
+            f"{prefix}Compacted {result['packs']} pack(s), moved {result['blobs']} mask(s), "
+            f"reclaimed {result['reclaimed_bytes'] / (1024 * 1024):.1f} MB"
+        )
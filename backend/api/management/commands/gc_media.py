@@ -0,0 +1,177 @@
+"""
+Management command to reconcile stored media with the database.
+
+Files can outlive their rows (bulk deletes that skip the pre_delete
+handlers, names overwritten by get_available_name, interrupted uploads) and
+rows can outlive their files. This command lists each storage directory in
+parallel, reads the `file` column of every row, and diffs the two sets:
+
+- orphans: files on disk (or packed blobs) that no row references
+- dangling rows: rows whose file is missing
+
+By default it only reports. Deletion is opt-in, and orphans younger than
+--min-age are never touched so in-flight uploads (whose file is written
+before the row is created) are safe:
+
+    python manage.py gc_media
+    python manage.py gc_media --delete-orphans --delete-dangling --workers 32
+    python manage.py gc_media --delete-orphans --dry-run -v 2
+"""
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Image, Mask
+
+
+def scan_tree(root):
+    """
+    List every file below a directory (recursively).
+
+    Returns:
+        A list of (name relative to the storage root, mtime) tuples
+    """
+    files = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append((entry.path, entry.stat(follow_symlinks=False).st_mtime))
+    return files
+
+
+def scan_storage(storage, executor):
+    """
+    List a storage's files, walking its top-level directories in parallel.
+
+    With the sharded layout each top-level shard is walked by its own worker.
+
+    Returns:
+        A dictionary mapping storage-relative name to mtime
+    """
+    location = storage.location
+    found = {}
+    if not os.path.isdir(location):
+        return found
+    subdirectories = []
+    with os.scandir(location) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                found[entry.name] = entry.stat(follow_symlinks=False).st_mtime
+
+    for files in executor.map(scan_tree, subdirectories):
+        for path, mtime in files:
+            found[os.path.relpath(path, location).replace(os.sep, '/')] = mtime
+    return found
+
+
+def remove_file(storage, name):
+    """Delete one file, returning False if it was already gone (safe from worker threads)."""
+    try:
+        os.remove(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class Command(BaseCommand):
+    help = "Find (and optionally delete) orphaned media files and rows whose file is missing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Parallel directory scans and deletions (default: 8)')
+        parser.add_argument('--delete-orphans', action='store_true',
+                            help='Delete files that no row references')
+        parser.add_argument('--delete-dangling', action='store_true',
+                            help='Delete rows whose file is missing')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Never delete orphans modified less than this many seconds ago '
+                                 '(default: 3600)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Dangling rows deleted per batch (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be deleted without touching anything')
+
+    def handle(self, *args, **options):
+        for model in (Image, Mask):
+            if model._meta.get_field('file').storage.object_store is not None:
+                raise CommandError("gc_media only works with the filesystem storage backend")
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            # Masks first: deleting a dangling image row cascades to its masks
+            for model in (Mask, Image):
+                self.collect(model, executor, options)
+
+    def collect(self, model, executor, options):
+        """Diff one model's storage against its rows and act on the differences."""
+        storage = model._meta.get_field('file').storage
+        prefix = "[dry run] " if options['dry_run'] else ""
+
+        # Rows are read before the disk is scanned: a row created meanwhile then
+        # shows up as a recent orphan file (protected by --min-age) rather than
+        # its file being missed and the new row reported as dangling
+        started = time.monotonic()
+        # Several rows can share a name (e.g. copies made with bulk_create)
+        referenced = defaultdict(list)
+        rows = 0
+        for pk, name in model.objects.exclude(file='').values_list('pk', 'file').iterator(chunk_size=10000):
+            referenced[name].append(pk)
+            rows += 1
+        loaded = time.monotonic()
+        on_disk = scan_storage(storage, executor)
+        if storage.pack_store is not None:
+            # Packed blobs count as stored files; pack files themselves live elsewhere
+            for name, stored_at in storage.pack_store.names().items():
+                on_disk[name] = stored_at.timestamp()
+        scanned = time.monotonic()
+
+        orphans = on_disk.keys() - referenced.keys()
+        dangling = [pk for name in referenced.keys() - on_disk.keys() for pk in referenced[name]]
+        cutoff = time.time() - options['min_age']
+        old_orphans = sorted(name for name in orphans if on_disk[name] < cutoff)
+
+        scan_time = scanned - loaded
+        self.stdout.write(
+            f"{model.__name__}: {len(on_disk)} files scanned in {scan_time:.2f}s "
+            f"({len(on_disk) / scan_time if scan_time else 0:.0f} files/s), "
+            f"{rows} rows read in {loaded - started:.2f}s; "
+            f"{len(orphans)} orphaned files ({len(orphans) - len(old_orphans)} too recent to delete), "
+            f"{len(dangling)} dangling rows"
+        )
+        if options['verbosity'] >= 2:
+            for name in old_orphans:
+                self.stdout.write(f"  orphan: {name}")
+            for pk in sorted(dangling):
+                self.stdout.write(f"  dangling: {model.__name__} {pk}")
+
+        if options['delete_orphans'] and old_orphans:
+            removed = len(old_orphans)
+            if not options['dry_run']:
+                loose = old_orphans
+                removed = 0
+                if storage.pack_store is not None:
+                    # Index queries stay on this thread; the workers only remove files
+                    packed = storage.pack_store.delete_many(old_orphans)
+                    loose = [name for name in old_orphans if name not in packed]
+                    removed = len(packed)
+                removed += sum(executor.map(lambda name: remove_file(storage, name), loose))
+            self.stdout.write(f"{prefix}{model.__name__}: deleted {removed} orphaned files")
+
+        if options['delete_dangling'] and dangling:
+            if not options['dry_run']:
+                # Regular deletes, so signals keep versions, caches and counters in step
+                batch_size = options['batch_size']
+                for start in range(0, len(dangling), batch_size):
+                    model.objects.filter(pk__in=dangling[start:start + batch_size]).delete()
+            self.stdout.write(f"{prefix}{model.__name__}: deleted {len(dangling)} dangling rows")
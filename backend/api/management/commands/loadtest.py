@@ -0,0 +1,376 @@
+"""
+Management command to load-test the API in-process.
+
+Starts the project's real URL conf under a local server (Django's threaded
+WSGI server, or uvicorn for ASGI where installed) and drives it from many
+concurrent simulated annotators, each repeatedly picking an operation from a
+weighted mix:
+
+- list:   GET /api/images/ (the dashboard poll)
+- detail: GET /api/images/<id>/
+- upload: POST /api/images/upload/ with a synthetic JPEG
+- save:   POST /api/masks/save/ with a PNG mask for a random image
+
+It reports per-operation latency percentiles, throughput and error rates.
+Images it creates (seeded or uploaded) are deleted afterwards, so it can be
+pointed at a development database; no external services are needed:
+
+    python manage.py loadtest --clients 50 --duration 30
+    python manage.py loadtest --mix list=80,detail=20 --requests 5000
+    python manage.py loadtest --server asgi --output results.json
+"""
+import http.client
+import io
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from PIL import Image as PILImage
+from api.models import Image
+
+try:
+    import uvicorn
+except ImportError:  # pragma: no cover - optional dependency
+    uvicorn = None
+
+
+OPERATIONS = ('list', 'detail', 'upload', 'save')
+DEFAULT_MIX = 'list=60,detail=25,upload=5,save=10'
+
+
+def parse_mix(value):
+    """
+    Parse 'list=60,detail=25,...' into a dictionary of operation weights.
+
+    Raises:
+        CommandError: For unknown operations or invalid weights
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f"Unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight!r}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise CommandError("The mix needs at least one operation with a positive weight")
+    return mix
+
+
+def percentile(values, fraction):
+    """Return the value at `fraction` of the sorted values (0 for no values)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def encode_image(megapixels, kind):
+    """Encode a 4:3 noise image as JPEG (uploads) or a 1-bit PNG (masks)."""
+    width = max(1, round((megapixels * 1e6 * 4 / 3) ** 0.5))
+    height = max(1, round(width * 3 / 4))
+    buffer = io.BytesIO()
+    if kind == 'JPEG':
+        PILImage.effect_noise((width, height), 48).convert('RGB').save(buffer, 'JPEG', quality=90)
+    else:
+        PILImage.effect_noise((width, height), 96).convert('1').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class QuietHandler(WSGIRequestHandler):
+    """Request handler that doesn't log every request."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGIServerThread(threading.Thread):
+    """Django's threaded WSGI server (as used by runserver) on a free local port."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+        self.server.set_app(WSGIHandler())
+        self.port = self.server.server_address[1]
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.join()
+
+
+class ASGIServerThread(threading.Thread):
+    """uvicorn serving the project's ASGI application on a free local port."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        from django.core.asgi import get_asgi_application
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(
+            get_asgi_application(), host='127.0.0.1', port=self.port,
+            log_level='warning', lifespan='off',
+        ))
+
+    def run(self):
+        self.server.run()
+
+    def start(self):
+        super().start()
+        while not self.server.started:
+            if not self.is_alive():
+                raise CommandError("uvicorn failed to start")
+            time.sleep(0.01)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join()
+
+
+class LoadTest:
+    """
+    Shared state of one load-test run: targets, request budget and results.
+
+    Latencies and status codes are recorded per operation under a lock;
+    recording is cheap next to a request, so it doesn't skew the results.
+    """
+
+    def __init__(self, port, mix, image_ids, upload_body, mask_bytes, options):
+        self.port = port
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.image_ids = list(image_ids)
+        self.created_ids = set(image_ids)
+        self.upload_body = upload_body
+        self.mask_bytes = mask_bytes
+        self.timeout = options['timeout']
+        self.think = options['think_ms'] / 1000
+        self.deadline = None
+        self.budget = None
+        self._issued = itertools.count(1)
+        self._lock = threading.Lock()
+        self.latencies = {name: [] for name in self.operations}
+        self.statuses = {name: Counter() for name in self.operations}
+
+    def record(self, operation, seconds, outcome):
+        with self._lock:
+            self.latencies[operation].append(seconds)
+            self.statuses[operation][outcome] += 1
+
+    def add_image(self, image_id):
+        with self._lock:
+            self.image_ids.append(image_id)
+            self.created_ids.add(image_id)
+
+    def random_image(self, rng):
+        with self._lock:
+            return rng.choice(self.image_ids)
+
+    def more(self):
+        """Whether a client should issue another request."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return False
+        return self.budget is None or next(self._issued) <= self.budget
+
+    def request(self, operation, rng):
+        """Return (method, path, body, headers) for one operation."""
+        if operation == 'list':
+            return 'GET', '/api/images/', None, {}
+        if operation == 'detail':
+            return 'GET', f'/api/images/{self.random_image(rng)}/', None, {}
+        if operation == 'upload':
+            return 'POST', '/api/images/upload/', self.upload_body, {'Content-Type': MULTIPART_CONTENT}
+        body = encode_multipart(BOUNDARY, {
+            'file': SimpleUploadedFile('mask.png', self.mask_bytes, content_type='image/png'),
+            'image': self.random_image(rng),
+        })
+        return 'POST', '/api/masks/save/', body, {'Content-Type': MULTIPART_CONTENT}
+
+    def client(self, seed):
+        """One simulated annotator: issue requests until the run ends."""
+        rng = random.Random(seed)
+        conn = None
+        while self.more():
+            operation = rng.choices(self.operations, self.weights)[0]
+            method, path, body, headers = self.request(operation, rng)
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+                outcome = response.status
+                if response.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException) as e:
+                outcome = type(e).__name__
+                payload = b''
+                conn.close()
+                conn = None
+            self.record(operation, time.perf_counter() - start, outcome)
+
+            if operation == 'upload' and outcome == 201:
+                self.add_image(json.loads(payload)['id'])
+            if self.think:
+                time.sleep(rng.uniform(0, 2 * self.think))
+        if conn is not None:
+            conn.close()
+
+    def summary(self, elapsed):
+        """Return per-operation and total results as a dictionary."""
+        def describe(latencies, statuses):
+            errors = sum(count for outcome, count in statuses.items()
+                         if not isinstance(outcome, int) or outcome >= 400)
+            total = sum(statuses.values())
+            return {
+                'requests': total,
+                'errors': errors,
+                'error_rate': errors / total if total else 0.0,
+                'throughput': total / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(latencies, 0.50) * 1000,
+                'p90_ms': percentile(latencies, 0.90) * 1000,
+                'p99_ms': percentile(latencies, 0.99) * 1000,
+                'max_ms': max(latencies, default=0.0) * 1000,
+                'statuses': {str(outcome): count for outcome, count in sorted(
+                    statuses.items(), key=lambda item: str(item[0])
+                )},
+            }
+
+        results = {name: describe(self.latencies[name], self.statuses[name]) for name in self.operations}
+        results['total'] = describe(
+            [seconds for values in self.latencies.values() for seconds in values],
+            sum(self.statuses.values(), Counter()),
+        )
+        return results
+
+
+class Command(BaseCommand):
+    help = "Load-test the API in-process with concurrent simulated annotators"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20,
+                            help='Concurrent simulated annotators (default: 20)')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to run (default: 30; ignored with --requests)')
+        parser.add_argument('--requests', type=int,
+                            help='Stop after this many requests in total instead of after --duration')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Operation weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                            help="Serve with Django's threaded WSGI server or uvicorn (default: wsgi)")
+        parser.add_argument('--seed-images', type=int, default=100,
+                            help='Images created up front for detail fetches and mask saves (default: 100)')
+        parser.add_argument('--upload-megapixels', type=float, default=1,
+                            help='Size of the uploaded synthetic JPEG (default: 1)')
+        parser.add_argument('--think-ms', type=float, default=0,
+                            help='Mean pause between a client\'s requests (default: 0)')
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Per-request timeout in seconds (default: 30)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the operation mix')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if options['server'] == 'asgi' and uvicorn is None:
+            raise CommandError("--server asgi needs uvicorn (pip install uvicorn)")
+        if options['clients'] < 1:
+            raise CommandError("--clients must be at least 1")
+
+        upload_bytes = encode_image(options['upload_megapixels'], 'JPEG')
+        upload_body = encode_multipart(BOUNDARY, {
+            'file': SimpleUploadedFile('loadtest.jpg', upload_bytes, content_type='image/jpeg'),
+        })
+        mask_bytes = encode_image(0.05, 'PNG')
+
+        seeded = [
+            Image.objects.create(
+                file=SimpleUploadedFile(f'loadtest_{index}.jpg', upload_bytes, content_type='image/jpeg'),
+                original_filename=f'loadtest_{index}.jpg', width=1, height=1,
+            ).pk
+            for index in range(max(options['seed_images'], 1))
+        ]
+        # Server threads open their own connections
+        connection.close()
+
+        # Requests come from 127.0.0.1, which production ALLOWED_HOSTS needn't list
+        allowed_hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, '127.0.0.1'])
+        allowed_hosts.enable()
+        server = ASGIServerThread() if options['server'] == 'asgi' else WSGIServerThread()
+        server.start()
+        run = LoadTest(server.port, mix, seeded, upload_body, mask_bytes, options)
+        try:
+            if options['requests']:
+                run.budget = options['requests']
+            else:
+                run.deadline = time.monotonic() + options['duration']
+            clients = [
+                threading.Thread(target=run.client, args=(options['seed'] * 100003 + index,))
+                for index in range(options['clients'])
+            ]
+            started = time.monotonic()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.monotonic() - started
+        finally:
+            server.stop()
+            allowed_hosts.disable()
+            # Regular deletes, so files, masks, caches and counters are cleaned up too
+            for start in range(0, len(run.created_ids), 500):
+                Image.objects.filter(pk__in=sorted(run.created_ids)[start:start + 500]).delete()
+
+        results = run.summary(elapsed)
+        self.report(results, elapsed, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'options': {key: options[key] for key in (
+                        'clients', 'duration', 'requests', 'mix', 'server', 'seed_images',
+                        'upload_megapixels', 'think_ms',
+                    )},
+                    'elapsed': elapsed,
+                    'results': results,
+                }, f, indent=2)
+
+    def report(self, results, elapsed, options):
+        """Write the results table."""
+        self.stdout.write(
+            f"{options['clients']} clients, {options['server']} server, {elapsed:.1f}s"
+        )
+        self.stdout.write(
+            f"{'operation':<10}{'requests':>10}{'req/s':>9}{'errors':>8}{'err%':>7}"
+            f"{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<10}{result['requests']:>10}{result['throughput']:>9.1f}"
+                f"{result['errors']:>8}{result['error_rate'] * 100:>6.1f}%"
+                f"{result['p50_ms']:>9.1f}{result['p90_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}"
+            )
+        if options['verbosity'] >= 2:
+            for name, result in results.items():
+                statuses = ', '.join(f"{outcome}: {count}" for outcome, count in result['statuses'].items())
+                self.stdout.write(f"  {name} statuses: {statuses}")
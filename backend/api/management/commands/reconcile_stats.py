@@ -0,0 +1,28 @@
+"""
+Management command to reconcile the annotation progress counters.
+
+Counters are maintained incrementally from model signals; this command
+recomputes them from the Image and Mask tables and reports any drift.
+Run it periodically (e.g. from cron) and after bulk operations that bypass
+signals:
+
+    python manage.py reconcile_stats
+"""
+from django.core.management.base import BaseCommand
+from api.models import Image, Mask, StatCounter
+from api.utils import progress_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the progress statistics counters from the database"
+
+    def handle(self, *args, **options):
+        drift = progress_stats.reconcile(Image, Mask, StatCounter)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Counters are in sync"))
+            return
+
+        for key, (old, new) in sorted(drift.items()):
+            self.stdout.write(f"{key}: {old} -> {new}")
+        self.stdout.write(self.style.WARNING(f"Repaired {len(drift)} drifted counter(s)"))
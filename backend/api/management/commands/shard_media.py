@@ -0,0 +1,103 @@
+"""
+Management command to move stored images and masks into the sharded layout.
+
+Files are moved to the location implied by the storage's current shard depth
+(settings.MEDIA_SHARD_DEPTH), using a thread pool for the renames, and the
+`file` columns are rewritten with bulk updates. The command is idempotent and
+safe to re-run after an interruption: rows whose file already sits at the
+target path are simply repointed.
+
+    python manage.py shard_media --workers 16
+    python manage.py shard_media --dry-run
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.models import Image, Mask, ChangeVersion
+
+
+def move_file(storage, source, target):
+    """
+    Move one file within a storage.
+
+    Returns:
+        'moved' if the file was renamed, 'present' if it was already at the
+        target, or 'missing' if neither path exists
+    """
+    source_path = storage.path(source)
+    target_path = storage.path(target)
+    if os.path.exists(source_path):
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(source_path, target_path)
+        return 'moved'
+    if os.path.exists(target_path):
+        return 'present'
+    return 'missing'
+
+
+class Command(BaseCommand):
+    help = "Move image and mask files into the configured hash-prefix sharded layout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Parallel file moves (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows moved and updated per batch (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would move without touching anything')
+
+    def handle(self, *args, **options):
+        for model in (Image, Mask):
+            if not model._meta.get_field('file').storage.is_local:
+                raise CommandError("shard_media only works with plain files on the filesystem")
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for model, kind in ((Image, 'image'), (Mask, 'mask')):
+                self.relayout(model, kind, executor, options['batch_size'], options['dry_run'])
+
+    def relayout(self, model, kind, executor, batch_size, dry_run):
+        """Move every file of one model to its sharded path."""
+        storage = model._meta.get_field('file').storage
+        started = time.monotonic()
+        totals = {'moved': 0, 'present': 0, 'missing': 0}
+
+        batch = []
+        rows = model.objects.exclude(file='').values_list('pk', 'file').iterator(chunk_size=batch_size)
+        for pk, name in rows:
+            target = storage.shard_name(name)
+            if target != name:
+                batch.append((pk, name, target))
+            if len(batch) >= batch_size:
+                self.apply_batch(model, kind, storage, batch, executor, totals, dry_run)
+                batch = []
+        if batch:
+            self.apply_batch(model, kind, storage, batch, executor, totals, dry_run)
+
+        elapsed = time.monotonic() - started
+        rate = (totals['moved'] + totals['present']) / elapsed if elapsed else 0
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(
+            f"{prefix}{model.__name__}: {totals['moved']} moved, {totals['present']} already in place, "
+            f"{totals['missing']} missing on disk ({rate:.0f} files/s, shard depth {storage.shard_depth})"
+        )
+
+    def apply_batch(self, model, kind, storage, batch, executor, totals, dry_run):
+        """Move one batch of files in parallel, then repoint their rows in bulk."""
+        if dry_run:
+            totals['moved'] += len(batch)
+            return
+
+        results = executor.map(lambda row: move_file(storage, row[1], row[2]), batch)
+        updates = []
+        now = timezone.now()
+        for (pk, _, target), result in zip(batch, results):
+            totals[result] += 1
+            if result != 'missing':
+                updates.append(model(pk=pk, file=target, updated_at=now))
+
+        # Bulk updates bypass model signals and auto_now; the new updated_at
+        # retires cached fragments and bumping the version changes the ETags
+        model.objects.bulk_update(updates, ['file', 'updated_at'])
+        if updates:
+            ChangeVersion.bump(kind)
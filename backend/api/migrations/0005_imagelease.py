@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:29
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_changeversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(blank=True, max_length=255)),
+                ('token', models.UUIDField(default=uuid.uuid4, unique=True)),
+                ('leased_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lease', to='api.image')),
+            ],
+        ),
+    ]
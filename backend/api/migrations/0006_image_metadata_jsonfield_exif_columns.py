@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:30
+
+import json
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+BATCH_SIZE = 1000
+
+
+def indexed_fields(metadata):
+    """
+    Pull the indexed EXIF fields out of a metadata dictionary.
+
+    A frozen copy of api.utils.image_processing.extract_indexed_fields as of
+    this migration, so later changes to the app code don't alter what it does.
+    """
+    exif = metadata.get('exif')
+    if not isinstance(exif, dict):
+        exif = {}
+
+    def clean_text(value):
+        # EXIF strings are often NUL-padded or space-padded
+        if not isinstance(value, str):
+            return None
+        value = value.replace('\x00', '').strip()
+        return value[:255] or None
+
+    taken_at = None
+    raw_taken_at = exif.get('DateTimeOriginal')
+    if isinstance(raw_taken_at, str):
+        try:
+            taken_at = datetime.strptime(raw_taken_at.strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+            taken_at = timezone.make_aware(taken_at, timezone.get_default_timezone())
+        except ValueError:
+            taken_at = None
+
+    orientation = exif.get('Orientation')
+    if not isinstance(orientation, int) or isinstance(orientation, bool) or not 1 <= orientation <= 8:
+        orientation = None
+
+    return {
+        'camera_make': clean_text(exif.get('Make')),
+        'camera_model': clean_text(exif.get('Model')),
+        'taken_at': taken_at,
+        'orientation': orientation,
+    }
+
+
+def drop_invalid_metadata(apps, schema_editor):
+    """Null out metadata that isn't valid JSON so the column type change succeeds."""
+    Image = apps.get_model('api', 'Image')
+    invalid = []
+    rows = Image.objects.exclude(metadata_json=None).values_list('id', 'metadata_json')
+    for pk, raw in rows.iterator(chunk_size=BATCH_SIZE):
+        try:
+            json.loads(raw)
+        except (TypeError, ValueError):
+            invalid.append(pk)
+    for start in range(0, len(invalid), BATCH_SIZE):
+        Image.objects.filter(id__in=invalid[start:start + BATCH_SIZE]).update(metadata_json=None)
+
+
+def backfill_exif_columns(apps, schema_editor):
+    """Populate the indexed EXIF columns from existing metadata (rows whose metadata isn't an object are skipped)."""
+    Image = apps.get_model('api', 'Image')
+    fields = ['camera_make', 'camera_model', 'taken_at', 'orientation']
+    batch = []
+    for image in Image.objects.exclude(metadata_json=None).only('id', 'metadata_json').iterator(chunk_size=BATCH_SIZE):
+        if not isinstance(image.metadata_json, dict):
+            continue
+        for field, value in indexed_fields(image.metadata_json).items():
+            setattr(image, field, value)
+        batch.append(image)
+        if len(batch) >= BATCH_SIZE:
+            Image.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Image.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_imagelease'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_invalid_metadata, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='image',
+            name='camera_make',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='camera_model',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='taken_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='metadata_json',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_exif_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:36
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_counters(apps, schema_editor):
+    """
+    Set has_mask on existing images and compute the initial counters.
+
+    A frozen copy of api.utils.progress_stats.reconcile as of this migration
+    (counter keys included), so later changes to the app code don't alter it.
+    """
+    Image = apps.get_model('api', 'Image')
+    Mask = apps.get_model('api', 'Mask')
+    StatCounter = apps.get_model('api', 'StatCounter')
+
+    Image.objects.filter(masks__isnull=False).update(has_mask=True)
+
+    counters = {
+        'images.total': Image.objects.count(),
+        'images.masked': Image.objects.filter(masks__isnull=False).distinct().count(),
+        'masks.total': Mask.objects.count(),
+    }
+    per_day = (
+        Mask.objects.annotate(day=TruncDate('created_at'))
+        .values('day').annotate(count=Count('id')).order_by()
+    )
+    for row in per_day:
+        counters[f"masks.day.{row['day'].isoformat()}"] = row['count']
+    per_annotator = Mask.objects.values('annotator').annotate(count=Count('id')).order_by()
+    for row in per_annotator:
+        key = f"masks.annotator.{(row['annotator'] or 'anonymous')[:200]}"
+        counters[key] = counters.get(key, 0) + row['count']
+
+    StatCounter.objects.bulk_create(
+        [StatCounter(key=key, value=value) for key, value in counters.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_image_metadata_jsonfield_exif_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='has_mask',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='mask',
+            name='annotator',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=32)),
+                ('name', models.CharField(max_length=255)),
+                ('pack', models.IntegerField(db_index=True)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.IntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('stored_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('namespace', 'name'), name='unique_packed_blob_name')],
+            },
+        ),
+    ]
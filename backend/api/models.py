@@ -4,15 +4,28 @@ Models for the mask_generator API.
 This file defines the data models for our mask generator application:
 1. Image - Stores uploaded images
 2. Mask - Stores masks generated for images
+3. ChangeVersion - Per-table change counters used for conditional GET
+4. ImageLease - Time-bounded claims on images handed out by the work queue
+5. StatCounter - Incrementally maintained annotation progress counters
+6. PackedBlob - Index of blobs stored in append-only pack files
 """
 import os
 import json
+import logging
 import uuid
-from django.db import models
+from django.db import models, IntegrityError, transaction
+from django.db.models import F
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.utils import timezone
 from .utils.file_storage import ImageStorage, MaskStorage
+from .utils import progress_stats, serializer_cache
+from .utils.image_processing import extract_indexed_fields
+
+
+logger = logging.getLogger(__name__)
 
 # Create storage instances
 image_storage = ImageStorage()
@@ -71,7 +84,14 @@ class Image(models.Model):
         height (IntegerField): The height of the image in pixels
         uploaded_at (DateTimeField): When the image was uploaded
         is_mpo (BooleanField): Whether the image was originally an MPO file
-        metadata_json (TextField): JSON string containing additional metadata
+        metadata_json (JSONField): Additional metadata, including EXIF
+        camera_make (CharField): EXIF Make, extracted for indexed queries
+        camera_model (CharField): EXIF Model, extracted for indexed queries
+        taken_at (DateTimeField): EXIF DateTimeOriginal, extracted for indexed queries
+        orientation (PositiveSmallIntegerField): EXIF Orientation (1-8)
+        has_mask (BooleanField): Whether at least one mask exists for the image
+        updated_at (DateTimeField): When the row last changed; keys its cached
+            serialized fragment, so bulk updates of serialized columns must set it
     """
     file = models.ImageField(storage=image_storage)
     original_filename = models.CharField(max_length=255)
@@ -79,24 +99,36 @@ class Image(models.Model):
     height = models.IntegerField()
     uploaded_at = models.DateTimeField(auto_now_add=True)
     is_mpo = models.BooleanField(default=False)
-    metadata_json = models.TextField(blank=True, null=True)
+    metadata_json = models.JSONField(blank=True, null=True)
+    camera_make = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    camera_model = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    taken_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    orientation = models.PositiveSmallIntegerField(blank=True, null=True, db_index=True)
+    has_mask = models.BooleanField(default=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     @property
     def metadata(self):
         """Get the metadata as a Python dictionary."""
         if not self.metadata_json:
             return {}
-        try:
-            return json.loads(self.metadata_json)
-        except json.JSONDecodeError:
-            return {}
+        if isinstance(self.metadata_json, str):
+            # Tolerate values assigned as raw JSON strings
+            try:
+                return json.loads(self.metadata_json)
+            except json.JSONDecodeError:
+                return {}
+        return self.metadata_json
     
     def set_metadata(self, metadata_dict):
-        """Set the metadata from a Python dictionary."""
-        if metadata_dict:
-            self.metadata_json = json.dumps(metadata_dict)
-        else:
-            self.metadata_json = None
+        """
+        Set the metadata from a Python dictionary.
+        
+        Also refreshes the indexed EXIF columns derived from it.
+        """
+        self.metadata_json = metadata_dict or None
+        for field, value in extract_indexed_fields(metadata_dict).items():
+            setattr(self, field, value)
     
     def save(self, *args, **kwargs):
         """
@@ -117,7 +149,7 @@ class Image(models.Model):
                 # Set the file name before saving
                 if hasattr(self.file, 'name'):
                     self.file.name = f"{base_name}{ext}"
-                    print(f"Preserving original filename for image: {self.file.name}")
+                    logger.debug("Preserving original filename for image: %s", self.file.name)
         
         super().save(*args, **kwargs)
 
@@ -136,12 +168,17 @@ class Mask(models.Model):
         created_at (DateTimeField): When the mask was created
         original_width (IntegerField): The width of original image when mask was created
         original_height (IntegerField): The height of original image when mask was created
+        annotator (CharField): Free-form identifier of the annotator who saved the mask
+        updated_at (DateTimeField): When the row last changed; keys its cached
+            serialized fragment, so bulk updates of serialized columns must set it
     """
     file = models.ImageField(storage=mask_storage)
     image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='masks')
     created_at = models.DateTimeField(auto_now_add=True)
     original_width = models.IntegerField()
     original_height = models.IntegerField()
+    annotator = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def save(self, *args, **kwargs):
         """
@@ -159,7 +196,7 @@ class Mask(models.Model):
                 if not ext:
                     ext = '.jpg'
                 self.file.name = f"{base_name}{ext}"
-                print(f"Using image filename for mask: {self.file.name}")
+                logger.debug("Using image filename for mask: %s", self.file.name)
         
         super().save(*args, **kwargs)
     
@@ -168,16 +205,143 @@ class Mask(models.Model):
         return f"Mask for {self.image.original_filename}"
 
 
+class ImageLease(models.Model):
+    """
+    Model representing an annotator's time-bounded claim on an image.
+    
+    The work queue hands each unmasked image to one annotator at a time.
+    A lease stops other annotators from being given the same image until
+    it expires, is released, or a mask is saved for the image.
+    
+    Attributes:
+        image (OneToOneField): The claimed image (at most one lease per image)
+        holder (CharField): Free-form identifier of the annotator holding the lease
+        token (UUIDField): Secret used to renew or release the lease
+        leased_at (DateTimeField): When the lease was (last) claimed
+        expires_at (DateTimeField): When the lease lapses unless renewed
+    """
+    image = models.OneToOneField(Image, on_delete=models.CASCADE, related_name='lease')
+    holder = models.CharField(max_length=255, blank=True)
+    token = models.UUIDField(default=uuid.uuid4, unique=True)
+    leased_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    @property
+    def is_active(self):
+        """Whether the lease has not yet expired."""
+        return self.expires_at > timezone.now()
+    
+    def __str__(self):
+        """String representation of the ImageLease model."""
+        return f"Lease on {self.image_id} by {self.holder or 'anonymous'}"
+
+
+class StatCounter(models.Model):
+    """
+    Model holding one named progress counter (see api.utils.progress_stats).
+    
+    Attributes:
+        key (CharField): The counter name, e.g. 'images.masked'
+        value (BigIntegerField): The current count
+    """
+    key = models.CharField(max_length=255, unique=True)
+    value = models.BigIntegerField(default=0)
+    
+    @classmethod
+    def add(cls, key, delta):
+        """
+        Atomically add delta to a counter, creating it on first use.
+        
+        Args:
+            key: The counter name
+            delta: The amount to add (may be negative)
+        """
+        updated = cls.objects.filter(key=key).update(value=F('value') + delta)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(key=key, value=delta)
+            except IntegrityError:
+                # Another writer created the row first; add to it instead
+                cls.objects.filter(key=key).update(value=F('value') + delta)
+    
+    def __str__(self):
+        """String representation of the StatCounter model."""
+        return f"{self.key} = {self.value}"
+
+
+class PackedBlob(models.Model):
+    """
+    Model locating one blob inside a pack file (see api.utils.pack_storage).
+    
+    Attributes:
+        namespace (CharField): The pack store the blob belongs to, e.g. 'masks'
+        name (CharField): The storage name the blob is saved under
+        pack (IntegerField): Number of the pack file holding the bytes
+        offset (BigIntegerField): Byte offset of the blob in the pack
+        length (IntegerField): Length of the blob in bytes
+        sha256 (CharField): Hex SHA-256 of the blob, checked on compaction
+        stored_at (DateTimeField): When this version of the blob was stored
+    """
+    namespace = models.CharField(max_length=32)
+    name = models.CharField(max_length=255)
+    pack = models.IntegerField(db_index=True)
+    offset = models.BigIntegerField()
+    length = models.IntegerField()
+    sha256 = models.CharField(max_length=64)
+    stored_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['namespace', 'name'], name='unique_packed_blob_name'),
+        ]
+    
+    def __str__(self):
+        """String representation of the PackedBlob model."""
+        return f"{self.namespace}/{self.name} @ {self.pack}:{self.offset}+{self.length}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Model recording a request made with an Idempotency-Key header
+    (see api.utils.idempotency).
+    
+    Attributes:
+        scope (CharField): The endpoint the key was used on, e.g. 'mask-save'
+        key (CharField): The client-chosen key
+        fingerprint (CharField): Hex SHA-256 identifying the request payload
+        status_code (PositiveSmallIntegerField): The response status, or None while in progress
+        response (JSONField): The response payload replayed to retries
+        created_at (DateTimeField): When the first request arrived
+        expires_at (DateTimeField): When the record may be purged and the key reused
+    """
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+    
+    def __str__(self):
+        """String representation of the IdempotencyKey model."""
+        return f"{self.scope}:{self.key} -> {self.status_code or 'in progress'}"
+
+
 @receiver(pre_delete, sender=Image)
 def delete_image_file(sender, instance, **kwargs):
     """
     Signal handler to delete the file when an Image instance is deleted.
     
-    This ensures we don't leave orphaned files in the filesystem.
+    This ensures we don't leave orphaned files in storage.
     """
     if instance.file:
-        if os.path.isfile(instance.file.path):
-            os.remove(instance.file.path)
+        instance.file.storage.delete(instance.file.name)
 
 
 @receiver(pre_delete, sender=Mask)
@@ -185,8 +349,150 @@ def delete_mask_file(sender, instance, **kwargs):
     """
     Signal handler to delete the file when a Mask instance is deleted.
     
-    This ensures we don't leave orphaned files in the filesystem.
+    This ensures we don't leave orphaned files in storage.
     """
     if instance.file:
-        if os.path.isfile(instance.file.path):
-            os.remove(instance.file.path)
+        instance.file.storage.delete(instance.file.name)
+
+
+class ChangeVersion(models.Model):
+    """
+    Model holding a monotonically increasing change counter per table.
+    
+    The counters are bumped from model signals whenever an Image or Mask is
+    saved or deleted. Views derive ETag and Last-Modified headers from them,
+    so an unchanged poll can be answered with a 304 after a single cheap query.
+    
+    Attributes:
+        table (CharField): The logical table name (e.g. 'image', 'mask')
+        version (BigIntegerField): Incremented on every change to the table
+        updated_at (DateTimeField): When the table last changed
+    """
+    table = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    @classmethod
+    def bump(cls, table):
+        """
+        Increment the version counter for a table.
+        
+        Uses a single UPDATE with an F() expression so concurrent writers
+        never lose an increment. The row is created on first use.
+        
+        Args:
+            table: The logical table name to bump
+        """
+        now = timezone.now()
+        updated = cls.objects.filter(table=table).update(
+            version=F('version') + 1, updated_at=now
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(table=table, version=1, updated_at=now)
+            except IntegrityError:
+                # Another writer created the row first; bump it instead
+                cls.objects.filter(table=table).update(
+                    version=F('version') + 1, updated_at=now
+                )
+    
+    def __str__(self):
+        """String representation of the ChangeVersion model."""
+        return f"{self.table} v{self.version}"
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def bump_image_version(sender, instance, **kwargs):
+    """
+    Signal handler to bump the image table version on any change.
+    """
+    ChangeVersion.bump('image')
+
+
+@receiver(post_save, sender=Mask)
+@receiver(post_delete, sender=Mask)
+def bump_mask_version(sender, instance, **kwargs):
+    """
+    Signal handler to bump the mask table version on any change.
+    """
+    ChangeVersion.bump('mask')
+
+
+@receiver(pre_save, sender=Image)
+@receiver(pre_save, sender=Mask)
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=Mask)
+def drop_serialized_fragment(sender, instance, **kwargs):
+    """
+    Signal handler to drop the cached serialized fragment a change supersedes.
+    
+    On save this runs before auto_now moves updated_at on, so the fragment
+    cached under the previous updated_at is the one dropped.
+    """
+    if instance.pk is not None and 'updated_at' not in instance.get_deferred_fields():
+        serializer_cache.invalidate(sender._meta.model_name, instance.pk, instance.updated_at)
+
+
+@receiver(post_save, sender=Image)
+def count_new_image(sender, instance, created, **kwargs):
+    """
+    Signal handler to count newly created images.
+    """
+    if created:
+        StatCounter.add(progress_stats.IMAGES_TOTAL, 1)
+
+
+@receiver(post_delete, sender=Image)
+def count_deleted_image(sender, instance, **kwargs):
+    """
+    Signal handler to count deleted images.
+    
+    Masks are deleted (and uncounted) before their image in a cascade,
+    so only the image total changes here.
+    """
+    StatCounter.add(progress_stats.IMAGES_TOTAL, -1)
+
+
+@receiver(post_save, sender=Mask)
+def count_new_mask(sender, instance, created, **kwargs):
+    """
+    Signal handler to count a newly created mask.
+    
+    The image flips to masked with a compare-and-set on has_mask, so the
+    masked count stays exact even when masks for one image race.
+    """
+    if not created:
+        return
+    for key in progress_stats.mask_keys(instance):
+        StatCounter.add(key, 1)
+    if Image.objects.filter(pk=instance.image_id, has_mask=False).update(has_mask=True):
+        StatCounter.add(progress_stats.IMAGES_MASKED, 1)
+    sync_cached_has_mask(instance, True)
+
+
+@receiver(post_delete, sender=Mask)
+def count_deleted_mask(sender, instance, **kwargs):
+    """
+    Signal handler to uncount a deleted mask.
+    
+    When the image's last mask goes, the image flips back to unmasked.
+    """
+    for key in progress_stats.mask_keys(instance):
+        StatCounter.add(key, -1)
+    if not Mask.objects.filter(image_id=instance.image_id).exists():
+        if Image.objects.filter(pk=instance.image_id, has_mask=True).update(has_mask=False):
+            StatCounter.add(progress_stats.IMAGES_MASKED, -1)
+        sync_cached_has_mask(instance, False)
+
+
+def sync_cached_has_mask(mask, has_mask):
+    """
+    Mirror a has_mask change onto the mask's image instance, if it is loaded.
+    
+    The flag is written with a bulk update, so without this a later save() of
+    the same image instance would write the old value back.
+    """
+    if Mask._meta.get_field('image').is_cached(mask):
+        mask.image.has_mask = has_mask
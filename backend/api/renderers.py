@@ -0,0 +1,63 @@
+"""
+Renderers for the mask_generator API.
+
+This file defines a drop-in replacement for DRF's JSONRenderer that uses
+orjson when it is installed. orjson is an optional dependency; without it
+the renderer behaves exactly like JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+from .utils import timing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without the extra
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, byte-compatible with JSONRenderer.
+
+    Compatibility notes:
+    - Datetimes, dates and times are passed through to DRF's JSONEncoder,
+      so they keep DRF's ISO 8601 format (including the trailing 'Z')
+    - Decimals, lazy strings and other non-native types also go through
+      DRF's JSONEncoder.default; UUIDs are written in the same canonical form
+    - U+2028/U+2029 are escaped the same way as JSONRenderer
+    - Non-string dictionary keys (e.g. unknown EXIF tag ids) are stringified
+
+    Requests for indented output, ASCII-only output or non-compact
+    separators fall back to JSONRenderer, as does anything orjson can't
+    encode (such as integers wider than 64 bits). Known differences are
+    limited to floats: orjson writes 1e16 where the standard library writes
+    1e+16, and renders NaN/Infinity as null instead of raising.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Render `data` into JSON, returning a bytestring.
+        """
+        if data is None:
+            return b''
+
+        with timing.phase('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+
+        if orjson is None or indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Match JSONRenderer: escape line/paragraph separators for JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
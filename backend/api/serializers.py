@@ -4,16 +4,107 @@ Serializers for the mask_generator API.
 This file defines serializers that convert between Django models and JSON.
 """
 from rest_framework import serializers
-from .models import Image, Mask
+from .models import Image, Mask, ImageLease
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Serializer mixin adding sparse fieldsets and embedded relations.
+    
+    Accepts two extra keyword arguments:
+    - fields: Iterable of field names to keep (None keeps all)
+    - expand: Iterable of relation names to embed (see get_expandable_fields)
+    
+    Subclasses describe how their output maps onto the database so views can
+    prune the SQL to match via optimize_queryset:
+    - Meta.model_field_map: Serializer field -> model fields it reads
+      (fields not listed read the model field of the same name)
+    - get_expandable_fields: Relation name -> (serializer factory, queryset hook)
+    """
+    
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        expandable = self.get_expandable_fields()
+        for name in expand or ():
+            factory, _ = expandable[name]
+            self.fields[name] = factory()
+        
+        if fields is not None:
+            keep = set(fields) | set(expand or ())
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+    
+    @classmethod
+    def get_expandable_fields(cls):
+        """Return a mapping of relation name to (serializer factory, queryset hook)."""
+        return {}
+    
+    @classmethod
+    def get_output_field_names(cls):
+        """Return the names of the fields rendered by default."""
+        return list(cls.Meta.fields)
+    
+    @classmethod
+    def validate_options(cls, fields, expand):
+        """
+        Check requested field and expansion names.
+        
+        Returns:
+            An errors dictionary (empty when the options are valid)
+        """
+        errors = {}
+        if fields is not None:
+            unknown = [name for name in fields if name not in cls.get_output_field_names()]
+            if unknown:
+                errors['fields'] = [f"Unknown field(s): {', '.join(unknown)}"]
+        if expand:
+            unknown = [name for name in expand if name not in cls.get_expandable_fields()]
+            if unknown:
+                errors['expand'] = [f"Unknown relation(s): {', '.join(unknown)}"]
+        return errors
+    
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None, expand=None):
+        """
+        Restrict a queryset to the columns and relations the output needs.
+        
+        Args:
+            queryset: The queryset to optimize
+            fields: The requested field names (None means all)
+            expand: The requested relation names
+            
+        Returns:
+            A queryset using only() for sparse fieldsets and
+            select_related/prefetch_related for expansions
+        """
+        if fields is not None:
+            field_map = getattr(cls.Meta, 'model_field_map', {})
+            columns = {'pk'}
+            for name in fields:
+                columns.update(field_map.get(name, [name]))
+            # Forward relations being expanded need their foreign key column
+            for name in expand or ():
+                if getattr(cls.Meta.model._meta.get_field(name), 'concrete', False):
+                    columns.add(name)
+            queryset = queryset.only(*columns)
+        
+        expandable = cls.get_expandable_fields()
+        for name in expand or ():
+            _, hook = expandable[name]
+            queryset = hook(queryset)
+        return queryset
+
+
+class ImageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Image model.
     
     This serializer handles:
     - Converting Image model instances to JSON for API responses
     - Validating input data for creating Image instances
+    - Sparse fieldsets and embedding masks (expand=['masks'])
     """
     metadata = serializers.SerializerMethodField()
     image_url = serializers.SerializerMethodField()
@@ -31,19 +122,62 @@ class ImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Image
         fields = ['id', 'file', 'image_url', 'original_filename', 'width', 'height',
-                 'uploaded_at', 'is_mpo', 'metadata']
-        read_only_fields = ['id', 'uploaded_at', 'is_mpo', 'metadata', 'image_url']
+                 'uploaded_at', 'is_mpo', 'metadata', 'camera_make', 'camera_model',
+                 'taken_at', 'orientation']
+        read_only_fields = ['id', 'uploaded_at', 'is_mpo', 'metadata', 'image_url',
+                           'camera_make', 'camera_model', 'taken_at', 'orientation']
+        model_field_map = {
+            'image_url': ['file'],
+            'metadata': ['metadata_json'],
+        }
+    
+    @classmethod
+    def get_expandable_fields(cls):
+        """Masks are embedded with one prefetch query for the whole page."""
+        return {
+            'masks': (
+                lambda: MaskSerializer(many=True, read_only=True),
+                lambda queryset: queryset.prefetch_related('masks'),
+            ),
+        }
 
 
-class MaskSerializer(serializers.ModelSerializer):
+class MaskSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Mask model.
     
     This serializer handles:
     - Converting Mask model instances to JSON for API responses
     - Validating input data for creating Mask instances
+    - Sparse fieldsets and embedding the image (expand=['image'])
     """
     class Meta:
         model = Mask
-        fields = ['id', 'file', 'image', 'created_at', 'original_width', 'original_height']
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+        fields = ['id', 'file', 'image', 'created_at', 'original_width', 'original_height',
+                 'annotator']
+        read_only_fields = ['id', 'created_at']
+    
+    @classmethod
+    def get_expandable_fields(cls):
+        """The image replaces the image id and is joined in the same query."""
+        return {
+            'image': (
+                lambda: ImageSerializer(read_only=True),
+                lambda queryset: queryset.select_related('image'),
+            ),
+        }
+
+
+class ImageLeaseSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the ImageLease model.
+    
+    This serializer handles:
+    - Converting work queue leases to JSON, embedding the leased image
+    """
+    image = ImageSerializer(read_only=True)
+    
+    class Meta:
+        model = ImageLease
+        fields = ['token', 'holder', 'leased_at', 'expires_at', 'image']
+        read_only_fields = fields
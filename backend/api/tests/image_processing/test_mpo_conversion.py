@@ -1,7 +1,8 @@
+import io
 import os
 import tempfile
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from PIL import Image
 
@@ -36,6 +37,8 @@ class MPOConversionTests(TestCase):
         mock_image = MagicMock()
         mock_image_open.return_value = mock_image
         mock_image.format = 'MPO'
+        # Small enough to decode within the memory budget
+        mock_image.width, mock_image.height, mock_image.mode = 640, 480, 'RGB'
         
         # Call the function with our mock MPO file
         with open(self.mock_mpo_path, 'rb') as f:
@@ -118,4 +121,59 @@ class MPOConversionTests(TestCase):
         
         # Additional metadata might be included if available
         if 'exif' in metadata:
-            self.assertIsInstance(metadata['exif'], dict)
\ No newline at end of file
+            self.assertIsInstance(metadata['exif'], dict)
+
+def make_mpo(size=(64, 48)):
+    """Encode a real two-frame MPO with EXIF."""
+    first = Image.new('RGB', size, 'red')
+    second = Image.new('RGB', size, 'blue')
+    exif = Image.Exif()
+    exif[0x010F] = 'FUJIFILM'  # Make
+    buffer = io.BytesIO()
+    first.save(buffer, 'MPO', save_all=True, append_images=[second], exif=exif)
+    return buffer.getvalue()
+
+
+class MemoryBudgetTests(TestCase):
+    """Tests for converting MPO files that exceed the decode memory budget."""
+
+    @override_settings(UPLOAD_MEMORY_BUDGET=1000)
+    def test_first_frame_copied_without_decoding(self):
+        """Test that an over-budget MPO keeps its first frame verbatim as plain JPEG."""
+        mpo_file = SimpleUploadedFile('big.mpo', make_mpo(), content_type='image/jpeg')
+
+        with patch.object(Image.Image, 'load', side_effect=AssertionError('decoded')):
+            result = convert_mpo_to_jpeg(mpo_file)
+
+        self.assertEqual(result.name, 'big.jpg')
+        converted = Image.open(io.BytesIO(result.read()))
+        self.assertEqual(converted.format, 'JPEG')
+        self.assertEqual(converted.size, (64, 48))
+        self.assertGreater(converted.getpixel((0, 0))[0], 200)
+        result.seek(0)
+        metadata = extract_image_metadata(result)
+        self.assertEqual(metadata['exif']['Make'], 'FUJIFILM')
+
+    @override_settings(UPLOAD_MEMORY_BUDGET=1000)
+    def test_reduced_resolution_without_index(self):
+        """Test that an over-budget MPO without a usable index is decoded at reduced size."""
+        mpo_file = SimpleUploadedFile('big.mpo', make_mpo(), content_type='image/jpeg')
+
+        with patch('api.utils.image_processing.extract_first_frame', return_value=None):
+            with self.assertLogs('api.memory', 'WARNING'):
+                result = convert_mpo_to_jpeg(mpo_file)
+
+        converted = Image.open(io.BytesIO(result.read()))
+        self.assertEqual(converted.format, 'JPEG')
+        # 1/4 scale is the largest whose pixels fit in 1000 bytes
+        self.assertEqual(converted.size, (16, 12))
+
+    def test_within_budget_is_reencoded(self):
+        """Test that MPO files within the budget still go through a full decode."""
+        mpo_file = SimpleUploadedFile('small.mpo', make_mpo(), content_type='image/jpeg')
+
+        with patch('api.utils.image_processing.extract_first_frame') as extract:
+            result = convert_mpo_to_jpeg(mpo_file)
+
+        extract.assert_not_called()
+        self.assertEqual(Image.open(io.BytesIO(result.read())).size, (64, 48))
@@ -0,0 +1,65 @@
+"""
+Tests for the fast reset path of remove_entries_from_db.py.
+"""
+from io import StringIO
+from django.test import TestCase
+from api.models import Image, Mask, ImageLease, ChangeVersion, StatCounter
+from api.utils import progress_stats
+from remove_entries_from_db import fast_reset
+
+
+class FastResetTests(TestCase):
+    """Tests for deleting everything with batched raw deletes."""
+
+    def setUp(self):
+        """Create images with files, masks and a lease."""
+        self.image_storage = Image._meta.get_field('file').storage
+        self.mask_storage = Mask._meta.get_field('file').storage
+        self.images = [
+            Image.objects.create(
+                file=self.image_storage.save(f'reset_{i}.jpg', StringIO('image')),
+                original_filename=f'reset_{i}.jpg', width=10, height=10
+            )
+            for i in range(5)
+        ]
+        self.mask = Mask.objects.create(
+            file=self.mask_storage.save('reset_0.png', StringIO('mask')),
+            image=self.images[0], original_width=10, original_height=10
+        )
+        ImageLease.objects.create(image=self.images[1], holder='alice',
+                                  expires_at=self.images[1].uploaded_at)
+        self.versions_before = dict(ChangeVersion.objects.values_list('table', 'version'))
+
+    def tearDown(self):
+        for image in self.images:
+            self.image_storage.delete(image.file.name)
+        self.mask_storage.delete(self.mask.file.name)
+
+    def test_deletes_rows_and_files(self):
+        """Test that all rows and files go and derived state is brought in step."""
+        with self.assertLogs('remove_entries_from_db', 'INFO') as logs:
+            totals = fast_reset(batch_size=2, workers=2)
+
+        self.assertIn('Image: 2/5 rows deleted', logs.output[1])
+        self.assertEqual(totals, {'leases': 1, 'masks': 1, 'images': 5, 'files': 6})
+        self.assertFalse(Image.objects.exists())
+        self.assertFalse(Mask.objects.exists())
+        self.assertFalse(ImageLease.objects.exists())
+        self.assertFalse(self.image_storage.exists(self.images[0].file.name))
+        self.assertFalse(self.mask_storage.exists(self.mask.file.name))
+
+        versions = dict(ChangeVersion.objects.values_list('table', 'version'))
+        self.assertGreater(versions['image'], self.versions_before['image'])
+        self.assertGreater(versions['mask'], self.versions_before['mask'])
+        self.assertEqual(progress_stats.read_stats()['images']['total'], 0)
+        self.assertFalse(StatCounter.objects.exclude(value=0).exists())
+
+    def test_keep_files(self):
+        """Test that keep-files mode leaves storage untouched."""
+        with self.assertLogs('remove_entries_from_db', 'INFO'):
+            totals = fast_reset(batch_size=100, keep_files=True)
+
+        self.assertEqual(totals['files'], 0)
+        self.assertFalse(Image.objects.exists())
+        self.assertTrue(self.image_storage.exists(self.images[0].file.name))
+        self.assertTrue(self.mask_storage.exists(self.mask.file.name))
@@ -0,0 +1,104 @@
+"""
+Tests for the gc_media management command.
+"""
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from api.models import Image, Mask
+
+
+class GcMediaCommandTests(TestCase):
+    """Tests for finding and deleting orphaned files and dangling rows."""
+
+    def setUp(self):
+        """Point both storages at temporary directories with known contents."""
+        self.image_dir = tempfile.TemporaryDirectory()
+        self.mask_dir = tempfile.TemporaryDirectory()
+        self.image_storage = Image._meta.get_field('file').storage
+        self.mask_storage = Mask._meta.get_field('file').storage
+        patchers = [
+            patch.object(self.image_storage, 'location', self.image_dir.name),
+            patch.object(self.mask_storage, 'location', self.mask_dir.name),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.kept = self.make_image('kept.jpg')
+        self.dangling = Image.objects.create(
+            file='gone.jpg', original_filename='gone.jpg', width=1, height=1
+        )
+        self.old_orphan = self.write(self.image_dir.name, 'ab/cd/old_orphan.jpg', age=7200)
+        self.new_orphan = self.write(self.image_dir.name, 'new_orphan.jpg')
+        self.mask_orphan = self.write(self.mask_dir.name, 'stale.png', age=7200)
+
+    def tearDown(self):
+        self.image_dir.cleanup()
+        self.mask_dir.cleanup()
+
+    def write(self, root, name, age=0):
+        """Create a file below a storage root, optionally backdated."""
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'data')
+        if age:
+            stamp = time.time() - age
+            os.utime(path, (stamp, stamp))
+        return path
+
+    def make_image(self, name):
+        self.write(self.image_dir.name, name)
+        return Image.objects.create(file=name, original_filename=name, width=1, height=1)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('gc_media', '--workers', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_report_only_by_default(self):
+        """Test that the default run reports differences without deleting anything."""
+        output = self.run_command('-v', '2')
+
+        self.assertIn('Image: 3 files scanned', output)
+        self.assertIn('2 orphaned files (1 too recent to delete), 1 dangling rows', output)
+        self.assertIn('orphan: ab/cd/old_orphan.jpg', output)
+        self.assertIn(f'dangling: Image {self.dangling.pk}', output)
+        self.assertTrue(os.path.exists(self.old_orphan))
+        self.assertTrue(Image.objects.filter(pk=self.dangling.pk).exists())
+
+    def test_rows_sharing_a_missing_file(self):
+        """Test that every row referencing a missing file is reported and deleted."""
+        twin = Image.objects.create(file='gone.jpg', original_filename='gone.jpg', width=1, height=1)
+
+        output = self.run_command('--delete-dangling', '-v', '2')
+
+        self.assertIn('3 rows read', output)
+        self.assertIn('2 dangling rows', output)
+        self.assertIn(f'dangling: Image {self.dangling.pk}', output)
+        self.assertIn(f'dangling: Image {twin.pk}', output)
+        self.assertFalse(Image.objects.filter(file='gone.jpg').exists())
+        self.assertTrue(Image.objects.filter(pk=self.kept.pk).exists())
+
+    def test_dry_run_deletes_nothing(self):
+        """Test that --dry-run only reports what would be deleted."""
+        output = self.run_command('--delete-orphans', '--delete-dangling', '--dry-run')
+
+        self.assertIn('[dry run] Image: deleted 1 orphaned files', output)
+        self.assertTrue(os.path.exists(self.old_orphan))
+        self.assertTrue(Image.objects.filter(pk=self.dangling.pk).exists())
+
+    def test_delete(self):
+        """Test that old orphans and dangling rows are removed and the rest kept."""
+        self.run_command('--delete-orphans', '--delete-dangling')
+
+        self.assertFalse(os.path.exists(self.old_orphan))
+        self.assertFalse(os.path.exists(self.mask_orphan))
+        self.assertTrue(os.path.exists(self.new_orphan))
+        self.assertTrue(os.path.exists(os.path.join(self.image_dir.name, 'kept.jpg')))
+        self.assertFalse(Image.objects.filter(pk=self.dangling.pk).exists())
+        self.assertTrue(Image.objects.filter(pk=self.kept.pk).exists())
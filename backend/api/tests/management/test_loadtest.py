@@ -0,0 +1,54 @@
+"""
+Tests for the loadtest management command.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TransactionTestCase
+from api.management.commands.loadtest import parse_mix, percentile
+from api.models import Image, Mask
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    """Tests for a short run against the test database."""
+
+    def test_run_reports_and_cleans_up(self):
+        """Test that every operation is exercised, reported and cleaned up."""
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, 'results.json')
+            # One client: the in-memory test database doesn't take concurrent writers
+            call_command(
+                'loadtest', clients=1, requests=24, seed_images=2, upload_megapixels=0.01,
+                mix='list=1,detail=1,upload=1,save=1', output=output, stdout=out,
+            )
+            with open(output) as f:
+                results = json.load(f)['results']
+
+        self.assertEqual(results['total']['requests'], 24)
+        self.assertEqual(results['total']['errors'], 0)
+        for operation in ('list', 'detail', 'upload', 'save'):
+            self.assertGreater(results[operation]['requests'], 0)
+            self.assertIn(operation, out.getvalue())
+        self.assertFalse(Image.objects.exists())
+        self.assertFalse(Mask.objects.exists())
+
+
+class LoadTestHelperTests(SimpleTestCase):
+    """Tests for the mix parser and percentiles."""
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('list=3, detail=1'), {'list': 3.0, 'detail': 1.0})
+        with self.assertRaises(CommandError):
+            parse_mix('browse=1')
+        with self.assertRaises(CommandError):
+            parse_mix('list=0')
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 100)
+        self.assertEqual(percentile([], 0.5), 0.0)
@@ -0,0 +1,82 @@
+"""
+Tests for the shard_media management command.
+"""
+import os
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from api.models import Image, Mask
+
+
+class ShardMediaCommandTests(TestCase):
+    """Tests for moving existing files into the sharded layout."""
+
+    def setUp(self):
+        """Create flat files on disk with matching rows."""
+        self.image_storage = Image._meta.get_field('file').storage
+        self.mask_storage = Mask._meta.get_field('file').storage
+        self.image = Image.objects.create(
+            file=self.image_storage.save('shard_test.jpg', StringIO('image')),
+            original_filename='shard_test.jpg',
+            width=10,
+            height=10
+        )
+        self.mask = Mask.objects.create(
+            file=self.mask_storage.save('shard_test.png', StringIO('mask')),
+            image=self.image,
+            original_width=10,
+            original_height=10
+        )
+        self.missing = Image.objects.create(
+            file='shard_missing.jpg',
+            original_filename='shard_missing.jpg',
+            width=10,
+            height=10
+        )
+
+    def run_command(self, *args):
+        """Run shard_media with a two-level layout and return its output."""
+        out = StringIO()
+        with patch.object(self.image_storage, 'shard_depth', 2), \
+                patch.object(self.mask_storage, 'shard_depth', 2):
+            call_command('shard_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_files_and_rewrites_rows(self):
+        """Test that files move into shards and rows point at them."""
+        output = self.run_command('--workers', '2')
+
+        self.image.refresh_from_db()
+        self.mask.refresh_from_db()
+        self.assertEqual(self.image.file.name.count('/'), 2)
+        self.assertTrue(os.path.exists(self.image.file.path))
+        self.assertTrue(os.path.exists(self.mask.file.path))
+        self.assertFalse(os.path.exists(self.image_storage.path('shard_test.jpg')))
+        self.assertIn('Image: 1 moved, 0 already in place, 1 missing', output)
+
+        # Re-running is a no-op
+        self.assertIn('Image: 0 moved', self.run_command())
+
+    def test_dry_run_changes_nothing(self):
+        """Test that --dry-run leaves files and rows alone."""
+        self.run_command('--dry-run')
+
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.file.name, 'shard_test.jpg')
+        self.assertTrue(os.path.exists(self.image_storage.path('shard_test.jpg')))
+
+    def tearDown(self):
+        """Remove files created by the test, wherever they ended up."""
+        for obj in (self.image, self.mask):
+            obj.refresh_from_db()
+            for name in {obj.file.name, os.path.basename(obj.file.name)}:
+                storage = obj.file.storage
+                if storage.exists(name):
+                    path = storage.path(name)
+                    os.remove(path)
+                    # Drop now-empty shard directories
+                    directory = os.path.dirname(path)
+                    while directory != storage.location and not os.listdir(directory):
+                        os.rmdir(directory)
+                        directory = os.path.dirname(directory)
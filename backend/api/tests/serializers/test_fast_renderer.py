@@ -0,0 +1,56 @@
+"""
+Tests for the orjson-backed FastJSONRenderer.
+
+This file contains tests to ensure FastJSONRenderer produces exactly the
+same bytes as DRF's JSONRenderer for the values our API returns.
+"""
+import datetime
+import decimal
+import unittest
+import uuid
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from api.renderers import FastJSONRenderer, orjson
+
+
+@unittest.skipIf(orjson is None, "orjson is not installed")
+class FastJSONRendererTests(TestCase):
+    """Tests for byte compatibility with JSONRenderer."""
+
+    def assertSameBytes(self, data, accepted_media_type='application/json', context=None):
+        """Assert both renderers produce identical output."""
+        expected = JSONRenderer().render(data, accepted_media_type, context or {})
+        actual = FastJSONRenderer().render(data, accepted_media_type, context or {})
+        self.assertEqual(actual, expected)
+
+    def test_datetimes(self):
+        """Test aware, naive and microsecond datetimes, dates and times."""
+        self.assertSameBytes({
+            'aware': timezone.now(),
+            'utc': datetime.datetime(2025, 3, 19, 10, 0, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2025, 3, 19, 10, 0, 0, 123456),
+            'date': datetime.date(2025, 3, 19),
+            'time': datetime.time(10, 0, 0, 500000),
+        })
+
+    def test_decimals_and_uuids(self):
+        """Test decimal and UUID values."""
+        self.assertSameBytes({
+            'price': decimal.Decimal('12.50'),
+            'ratio': decimal.Decimal('0.1'),
+            'token': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        })
+
+    def test_unicode_and_separators(self):
+        """Test non-ASCII text and JavaScript line separators."""
+        self.assertSameBytes({'name': 'Ærøskøbing 写真', 'note': 'line\u2028para\u2029end'})
+
+    def test_non_string_keys_and_nesting(self):
+        """Test integer EXIF keys and nested lists."""
+        self.assertSameBytes([{'exif': {37500: 'maker', 'Make': 'Canon'}, 'ids': [1, 2, 3]}])
+
+    def test_empty_and_indented(self):
+        """Test None and the indented (browsable) fallback."""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertSameBytes({'a': [1, 2]}, 'application/json; indent=4')
@@ -0,0 +1,130 @@
+"""
+A minimal in-process S3-compatible server for object storage tests.
+
+Supports the subset of the S3 API used by api.utils.object_storage:
+PUT/GET (with Range)/HEAD/DELETE on objects and multipart uploads.
+Signatures are not verified. Requests and TCP connections are counted so
+tests can assert on connection reuse.
+"""
+import re
+import threading
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+class FakeS3Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        parts = urlsplit(self.path)
+        _, _, key = unquote(parts.path).lstrip('/').partition('/')
+        query = {name: values[0] for name, values in parse_qs(parts.query, keep_blank_values=True).items()}
+        with self.server.lock:
+            self.server.requests.append((self.command, key, dict(query), self.headers.get('range')))
+        return key, query
+
+    def _body(self):
+        length = int(self.headers.get('content-length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body=b'', headers=None, content_length=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body) if content_length is None else content_length))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_PUT(self):
+        key, query = self._parse()
+        body = self._body()
+        etag = f'"{uuid.uuid4().hex}"'
+        if 'uploadId' in query:
+            self.server.uploads[query['uploadId']][int(query['partNumber'])] = (etag, body)
+        else:
+            self.server.objects[key] = body
+        self._send(200, headers={'ETag': etag})
+
+    def do_POST(self):
+        key, query = self._parse()
+        body = self._body()
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            self.server.uploads[upload_id] = {}
+            self._send(200, (
+                '<InitiateMultipartUploadResult><UploadId>'
+                f'{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            ).encode())
+            return
+        parts = self.server.uploads.pop(query['uploadId'])
+        numbers = [int(n) for n in re.findall(rb'<PartNumber>(\d+)</PartNumber>', body)]
+        self.server.objects[key] = b''.join(parts[n][1] for n in numbers)
+        self._send(200, b'<CompleteMultipartUploadResult></CompleteMultipartUploadResult>')
+
+    def do_HEAD(self):
+        key, _ = self._parse()
+        if key not in self.server.objects:
+            self._send(404)
+            return
+        self._send(200, headers={'Last-Modified': formatdate(usegmt=True)},
+                   content_length=len(self.server.objects[key]))
+
+    def do_GET(self):
+        key, _ = self._parse()
+        data = self.server.objects.get(key)
+        if data is None:
+            self._send(404, b'<Error><Code>NoSuchKey</Code></Error>')
+            return
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('range') or '')
+        if not match:
+            self._send(200, data)
+            return
+        start, end = int(match.group(1)), int(match.group(2))
+        if start >= len(data):
+            self._send(416)
+            return
+        self._send(206, data[start:end + 1])
+
+    def do_DELETE(self):
+        key, query = self._parse()
+        if 'uploadId' in query:
+            self.server.uploads.pop(query['uploadId'], None)
+        else:
+            self.server.objects.pop(key, None)
+        self._send(204)
+
+
+class FakeS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeS3Handler)
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.uploads = {}
+        self.requests = []
+        self.connections = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
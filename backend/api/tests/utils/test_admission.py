@@ -0,0 +1,154 @@
+"""
+Tests for upload admission control.
+"""
+import asyncio
+import io
+import threading
+import time
+from PIL import Image as PILImage
+from django.test import SimpleTestCase
+
+from api.utils.admission import PixelBudget, Saturated, estimate_pixels
+
+
+class PixelBudgetTests(SimpleTestCase):
+    """Tests for the pixels-in-flight budget."""
+
+    def test_admits_within_budget(self):
+        """Test that work is admitted while it fits and counted."""
+        budget = PixelBudget(max_pixels=100, max_queued=1, queue_timeout=1)
+
+        with budget.admit(60):
+            with budget.admit(40):
+                snapshot = budget.snapshot()
+                self.assertEqual((snapshot['pixels_in_flight'], snapshot['running']), (100, 2))
+
+        snapshot = budget.snapshot()
+        self.assertEqual((snapshot['pixels_in_flight'], snapshot['admitted']), (0, 2))
+
+    def test_oversized_work_runs_alone(self):
+        """Test that an image larger than the budget is admitted when nothing else runs."""
+        budget = PixelBudget(max_pixels=100, max_queued=0, queue_timeout=0)
+
+        with budget.admit(10_000):
+            self.assertEqual(budget.snapshot()['pixels_in_flight'], 100)
+
+    def test_rejects_when_queue_full(self):
+        """Test that work beyond the queue bound is refused immediately."""
+        budget = PixelBudget(max_pixels=100, max_queued=0, queue_timeout=5)
+
+        with budget.admit(100):
+            with self.assertRaises(Saturated) as raised:
+                budget.acquire(1)
+
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(budget.snapshot()['rejected'], 1)
+
+    def test_queue_timeout(self):
+        """Test that a queued request gives up after queue_timeout."""
+        budget = PixelBudget(max_pixels=100, max_queued=1, queue_timeout=0.05)
+
+        with budget.admit(100):
+            with self.assertRaises(Saturated):
+                budget.acquire(1)
+
+        snapshot = budget.snapshot()
+        self.assertEqual((snapshot['timed_out'], snapshot['queue_depth']), (1, 0))
+
+    def test_waiters_admitted_in_order(self):
+        """Test that queued work is admitted first come, first served."""
+        budget = PixelBudget(max_pixels=100, max_queued=2, queue_timeout=5)
+        order = []
+
+        def worker(name, pixels):
+            with budget.admit(pixels):
+                order.append(name)
+
+        reserved = budget.acquire(100)
+        threads = [threading.Thread(target=worker, args=('large', 96))]
+        threads[0].start()
+        while budget.snapshot()['queue_depth'] < 1:
+            time.sleep(0.001)
+        threads.append(threading.Thread(target=worker, args=('small', 5)))
+        threads[1].start()
+        while budget.snapshot()['queue_depth'] < 2:
+            time.sleep(0.001)
+        budget.release(reserved)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, ['large', 'small'])
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Test that cancelling a queued aadmit frees its place in line."""
+        budget = PixelBudget(max_pixels=100, max_queued=1, queue_timeout=5)
+        reserved = budget.acquire(100)
+
+        async def admitted():
+            async with budget.aadmit(10):
+                pass
+
+        task = asyncio.ensure_future(admitted())
+        while budget.snapshot()['queue_depth'] < 1:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        while budget.snapshot()['queue_depth']:
+            await asyncio.sleep(0.001)
+        budget.release(reserved)
+
+        snapshot = budget.snapshot()
+        self.assertEqual((snapshot['pixels_in_flight'], snapshot['running']), (0, 0))
+
+    async def test_async_waiter_takes_no_thread(self):
+        """Test that a queued aadmit waits on the event loop and is woken by a release from a thread."""
+        budget = PixelBudget(max_pixels=100, max_queued=1, queue_timeout=5)
+        reserved = budget.acquire(100)
+        threads_before = threading.active_count()
+
+        async def admitted():
+            async with budget.aadmit(10):
+                return budget.snapshot()['pixels_in_flight']
+
+        task = asyncio.ensure_future(admitted())
+        while budget.snapshot()['queue_depth'] < 1:
+            await asyncio.sleep(0.001)
+        self.assertEqual(threading.active_count(), threads_before)
+
+        releaser = threading.Thread(target=budget.release, args=(reserved,))
+        releaser.start()
+        self.assertEqual(await asyncio.wait_for(task, 5), 10)
+        releaser.join()
+
+        snapshot = budget.snapshot()
+        self.assertEqual((snapshot['pixels_in_flight'], snapshot['queue_depth']), (0, 0))
+
+    async def test_async_queue_timeout(self):
+        """Test that a queued aadmit gives up after queue_timeout."""
+        budget = PixelBudget(max_pixels=100, max_queued=1, queue_timeout=0.05)
+
+        with budget.admit(100):
+            with self.assertRaises(Saturated):
+                async with budget.aadmit(1):
+                    pass
+
+        snapshot = budget.snapshot()
+        self.assertEqual((snapshot['timed_out'], snapshot['queue_depth']), (1, 0))
+
+
+class EstimatePixelsTests(SimpleTestCase):
+    """Tests for reading the pixel count from the header."""
+
+    def test_reads_header(self):
+        """Test that the size comes from the header and the file is rewound."""
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (40, 30)).save(buffer, 'JPEG')
+        buffer.seek(7)
+
+        self.assertEqual(estimate_pixels(buffer), 1200)
+        self.assertEqual(buffer.tell(), 0)
+
+    def test_unreadable(self):
+        """Test that a file PIL can't identify counts as one pixel."""
+        self.assertEqual(estimate_pixels(io.BytesIO(b'not an image')), 1)
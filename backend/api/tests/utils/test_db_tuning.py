@@ -0,0 +1,43 @@
+"""
+Tests for the SQLite connection tuning hook.
+"""
+import sqlite3
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from django.test import SimpleTestCase, override_settings
+
+from api.utils.db_tuning import configure_sqlite
+
+
+class SqliteTuningTests(SimpleTestCase):
+    """Tests for the connection_created PRAGMA hook."""
+
+    def pragma(self, name):
+        """Run the hook on a plain in-memory SQLite connection and read a PRAGMA back."""
+        raw = sqlite3.connect(':memory:')
+        try:
+            configure_sqlite(sender=None, connection=SimpleNamespace(vendor='sqlite', connection=raw))
+            return raw.execute(f"PRAGMA {name}").fetchone()[0]
+        finally:
+            raw.close()
+
+    def test_pragmas_applied_to_new_connections(self):
+        """Test that the configured PRAGMAs are set when a connection opens."""
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_configured_pragmas(self):
+        """Test that the hook applies settings.SQLITE_PRAGMAS."""
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        self.assertEqual(self.pragma('synchronous'), 2)  # SQLite's default, FULL
+
+    def test_other_vendors_untouched(self):
+        """Test that non-SQLite connections are not sent PRAGMAs."""
+        other = MagicMock(vendor='postgresql')
+
+        configure_sqlite(sender=None, connection=other)
+
+        other.cursor.assert_not_called()
+        other.connection.execute.assert_not_called()
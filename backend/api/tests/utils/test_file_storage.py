@@ -126,4 +126,40 @@ class FilenameFunctionTests(TestCase):
         self.assertNotIn('&', safe)
         
         # Check that the extension is preserved
-        self.assertTrue(safe.endswith('.jpg'))
\ No newline at end of file
+        self.assertTrue(safe.endswith('.jpg'))
+
+class ShardedStorageTests(TestCase):
+    """Tests for the hash-prefix sharded layout."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.storage = SecureFileStorage(
+            location=self.temp_dir.name,
+            base_url='/media/',
+            file_types=['.jpg', '.png'],
+            shard_depth=2
+        )
+    
+    def tearDown(self):
+        """Clean up test environment."""
+        self.temp_dir.cleanup()
+    
+    def test_shard_name_is_deterministic(self):
+        """Test that a name always maps to the same two-level shard."""
+        sharded = self.storage.shard_name('photo.jpg')
+        self.assertRegex(sharded, r'^[0-9a-f]{2}/[0-9a-f]{2}/photo\.jpg$')
+        self.assertEqual(self.storage.shard_name(f'other/{sharded}'), sharded)
+    
+    def test_flat_layout_when_disabled(self):
+        """Test that a shard depth of 0 keeps the flat layout."""
+        self.storage.shard_depth = 0
+        self.assertEqual(self.storage.shard_name('ab/cd/photo.jpg'), 'photo.jpg')
+    
+    def test_save_writes_into_shard(self):
+        """Test that saved files land in their shard directory."""
+        name = self.storage.save('test.jpg', SimpleUploadedFile('test.jpg', b'data'))
+        
+        self.assertEqual(name.count('/'), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, name)))
+        self.assertEqual(self.storage.url(name), f'/media/{name}')
@@ -0,0 +1,87 @@
+"""
+Test file for memory profiling of image processing.
+
+This file contains tests to ensure that:
+1. Nothing is traced or logged while profiling is disabled
+2. A profiled block logs its peak and largest allocations, then stops tracing
+   (once the last of several overlapping blocks ends)
+3. process_uploaded_image is profiled when enabled
+"""
+import io
+import tracemalloc
+from PIL import Image as PILImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from api.utils import memory
+from api.utils.image_processing import process_uploaded_image
+
+
+class MemoryProfileTest(SimpleTestCase):
+    """Test class for tracemalloc profiling"""
+
+    def test_disabled(self):
+        """Test that profiling is off by default"""
+        with self.assertNoLogs('api.memory'):
+            with memory.profile('block'):
+                self.assertFalse(tracemalloc.is_tracing())
+
+    @override_settings(PROFILE_IMAGE_MEMORY=True, PROFILE_IMAGE_MEMORY_TOP=3)
+    def test_reports_allocations(self):
+        """Test that the peak and the top allocations are logged"""
+        with self.assertLogs('api.memory', 'INFO') as logs:
+            with memory.profile('block'):
+                self.assertTrue(tracemalloc.is_tracing())
+                transient = bytearray(4_000_000)
+                del transient
+                kept = [bytearray(1_000_000)]
+
+        self.assertFalse(tracemalloc.is_tracing())
+        record = logs.records[0]
+        self.assertEqual(record.label, 'block')
+        self.assertGreaterEqual(record.peak_bytes, 4_000_000)
+        self.assertLessEqual(len(record.allocations), 3)
+        self.assertIn('test_memory.py', record.allocations[0]['location'])
+        self.assertGreaterEqual(record.allocations[0]['bytes'], 1_000_000)
+        self.assertTrue(kept)
+
+    @override_settings(PROFILE_IMAGE_MEMORY=True)
+    def test_overlapping_blocks(self):
+        """Test that tracing stops only when the last of overlapping blocks ends"""
+        first, second = memory.profile('first'), memory.profile('second')
+        with self.assertLogs('api.memory', 'INFO'):
+            first.__enter__()
+            second.__enter__()
+            first.__exit__(None, None, None)
+            self.assertTrue(tracemalloc.is_tracing())
+            second.__exit__(None, None, None)
+
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @override_settings(PROFILE_IMAGE_MEMORY=True)
+    def test_tracing_started_elsewhere_left_running(self):
+        """Test that tracing the module didn't start is not stopped"""
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        with self.assertLogs('api.memory', 'INFO'):
+            with memory.profile('block'):
+                pass
+
+        self.assertTrue(tracemalloc.is_tracing())
+
+    @override_settings(PROFILE_IMAGE_MEMORY=True)
+    def test_process_uploaded_image_profiled(self):
+        """Test that image processing is profiled when enabled"""
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (32, 24), 'green').save(buffer, 'JPEG')
+        upload = SimpleUploadedFile('profiled.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+        with self.assertLogs('api.memory', 'INFO') as logs:
+            process_uploaded_image(upload)
+
+        self.assertIn('process_uploaded_image peak=', logs.output[0])
+
+    def test_decoded_bytes(self):
+        """Test the decoded size estimate"""
+        self.assertEqual(memory.decoded_bytes(PILImage.new('RGB', (10, 10))), 300)
+        self.assertEqual(memory.decoded_bytes(PILImage.new('L', (10, 10))), 100)
+        self.assertEqual(memory.decoded_bytes(PILImage.new('RGBA', (10, 10))), 400)
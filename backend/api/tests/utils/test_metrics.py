@@ -0,0 +1,120 @@
+"""
+Test file for the Prometheus metrics registry.
+
+This file contains tests to ensure that:
+1. Counters, gauges and histograms render in the text exposition format
+2. Histogram buckets are cumulative
+3. Label values are escaped and label names are checked
+4. Values in a metrics directory are merged across worker processes
+5. Gauges of exited processes are dropped from the merge
+"""
+import multiprocessing
+import tempfile
+from django.test import TestCase, override_settings
+from api.utils import metrics
+from api.utils.metrics import MmapValues
+
+
+class MetricsRegistryTest(TestCase):
+    """Test class for rendering metrics"""
+
+    def setUp(self):
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+
+    def test_counter(self):
+        """Test that counters render with a _total suffix and their labels"""
+        metrics.CACHE_REQUESTS.inc(3, kind='image', result='hit')
+        metrics.CACHE_REQUESTS.inc(kind='image', result='miss')
+
+        text = metrics.generate_latest()
+
+        self.assertIn('# TYPE api_serializer_cache_requests counter', text)
+        self.assertIn('api_serializer_cache_requests_total{kind="image",result="hit"} 3', text)
+        self.assertIn('api_serializer_cache_requests_total{kind="image",result="miss"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that bucket counts include all smaller buckets"""
+        metrics.UPLOAD_BYTES.observe(1000)
+        metrics.UPLOAD_BYTES.observe(5000)
+        metrics.UPLOAD_BYTES.observe(10 ** 9)
+
+        text = metrics.generate_latest()
+
+        self.assertIn('api_upload_bytes_bucket{le="1024"} 1', text)
+        self.assertIn('api_upload_bytes_bucket{le="16384"} 2', text)
+        self.assertIn('api_upload_bytes_bucket{le="67108864"} 2', text)
+        self.assertIn('api_upload_bytes_bucket{le="+Inf"} 3', text)
+        self.assertIn('api_upload_bytes_sum 1000006000', text)
+        self.assertIn('api_upload_bytes_count 3', text)
+
+    def test_gauge(self):
+        """Test that gauges keep the last value set"""
+        metrics.ADMISSION_QUEUE_DEPTH.set(4)
+        metrics.ADMISSION_QUEUE_DEPTH.set(2)
+
+        self.assertIn('api_upload_admission_queue_depth 2\n', metrics.generate_latest())
+
+    def test_label_escaping(self):
+        """Test that quotes, backslashes and newlines in label values are escaped"""
+        metrics.REQUEST_QUERIES.observe(1, view='a"b\\c\nd')
+
+        self.assertIn('api_request_db_queries_count{view="a\\"b\\\\c\\nd"} 1', metrics.generate_latest())
+
+    def test_wrong_labels(self):
+        """Test that observing with the wrong label names is an error"""
+        with self.assertRaises(ValueError):
+            metrics.REQUEST_QUERIES.observe(1, path='/api/')
+
+
+def observe_in_child(directory):
+    """Record metrics from a separate worker process."""
+    with override_settings(METRICS_DIR=directory):
+        metrics.store.reset()
+        metrics.CACHE_REQUESTS.inc(2, kind='mask', result='hit')
+        metrics.MASK_BYTES.observe(100)
+        metrics.ADMISSION_RUNNING.set(5)
+
+
+class MultiprocessMetricsTest(TestCase):
+    """Test class for metrics shared through a directory"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(METRICS_DIR=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+
+    def test_values_merge_across_processes(self):
+        """Test that counters and histograms of every process are summed"""
+        metrics.CACHE_REQUESTS.inc(kind='mask', result='hit')
+        metrics.MASK_BYTES.observe(5000)
+        metrics.ADMISSION_RUNNING.set(1)
+
+        child = multiprocessing.get_context('fork').Process(target=observe_in_child, args=(self.directory.name,))
+        child.start()
+        child.join()
+
+        text = metrics.generate_latest()
+        self.assertIn('api_serializer_cache_requests_total{kind="mask",result="hit"} 3', text)
+        self.assertIn('api_mask_bytes_bucket{le="1024"} 1', text)
+        self.assertIn('api_mask_bytes_count 2', text)
+        # The child has exited, so only this process's gauge counts
+        self.assertIn('api_upload_admission_running 1\n', text)
+
+    def test_file_grows(self):
+        """Test that the value file is extended when its keys outgrow it"""
+        values = MmapValues(f"{self.directory.name}/counter-0.db")
+        self.addCleanup(values.close)
+        key = 'k' * 1000
+        for i in range(2000):
+            values.add(f"{key}{i}", i)
+        values.set(f"{key}7", 0.5)
+
+        read = dict(MmapValues.read(values.path))
+        self.assertEqual(len(read), 2000)
+        self.assertEqual(read[f"{key}1999"], 1999)
+        self.assertEqual(read[f"{key}7"], 0.5)
@@ -0,0 +1,127 @@
+"""
+Tests for the S3-compatible object storage backend.
+"""
+import os
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from api.utils.file_storage import SecureFileStorage
+from api.utils.object_storage import ObjectStoreClient
+from .fake_s3 import FakeS3Server
+
+
+class ObjectStorageTests(SimpleTestCase):
+    """Tests for SecureFileStorage with the 's3' backend against a fake server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeS3Server().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        """Build a storage whose client talks to the fake server."""
+        self.server.objects.clear()
+        self.server.requests.clear()
+        self.options = {
+            'ENDPOINT_URL': self.server.endpoint_url,
+            'BUCKET': 'test-bucket',
+            'ACCESS_KEY': 'test',
+            'SECRET_KEY': 'secret',
+            'MULTIPART_THRESHOLD': 1024,
+            'MULTIPART_CHUNK_SIZE': 512,
+            'READ_CHUNK_SIZE': 64,
+        }
+        with override_settings(MEDIA_OBJECT_STORAGE=self.options):
+            self.storage = SecureFileStorage(
+                location=os.path.join(settings.MEDIA_ROOT, 'images'),
+                file_types=['.jpg', '.png'],
+                shard_depth=0,
+                backend='s3'
+            )
+        # Fresh client per test so pool and metadata cache state don't leak
+        self.storage.object_store = ObjectStoreClient(self.options)
+
+    def requests_of(self, method):
+        return [request for request in self.server.requests if request[0] == method]
+
+    def test_save_open_exists_delete(self):
+        """Test the basic object lifecycle under the location's key prefix."""
+        name = self.storage.save('test.jpg', SimpleUploadedFile('test.jpg', b'image data'))
+
+        self.assertEqual(self.server.objects[f'images/{name}'], b'image data')
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), len(b'image data'))
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'image data')
+
+        self.storage.delete(name)
+        self.assertNotIn(f'images/{name}', self.server.objects)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_large_file_uses_multipart_upload(self):
+        """Test that files above the threshold are uploaded in parts."""
+        data = os.urandom(2000)
+        name = self.storage.save('big.png', SimpleUploadedFile('big.png', data))
+
+        self.assertEqual(self.server.objects[f'images/{name}'], data)
+        part_uploads = [r for r in self.requests_of('PUT') if 'partNumber' in r[2]]
+        self.assertEqual(len(part_uploads), 4)
+
+    def test_reads_fetch_ranges(self):
+        """Test that a small header read only downloads one read-ahead window."""
+        data = bytes(range(256)) * 4
+        name = self.storage.save('test.jpg', SimpleUploadedFile('test.jpg', data))
+
+        f = self.storage.open(name)
+        self.assertEqual(f.read(8), data[:8])
+        self.assertEqual(self.requests_of('GET')[-1][3], 'bytes=0-63')
+
+        f.seek(500)
+        self.assertEqual(f.read(100), data[500:600])
+        self.assertEqual(len(self.requests_of('GET')), 2)
+
+    def test_connections_are_reused(self):
+        """Test that sequential requests share a keep-alive connection."""
+        connections_before = self.server.connections
+        for i in range(5):
+            self.storage.save(f'test{i}.jpg', SimpleUploadedFile(f'test{i}.jpg', b'data'))
+
+        self.assertEqual(self.server.connections - connections_before, 1)
+
+    def test_metadata_is_cached(self):
+        """Test that repeated exists()/size() calls issue a single HEAD."""
+        name = self.storage.save('test.jpg', SimpleUploadedFile('test.jpg', b'data'))
+        self.server.requests.clear()
+
+        for _ in range(3):
+            self.assertTrue(self.storage.exists(name))
+            self.assertEqual(self.storage.size(name), 4)
+
+        self.assertEqual(len(self.requests_of('HEAD')), 1)
+
+    def test_missing_objects_not_cached(self):
+        """Test that a miss is not cached, so an object written elsewhere is seen at once."""
+        self.assertFalse(self.storage.exists('later.jpg'))
+
+        # Another worker uploads the object
+        self.server.objects['images/later.jpg'] = b'data'
+
+        self.assertTrue(self.storage.exists('later.jpg'))
+        self.assertEqual(self.storage.size('later.jpg'), 4)
+
+    def test_save_and_delete_invalidate_metadata(self):
+        """Test that saving and deleting through the storage drop cached metadata."""
+        name = self.storage.save('test.jpg', SimpleUploadedFile('test.jpg', b'data'))
+        self.assertEqual(self.storage.size(name), 4)
+
+        self.storage._save(name, SimpleUploadedFile('test.jpg', b'longer data'))
+        self.assertEqual(self.storage.size(name), len(b'longer data'))
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
@@ -0,0 +1,207 @@
+"""
+Tests for the append-only mask pack files.
+"""
+import hashlib
+import os
+import tempfile
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from api.models import Image, Mask, PackedBlob
+from api.serializers import MaskSerializer
+from api.utils.pack_storage import PackStore
+
+
+class PackStoreTests(TestCase):
+    """Tests for appending, reading and compacting blobs."""
+
+    def setUp(self):
+        """Create a store with small packs in a temporary directory."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = PackStore('masks', self.temp_dir.name, max_pack_bytes=100)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read(self, name):
+        reader = self.store.open(name)
+        try:
+            return reader.read()
+        finally:
+            reader.close()
+
+    def test_append_and_read(self):
+        """Test that blobs round-trip through the index and mmap."""
+        self.store.append('a.png', b'first')
+        self.store.append('b.png', b'second')
+
+        self.assertEqual(self.read('a.png'), b'first')
+        self.assertEqual(self.read('b.png'), b'second')
+        blob = self.store.lookup('b.png')
+        self.assertEqual((blob.pack, blob.offset, blob.length), (1, 5, 6))
+        self.assertIsNone(self.store.open('missing.png'))
+
+    def test_new_pack_when_full(self):
+        """Test that appends roll over to a new pack past max_pack_bytes."""
+        self.store.append('a.png', b'x' * 80)
+        self.store.append('b.png', b'y' * 80)
+
+        self.assertEqual(self.store.pack_numbers(), [1, 2])
+        self.assertEqual(self.read('b.png'), b'y' * 80)
+
+    def test_overwrite_supersedes(self):
+        """Test that saving a name again points the index at the new bytes."""
+        self.store.append('a.png', b'old')
+        self.store.append('a.png', b'new')
+
+        self.assertEqual(self.read('a.png'), b'new')
+        self.assertEqual(PackedBlob.objects.filter(name='a.png').count(), 1)
+
+    def test_compaction_reclaims_superseded_bytes(self):
+        """Test that mostly-dead packs are rewritten and removed."""
+        self.store.append('keep.png', b'k' * 10)
+        self.store.append('dead.png', b'd' * 80)
+        self.store.append('next.png', b'n' * 80)  # Rolls over to pack 2
+        self.store.delete('dead.png')
+
+        result = self.store.compact(min_garbage_ratio=0.5)
+
+        self.assertEqual(result, {'packs': 1, 'blobs': 1, 'reclaimed_bytes': 80})
+        self.assertNotIn(1, self.store.pack_numbers())
+        self.assertEqual(self.read('keep.png'), b'k' * 10)
+        self.assertEqual(self.read('next.png'), b'n' * 80)
+
+    def test_compaction_dry_run(self):
+        """Test that a dry run only reports."""
+        self.store.append('dead.png', b'd' * 80)
+        self.store.append('next.png', b'n' * 80)
+        self.store.delete('dead.png')
+
+        result = self.store.compact(dry_run=True)
+
+        self.assertEqual(result['reclaimed_bytes'], 80)
+        self.assertEqual(self.store.pack_numbers(), [1, 2])
+
+    def test_stale_pack_not_appended_after_compaction(self):
+        """Test that a process holding an older pack open moves on to the newest one."""
+        other = PackStore('masks', self.temp_dir.name, max_pack_bytes=100)
+        other.append('other.png', b'o' * 10)  # The other process keeps pack 1 open
+        self.store.append('dead.png', b'd' * 80)
+        self.store.append('next.png', b'n' * 80)  # Rolls over to pack 2
+        self.store.delete('dead.png')
+        self.store.compact(min_garbage_ratio=0.5)
+
+        other.append('late.png', b'l' * 5)
+
+        self.assertNotIn(1, self.store.pack_numbers())
+        self.assertEqual(self.store.lookup('late.png').pack, self.store.pack_numbers()[-1])
+        self.assertEqual(self.read('late.png'), b'l' * 5)
+        self.assertEqual(self.read('other.png'), b'o' * 10)
+
+    def test_compaction_holds_append_lock(self):
+        """Test that live blobs are copied under the append lock."""
+        self.store.append('live.png', b'l' * 5)
+        self.store.append('dead.png', b'd' * 80)
+        self.store.append('next.png', b'n' * 80)  # Rolls over to pack 2
+        self.store.delete('dead.png')
+        locked = []
+        original = self.store._write_locked
+
+        def write_locked(data):
+            locked.append(self.store._lock.locked())
+            return original(data)
+
+        with patch.object(self.store, '_write_locked', write_locked):
+            self.store.compact(min_garbage_ratio=0.5)
+
+        self.assertEqual(locked, [True])
+        self.assertEqual(self.read('live.png'), b'l' * 5)
+
+    def test_pack_kept_while_index_points_into_it(self):
+        """Test that a pack is not deleted if a row still refers to it after copying."""
+        self.store.append('dead.png', b'd' * 80)
+        self.store.append('next.png', b'n' * 80)
+        self.store.delete('dead.png')
+        original = self.store._write_locked
+
+        def write_locked(data):
+            # Another writer repoints a row into the pack being compacted
+            PackedBlob.objects.create(
+                namespace='masks', name='racing.png', pack=1, offset=0, length=1,
+                sha256=hashlib.sha256(b'd').hexdigest(),
+            )
+            return original(data)
+
+        # A live one-byte blob at the start of pack 1 makes compaction copy something
+        PackedBlob.objects.create(
+            namespace='masks', name='live.png', pack=1, offset=0, length=1,
+            sha256=hashlib.sha256(b'd').hexdigest(),
+        )
+        with patch.object(self.store, '_write_locked', write_locked):
+            result = self.store.compact(min_garbage_ratio=0.5)
+
+        self.assertEqual(result['packs'], 0)
+        self.assertIn(1, self.store.pack_numbers())
+        self.assertEqual(self.read('racing.png'), b'd')
+
+
+class PackedMaskStorageTests(TestCase):
+    """Tests for masks stored in packs through the regular model and API."""
+
+    def setUp(self):
+        """Enable packing on the mask storage."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.storage = Mask._meta.get_field('file').storage
+        patcher = patch.object(self.storage, 'pack_store', PackStore('masks', self.temp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.image = Image.objects.create(
+            file=SimpleUploadedFile('packed.jpg', b'image', content_type='image/jpeg'),
+            original_filename='packed.jpg', width=10, height=10
+        )
+
+    def tearDown(self):
+        self.image.delete()
+        self.temp_dir.cleanup()
+
+    def test_mask_is_packed_and_served(self):
+        """Test that a saved mask lands in a pack and its serialized URL serves it."""
+        mask = Mask.objects.create(
+            file=SimpleUploadedFile('m.png', b'mask bytes', content_type='image/png'),
+            image=self.image, original_width=10, original_height=10
+        )
+
+        self.assertFalse(os.path.exists(os.path.join(self.storage.location, mask.file.name)))
+        self.assertTrue(self.storage.exists(mask.file.name))
+        self.assertEqual(self.storage.size(mask.file.name), len(b'mask bytes'))
+
+        response = self.client.get(MaskSerializer(mask).data['file'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'mask bytes')
+
+        mask.delete()
+        self.assertFalse(self.storage.exists(mask.file.name))
+
+    def test_loose_files_still_readable(self):
+        """Test that masks written before packing was enabled fall through to disk."""
+        with patch.object(self.storage, 'pack_store', None):
+            name = self.storage.save('loose.png', SimpleUploadedFile('loose.png', b'loose'))
+
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'loose')
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_delete_many_and_delete_file(self):
+        """Test that packed blobs are dropped in bulk and delete_file only touches loose files."""
+        packed = self.storage.save('a.png', SimpleUploadedFile('a.png', b'a'))
+        with patch.object(self.storage, 'pack_store', None):
+            loose = self.storage.save('b.png', SimpleUploadedFile('b.png', b'b'))
+
+        self.assertFalse(self.storage.delete_file(packed))
+        self.assertEqual(self.storage.pack_store.delete_many([packed, loose]), {packed})
+        self.assertFalse(self.storage.exists(packed))
+        self.assertTrue(self.storage.delete_file(loose))
+        self.assertFalse(self.storage.exists(loose))
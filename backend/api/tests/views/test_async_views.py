@@ -0,0 +1,170 @@
+"""
+Test file for the async (ASGI) endpoints.
+
+This file contains tests for the async views to ensure they:
+1. Upload images, decoding them in the decode pool from a file on disk
+2. Save masks under the paired filename and release the work queue lease
+3. List images and masks with the same payloads as the sync endpoints
+4. Answer unchanged list polls with 304
+"""
+import io
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from PIL import Image as PILImage
+from django.test import TestCase
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework import status
+from api.models import Image, Mask, ImageLease, PackedBlob
+from api.utils.image_processing import process_image_file
+from api.utils.pack_storage import PackStore
+
+
+def make_jpeg(name='async_test.jpg', size=(32, 24)):
+    """Build a real JPEG upload."""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class AsyncViewsTest(TestCase):
+    """Test class for the async endpoints"""
+
+    def tearDown(self):
+        """Remove stored files"""
+        for mask in Mask.objects.all():
+            mask.delete()
+        for image in Image.objects.all():
+            image.delete()
+
+    async def test_upload_image(self):
+        """Test that an upload is decoded and stored"""
+        response = await self.async_client.post(
+            reverse('async-image-upload'), {'file': make_jpeg()}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual((data['width'], data['height']), (32, 24))
+        image = await Image.objects.aget(pk=data['id'])
+        self.assertTrue(image.file.storage.exists(image.file.name))
+        self.assertEqual(image.metadata['format'], 'JPEG')
+
+    async def test_upload_decoded_from_spooled_file(self):
+        """Test that an in-memory upload is decoded from a temporary file that is then removed"""
+        paths = []
+
+        def record_path(path, name):
+            paths.append(path)
+            return process_image_file(path, name)
+
+        with patch('api.async_views.process_image_file', record_path):
+            response = await self.async_client.post(
+                reverse('async-image-upload'), {'file': make_jpeg()}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(paths), 1)
+        self.assertFalse(os.path.exists(paths[0]))
+
+    async def test_upload_rejects_invalid_type(self):
+        """Test that non-JPEG uploads are rejected"""
+        response = await self.async_client.post(
+            reverse('async-image-upload'),
+            {'file': SimpleUploadedFile('notes.txt', b'text', content_type='text/plain')}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_save_mask_releases_lease(self):
+        """Test that saving a mask stores it under the paired name and frees the image"""
+        image = await Image.objects.acreate(
+            file=make_jpeg('paired.jpg'), original_filename='paired.jpg', width=32, height=24
+        )
+        await ImageLease.objects.acreate(
+            image=image, holder='alice', expires_at=image.uploaded_at
+        )
+
+        response = await self.async_client.post(reverse('async-mask-save'), {
+            'file': SimpleUploadedFile('mask.png', b'PNG mask content', content_type='image/png'),
+            'image': image.id,
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data['annotator'], 'alice')
+        mask = await Mask.objects.aget(pk=data['id'])
+        self.assertEqual(mask.file.name, 'paired.jpg')
+        self.assertFalse(await ImageLease.objects.filter(image=image).aexists())
+
+    async def test_save_packed_mask_off_io_pool(self):
+        """Test that a packed mask's index write runs through the ORM's thread, not the I/O pool"""
+        storage = Mask._meta.get_field('file').storage
+        image = await Image.objects.acreate(
+            file=make_jpeg('packed.jpg'), original_filename='packed.jpg', width=32, height=24
+        )
+        threads = []
+
+        def append(name, data):
+            threads.append(threading.current_thread().name)
+            return store_append(name, data)
+
+        with tempfile.TemporaryDirectory() as pack_dir:
+            store = PackStore('masks', pack_dir)
+            store_append = store.append
+            with patch.object(storage, 'pack_store', store), patch.object(store, 'append', append):
+                response = await self.async_client.post(reverse('async-mask-save'), {
+                    'file': SimpleUploadedFile('mask.png', b'packed mask', content_type='image/png'),
+                    'image': image.id,
+                })
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+                self.assertTrue(await PackedBlob.objects.filter(name='packed.jpg').aexists())
+                await Mask.objects.filter(image=image).adelete()
+                await sync_to_async(storage.delete)('packed.jpg')
+
+        self.assertEqual(len(threads), 1)
+        self.assertFalse(threads[0].startswith('media-io'))
+
+    async def test_save_mask_unknown_image(self):
+        """Test that a missing image is reported like the sync endpoint does"""
+        response = await self.async_client.post(reverse('async-mask-save'), {
+            'file': SimpleUploadedFile('mask.png', b'PNG', content_type='image/png'),
+            'image': 9999,
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.json())
+
+    def test_lists_match_sync_endpoints(self):
+        """Test that the async lists return the sync payloads"""
+        image = Image.objects.create(
+            file=make_jpeg('listed.jpg'), original_filename='listed.jpg', width=32, height=24
+        )
+        Mask.objects.create(
+            file=SimpleUploadedFile('m.png', b'PNG', content_type='image/png'),
+            image=image, original_width=32, original_height=24
+        )
+
+        for sync_name, async_name, query in [
+            ('image-list', 'async-image-list', ''),
+            ('image-list', 'async-image-list', '?fields=id,width&expand=masks'),
+            ('mask-list', 'async-mask-list', ''),
+            ('mask-list', 'async-mask-list', '?expand=image'),
+        ]:
+            expected = self.client.get(reverse(sync_name) + query).json()
+            response = self.client.get(reverse(async_name) + query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json(), expected)
+
+    async def test_list_conditional_get(self):
+        """Test that an unchanged list poll returns 304"""
+        first = await self.async_client.get(reverse('async-image-list'))
+
+        response = await self.async_client.get(
+            reverse('async-image-list'), headers={'if-none-match': first['ETag']}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
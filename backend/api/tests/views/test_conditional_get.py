@@ -0,0 +1,154 @@
+"""
+Tests for ETag / Last-Modified conditional GET support.
+
+This file contains tests to ensure the list and detail endpoints:
+1. Return ETag and Last-Modified headers
+2. Answer unchanged polls with 304 Not Modified
+3. Change their ETag when an Image or Mask is saved or deleted
+4. Give each query string and media type its own ETag
+5. Only use Last-Modified once the second of the latest write has passed
+"""
+from datetime import timedelta
+from unittest.mock import patch
+from django.utils import timezone
+from django.utils.http import http_date
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image, Mask, ChangeVersion
+
+
+class ConditionalGetTests(APITestCase):
+    """
+    Test cases for conditional GET on ImageListView, MaskListView and ImageDetailView.
+    """
+    def setUp(self):
+        """Set up test data."""
+        self.image = Image.objects.create(
+            file='images/test_image1.jpg',
+            original_filename='test_image1.jpg',
+            width=800,
+            height=600,
+            is_mpo=False
+        )
+        self.mask = Mask.objects.create(
+            file='masks/test_image1.png',
+            image=self.image,
+            original_width=800,
+            original_height=600
+        )
+
+    def test_signals_bump_versions(self):
+        """Test that saving and deleting models bumps the table versions."""
+        image_version = ChangeVersion.objects.get(table='image').version
+        mask_version = ChangeVersion.objects.get(table='mask').version
+
+        self.image.save()
+        self.assertEqual(ChangeVersion.objects.get(table='image').version, image_version + 1)
+
+        self.mask.delete()
+        self.assertEqual(ChangeVersion.objects.get(table='mask').version, mask_version + 1)
+
+    def test_list_returns_validators(self):
+        """Test that the image list carries ETag and Last-Modified headers."""
+        ChangeVersion.objects.update(updated_at=timezone.now() - timedelta(seconds=5))
+        response = self.client.get(reverse('image-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_unchanged_poll_returns_304_without_serializing(self):
+        """Test that a matching If-None-Match skips the serializer."""
+        url = reverse('image-list')
+        etag = self.client.get(url)['ETag']
+
+        with patch('api.views.ImageSerializer') as mock_serializer:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        mock_serializer.assert_not_called()
+
+    def test_etag_changes_after_write(self):
+        """Test that writes invalidate previously issued ETags."""
+        url = reverse('mask-list')
+        etag = self.client.get(url)['ETag']
+
+        Mask.objects.create(
+            file='masks/test_image2.png',
+            image=self.image,
+            original_width=800,
+            original_height=600
+        )
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data), 2)
+
+    def test_detail_conditional_get(self):
+        """Test conditional GET on the image detail endpoint."""
+        url = reverse('image-detail', args=[self.image.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_detail_has_no_etag(self):
+        """Test that 404 responses don't carry validators."""
+        url = reverse('image-detail', args=[self.image.id + 999])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+    def test_query_string_and_media_type_vary_etag(self):
+        """Test that different queries and renderers never share an ETag."""
+        url = reverse('image-list')
+        etag = self.client.get(url, {'fields': 'id'})['ETag']
+
+        self.assertEqual(self.client.get(url + '?fields=id')['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'fields': 'id,width'})['ETag'], etag)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+        response = self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Accept', response['Vary'])
+
+        # Parameter order doesn't matter
+        self.assertEqual(
+            self.client.get(url + '?is_mpo=false&fields=id')['ETag'],
+            self.client.get(url + '?fields=id&is_mpo=false')['ETag'],
+        )
+
+    def test_bulk_ids_vary_etag(self):
+        """Test that bulk reads of different ids have different ETags."""
+        url = reverse('image-bulk')
+        etag = self.client.get(url, {'ids': str(self.image.id)})['ETag']
+
+        response = self.client.get(url, {'ids': '999'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_same_second_write_not_hidden_by_if_modified_since(self):
+        """Test that Last-Modified is withheld while more writes could share its second."""
+        url = reverse('image-list')
+        now = timezone.now()
+        ChangeVersion.objects.update(updated_at=now)
+        # Stay in the write's second however long the requests take
+        with patch('api.utils.conditional.time') as clock:
+            clock.time.return_value = now.timestamp()
+            response = self.client.get(url)
+            self.assertNotIn('Last-Modified', response)
+
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(now.timestamp()))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since_after_write_second(self):
+        """Test that If-Modified-Since is answered once the write's second has passed."""
+        ChangeVersion.objects.update(updated_at=timezone.now() - timedelta(seconds=5))
+        url = reverse('image-list')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
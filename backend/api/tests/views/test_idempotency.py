@@ -0,0 +1,182 @@
+"""
+Test file for Idempotency-Key handling on upload and mask save.
+
+This file contains tests to ensure that:
+1. Retries with the same key replay the first response without reprocessing
+2. Reusing a key for a different payload is rejected
+3. A retry while the first request is still running gets 409
+4. Server errors and unexpected failures release the key so the request
+   can be retried, while validation errors are replayed
+5. Sync and async variants of an endpoint share keys
+"""
+import io
+from datetime import timedelta
+from unittest.mock import patch
+from PIL import Image as PILImage
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from rest_framework import status
+from api.models import Image, Mask, IdempotencyKey
+from api.utils import admission
+from api.utils.image_processing import process_uploaded_image
+
+
+def make_jpeg(name='retried.jpg'):
+    """Build a real JPEG upload."""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (16, 12), 'blue').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class IdempotencyTest(TestCase):
+    """Test class for Idempotency-Key handling"""
+
+    def setUp(self):
+        """Set up test client"""
+        self.client = APIClient()
+        self.upload_url = reverse('image-upload')
+        self.save_url = reverse('mask-save')
+
+    def tearDown(self):
+        """Remove stored files"""
+        for mask in Mask.objects.all():
+            mask.delete()
+        for image in Image.objects.all():
+            image.delete()
+
+    def upload(self, key, url=None, name='retried.jpg'):
+        return self.client.post(url or self.upload_url, {'file': make_jpeg(name)},
+                                format='multipart', headers={'Idempotency-Key': key})
+
+    def test_upload_retry_is_replayed(self):
+        """Test that a retried upload returns the first response and decodes once"""
+        with patch('api.views.process_uploaded_image', side_effect=process_uploaded_image) as process:
+            first = self.upload('upload-1')
+            retry = self.upload('upload-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(process.call_count, 1)
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_mask_save_retry_is_replayed(self):
+        """Test that a retried mask save creates one mask"""
+        image = Image.objects.create(file=make_jpeg(), original_filename='retried.jpg',
+                                     width=16, height=12)
+
+        responses = [
+            self.client.post(self.save_url, {
+                'file': SimpleUploadedFile('mask.png', b'PNG mask', content_type='image/png'),
+                'image': image.id,
+            }, format='multipart', headers={'Idempotency-Key': 'mask-1'})
+            for _ in range(2)
+        ]
+
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(responses[0].data['id'], responses[1].data['id'])
+        self.assertEqual(Mask.objects.count(), 1)
+
+    def test_without_key(self):
+        """Test that requests without the header are processed every time"""
+        self.client.post(self.upload_url, {'file': make_jpeg()}, format='multipart')
+        self.client.post(self.upload_url, {'file': make_jpeg()}, format='multipart')
+
+        self.assertEqual(Image.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_for_different_payload(self):
+        """Test that a key can't be reused for another request"""
+        self.upload('upload-2')
+
+        response = self.upload('upload-2', name='other.jpg')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_retry_while_in_progress(self):
+        """Test that a retry racing the first request gets 409"""
+        first = self.upload('upload-3')
+        IdempotencyKey.objects.filter(key='upload-3').update(status_code=None, response=None)
+
+        response = self.upload('upload-3')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_server_error_releases_key(self):
+        """Test that a 503 isn't stored, so the retry is processed"""
+        budget = admission.PixelBudget(max_pixels=1, max_queued=0, queue_timeout=0)
+        reserved = budget.acquire(1)
+        with patch('api.utils.admission.get_budget', return_value=budget):
+            busy = self.upload('upload-4')
+        budget.release(reserved)
+
+        retry = self.upload('upload-4')
+
+        self.assertEqual(busy.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+    def test_unexpected_failure_releases_key(self):
+        """Test that a 400 from the catch-all exception handler isn't stored"""
+        with patch('api.views.process_uploaded_image', side_effect=OSError('disk full')):
+            failed = self.upload('upload-7')
+
+        retry = self.upload('upload-7')
+
+        self.assertEqual(failed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+    def test_async_unexpected_failure_releases_key(self):
+        """Test that the async views release the key after a catch-all 400 too"""
+        with patch('api.async_views.process_image_file', side_effect=OSError('disk full')):
+            failed = self.upload('upload-8', url=reverse('async-image-upload'))
+
+        self.assertEqual(failed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.filter(key='upload-8').exists())
+
+    def test_validation_error_is_replayed(self):
+        """Test that a validation 400 is stored and replayed"""
+        first = self.client.post(self.upload_url, {}, format='multipart',
+                                 headers={'Idempotency-Key': 'upload-9'})
+
+        retry = self.client.post(self.upload_url, {}, format='multipart',
+                                 headers={'Idempotency-Key': 'upload-9'})
+
+        self.assertEqual(first.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_expired_key_is_reusable(self):
+        """Test that a key is processed afresh once its record expired"""
+        self.upload('upload-5')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.upload('upload-5')
+
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Image.objects.count(), 2)
+
+    def test_overlong_key(self):
+        """Test that keys longer than the column are rejected"""
+        response = self.upload('k' * 256)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
+
+    def test_async_retry_of_sync_upload(self):
+        """Test that the async endpoint replays a response stored by the sync one"""
+        first = self.upload('upload-6')
+
+        retry = self.upload('upload-6', url=reverse('async-image-upload'))
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json()['id'], first.data['id'])
+        self.assertEqual(Image.objects.count(), 1)
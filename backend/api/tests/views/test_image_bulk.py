@@ -0,0 +1,82 @@
+"""
+Tests for the bulk image lookup endpoint.
+
+This file contains tests to ensure the bulk endpoint:
+1. Returns images in request order and reports missing IDs
+2. Resolves the whole batch with a constant number of queries
+3. Validates the requested IDs
+"""
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image
+from api.utils import serializer_cache
+
+
+class ImageBulkViewTests(APITestCase):
+    """
+    Test cases for ImageBulkView.
+    """
+    def setUp(self):
+        """Set up test data."""
+        serializer_cache.get_cache().clear()
+        self.images = [
+            Image.objects.create(
+                file=f'images/bulk_{index}.jpg',
+                original_filename=f'bulk_{index}.jpg',
+                width=800,
+                height=600
+            )
+            for index in range(5)
+        ]
+        self.url = reverse('image-bulk')
+
+    def test_get_preserves_order_and_reports_missing(self):
+        """Test GET with ?ids= keeps request order and lists unknown IDs."""
+        missing_id = self.images[-1].id + 100
+        ids = [self.images[3].id, missing_id, self.images[0].id, self.images[3].id]
+        response = self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']],
+                         [self.images[3].id, self.images[0].id])
+        self.assertEqual(response.data['missing'], [missing_id])
+
+    def test_post_uses_constant_queries(self):
+        """Test POST resolves all IDs with one key query and one query for the misses."""
+        ids = [image.id for image in reversed(self.images)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], ids)
+        self.assertEqual(len([q for q in queries if 'FROM "api_image"' in q['sql']]), 2)
+
+        # A repeat lookup only reads the cache keys; the fragments come from the cache
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'ids': ids}, format='json')
+        self.assertEqual(len([q for q in queries if 'FROM "api_image"' in q['sql']]), 1)
+
+    def test_sparse_fields(self):
+        """Test that fields/expand apply to bulk lookups."""
+        response = self.client.post(
+            f"{self.url}?fields=id,width&expand=masks",
+            {'ids': [self.images[1].id]},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.images[1].id, 'width': 800, 'masks': []}])
+
+    @override_settings(BULK_LOOKUP_MAX_IDS=3)
+    def test_invalid_ids(self):
+        """Test rejection of missing, malformed and oversized ID lists."""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'ids': '1,x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'ids': [1, 2, 3, 4]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
@@ -0,0 +1,75 @@
+"""
+Tests for the streaming JSON Lines image export.
+
+This file contains tests to ensure the export endpoint:
+1. Streams one JSON object per image
+2. Optionally embeds masks without per-image queries
+3. Honours the image list metadata filters
+"""
+import json
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image, Mask
+
+
+class ImageExportTests(APITestCase):
+    """
+    Test cases for ImageExportView.
+    """
+    def setUp(self):
+        """Set up test data."""
+        self.images = []
+        for index in range(5):
+            image = Image.objects.create(
+                file=f'images/export_{index}.jpg',
+                original_filename=f'export_{index}.jpg',
+                width=800,
+                height=600,
+                camera_make='Canon' if index % 2 else 'NIKON'
+            )
+            Mask.objects.create(
+                file=f'masks/export_{index}.png',
+                image=image,
+                original_width=800,
+                original_height=600
+            )
+            self.images.append(image)
+
+    def read_lines(self, response):
+        """Consume a streaming response and parse each line."""
+        body = b''.join(response.streaming_content)
+        return [json.loads(line) for line in body.decode('utf-8').splitlines()]
+
+    def test_streams_one_line_per_image(self):
+        """Test that every image appears once, in id order."""
+        response = self.client.get(reverse('image-export'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = self.read_lines(response)
+        self.assertEqual([line['id'] for line in lines], [image.id for image in self.images])
+        self.assertNotIn('masks', lines[0])
+
+    def test_embeds_masks_with_constant_queries(self):
+        """Test that masks are embedded using chunked prefetching."""
+        response = self.client.get(reverse('image-export'), {'masks': 'true'})
+
+        with CaptureQueriesContext(connection) as queries:
+            lines = self.read_lines(response)
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0]['masks'][0]['image'], self.images[0].id)
+        # One query for the images chunk and one for its masks
+        self.assertLessEqual(len(queries), 2)
+
+    def test_filters_apply(self):
+        """Test that metadata filters narrow the export."""
+        response = self.client.get(reverse('image-export'), {'camera_make': 'Canon'})
+
+        lines = self.read_lines(response)
+        self.assertEqual([line['id'] for line in lines], [self.images[1].id, self.images[3].id])
@@ -0,0 +1,87 @@
+"""
+Tests for metadata filtering on the image list endpoint.
+
+This file contains tests to ensure that:
+1. set_metadata populates the indexed EXIF columns
+2. The image list can be filtered by camera, orientation and capture date
+3. Invalid filter values are rejected
+"""
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image
+
+
+class ImageFilterTests(APITestCase):
+    """
+    Test cases for EXIF filters on ImageListView.
+    """
+    def create_image(self, name, exif):
+        """Create an image with the given EXIF metadata."""
+        image = Image.objects.create(
+            file=f'images/{name}',
+            original_filename=name,
+            width=800,
+            height=600
+        )
+        image.set_metadata({'width': 800, 'height': 600, 'format': 'JPEG', 'exif': exif})
+        image.save()
+        return image
+
+    def setUp(self):
+        """Set up test data."""
+        self.canon = self.create_image('canon.jpg', {
+            'Make': 'Canon\x00',
+            'Model': 'EOS R5 ',
+            'DateTimeOriginal': '2025:03:19 10:00:00',
+            'Orientation': 1,
+        })
+        self.nikon = self.create_image('nikon.jpg', {
+            'Make': 'NIKON',
+            'Model': 'Z 8',
+            'DateTimeOriginal': '2024:06:01 08:30:00',
+            'Orientation': 6,
+        })
+        self.plain = Image.objects.create(
+            file='images/plain.jpg',
+            original_filename='plain.jpg',
+            width=640,
+            height=480
+        )
+
+    def list_ids(self, **params):
+        """Return the ids returned by the image list for the given filters."""
+        response = self.client.get(reverse('image-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(item['id'] for item in response.data)
+
+    def test_set_metadata_extracts_columns(self):
+        """Test that EXIF fields are cleaned and promoted to columns."""
+        image = Image.objects.get(pk=self.canon.pk)
+        self.assertEqual(image.camera_make, 'Canon')
+        self.assertEqual(image.camera_model, 'EOS R5')
+        self.assertEqual(image.orientation, 1)
+        self.assertEqual(image.taken_at.year, 2025)
+        self.assertEqual(image.metadata['exif']['Make'], 'Canon\x00')
+
+    def test_filter_by_camera(self):
+        """Test filtering by camera make and model."""
+        self.assertEqual(self.list_ids(camera_make='NIKON'), [self.nikon.id])
+        self.assertEqual(self.list_ids(camera_make='Canon', camera_model='Z 8'), [])
+
+    def test_filter_by_date_and_orientation(self):
+        """Test filtering by capture date range and orientation."""
+        self.assertEqual(self.list_ids(taken_after='2025-01-01'), [self.canon.id])
+        self.assertEqual(self.list_ids(taken_before='2025-01-01T00:00:00'), [self.nikon.id])
+        self.assertEqual(self.list_ids(orientation=6), [self.nikon.id])
+
+    def test_no_filters_returns_everything(self):
+        """Test that images without metadata are still listed unfiltered."""
+        self.assertEqual(self.list_ids(), sorted([self.canon.id, self.nikon.id, self.plain.id]))
+
+    def test_invalid_filters(self):
+        """Test that malformed filter values return 400."""
+        response = self.client.get(reverse('image-list'), {'taken_after': 'yesterday', 'orientation': 'up'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('taken_after', response.data)
+        self.assertIn('orientation', response.data)
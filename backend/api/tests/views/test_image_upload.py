@@ -7,6 +7,7 @@ This file contains tests for the image upload endpoint to ensure it:
 3. Properly handles MPO files by converting them to JPEG
 4. Returns appropriate responses and status codes
 5. Creates Image records in the database
+6. Answers 503 with Retry-After when the upload budget is saturated
 """
 import os
 import io
@@ -17,6 +18,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 from rest_framework import status
 from api.models import Image
+from api.utils import admission
 
 
 class ImageUploadTest(TestCase):
@@ -110,6 +112,20 @@ class ImageUploadTest(TestCase):
         # Check no database record was created
         self.assertEqual(Image.objects.count(), 0)
     
+    def test_upload_rejected_when_saturated(self):
+        """Test that a saturated upload budget fails fast with 503 and Retry-After"""
+        budget = admission.PixelBudget(max_pixels=100, max_queued=0, queue_timeout=0)
+        reserved = budget.acquire(100)
+        
+        with patch('api.utils.admission.get_budget', return_value=budget):
+            response = self.client.post(self.url, {'file': self.jpeg_file}, format='multipart')
+        budget.release(reserved)
+        
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Image.objects.count(), 0)
+        self.assertEqual(budget.snapshot()['rejected'], 1)
+    
     def tearDown(self):
         """Clean up after tests"""
         # Delete all test images
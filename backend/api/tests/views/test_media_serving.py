@@ -0,0 +1,147 @@
+"""
+Test file for the media serving view.
+
+This file contains tests for MediaView to ensure it:
+1. Streams stored images with validators and cache headers
+2. Answers byte ranges with 206 (and 416 when unsatisfiable)
+3. Answers matching conditional requests with 304
+4. Hands transfers to the web server in offload modes
+5. Refuses paths outside the image and mask storages
+6. Requires a logged-in user only when MEDIA_REQUIRE_AUTH is on
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from api.models import Image
+from api.utils.media_serving import parse_range
+
+
+class MediaServingTest(TestCase):
+    """Test class for the media serving view"""
+
+    def setUp(self):
+        """Create a stored image to serve"""
+        self.content = bytes(range(256)) * 4
+        self.image = Image.objects.create(
+            file=SimpleUploadedFile('media_test.jpg', self.content, content_type='image/jpeg'),
+            original_filename='media_test.jpg',
+            width=10,
+            height=10
+        )
+        self.url = reverse('media', args=[f'images/{self.image.file.name}'])
+
+    def tearDown(self):
+        """Remove the stored file"""
+        self.image.delete()
+
+    def test_full_response(self):
+        """Test that the whole file is served with validators and range support"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_byte_range(self):
+        """Test that a single range is answered with 206 Partial Content"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end of the file returns 416"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_serves_full_file(self):
+        """Test that a range with an outdated If-Range validator gets the full file"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_request(self):
+        """Test that a matching If-None-Match returns 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """Test that nginx offload returns only the internal redirect header"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected-media/images/{self.image.file.name}'
+        )
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_sendfile(self):
+        """Test that X-Sendfile offload points at the file on disk"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Sendfile'], self.image.file.path)
+
+    def test_paths_outside_storages_are_rejected(self):
+        """Test that traversal and unknown directories return 404"""
+        for path in ['images/../db.sqlite3', 'other/file.jpg', 'images/missing.jpg']:
+            response = self.client.get(reverse('media', args=[path]))
+            self.assertEqual(response.status_code, 404, path)
+
+    @override_settings(MEDIA_REQUIRE_AUTH=True)
+    def test_anonymous_request_refused(self):
+        """Test that anonymous requests get 403 when auth is required"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(MEDIA_REQUIRE_AUTH=True)
+    def test_authenticated_request_served(self):
+        """Test that logged-in users are served when auth is required"""
+        self.client.force_login(User.objects.create_user('viewer'))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_production_default_serves_anonymous_requests(self):
+        """Test that with DEBUG off and no auth setting, media is served without a login"""
+        with self.settings(DEBUG=False):
+            del settings.MEDIA_REQUIRE_AUTH
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_hex_names_are_revalidated(self):
+        """Test that a digest-like upload name isn't cached as immutable"""
+        image = Image.objects.create(
+            file=SimpleUploadedFile('d41d8cd98f00b204e9800998ecf8427e.jpg', self.content,
+                                    content_type='image/jpeg'),
+            original_filename='d41d8cd98f00b204e9800998ecf8427e.jpg', width=10, height=10
+        )
+        self.addCleanup(image.delete)
+
+        response = self.client.get(reverse('media', args=[f'images/{image.file.name}']))
+
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_parse_range(self):
+        """Test range header parsing edge cases"""
+        self.assertEqual(parse_range('bytes=-100', 50), (0, 49))
+        self.assertEqual(parse_range('bytes=10-', 50), (10, 49))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 50))
+        self.assertFalse(parse_range('bytes=60-70', 50))
@@ -0,0 +1,87 @@
+"""
+Test file for the Prometheus metrics endpoint.
+
+This file contains tests to ensure that:
+1. /metrics answers in the Prometheus text format
+2. Requests are recorded with their view, latency and query count
+3. Uploads record their size, pixel count and decode time
+4. Mask saves record their size
+5. Work queue depths are reported
+"""
+import io
+from PIL import Image as PILImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from api.models import Image, Mask
+from api.utils import metrics
+
+
+def make_jpeg(name='metered.jpg'):
+    """Build a real 16x12 JPEG upload."""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (16, 12), 'green').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class MetricsEndpointTest(TestCase):
+    """Test class for the /metrics endpoint"""
+
+    def setUp(self):
+        metrics.store.reset()
+        self.addCleanup(metrics.store.reset)
+
+    def tearDown(self):
+        """Remove stored files"""
+        for mask in Mask.objects.all():
+            mask.delete()
+        for image in Image.objects.all():
+            image.delete()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        """Test that requests are recorded per view with their query count"""
+        Image.objects.create(file='a.jpg', original_filename='a.jpg', width=1, height=1)
+        self.client.get(reverse('image-list'))
+
+        text = self.scrape()
+
+        self.assertIn(
+            'api_request_duration_seconds_count{method="GET",status="200",view="image-list"} 1', text
+        )
+        self.assertRegex(text, r'api_request_db_queries_sum\{view="image-list"\} [1-9]')
+
+    def test_upload_and_mask_metrics(self):
+        """Test that uploads and mask saves record sizes, pixels and decode time"""
+        upload = make_jpeg()
+        response = self.client.post(reverse('image-upload'), {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mask = SimpleUploadedFile('mask.png', b'\x89PNG' + b'0' * 2000, content_type='image/png')
+        response = self.client.post(reverse('mask-save'), {'file': mask, 'image': response.data['id']})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        text = self.scrape()
+
+        self.assertIn(f'api_upload_bytes_sum {upload.size}', text)
+        self.assertIn('api_upload_pixels_sum 192', text)
+        self.assertIn('api_decode_duration_seconds_count{format="jpeg"} 1', text)
+        self.assertIn('api_mask_bytes_sum 2004', text)
+        self.assertIn('api_mask_bytes_bucket{le="4096"} 1', text)
+
+    def test_queue_depths(self):
+        """Test that the work queue backlog and admission gauges are reported"""
+        Image.objects.create(file='a.jpg', original_filename='a.jpg', width=1, height=1)
+        Image.objects.create(file='b.jpg', original_filename='b.jpg', width=1, height=1)
+        self.client.post(reverse('queue-claim'), {'annotator': 'ann'})
+
+        text = self.scrape()
+
+        self.assertIn('api_work_queue_available_images 1\n', text)
+        self.assertIn('api_work_queue_active_leases 1\n', text)
+        self.assertIn('# TYPE api_upload_admission_queue_depth gauge', text)
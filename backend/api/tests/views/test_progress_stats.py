@@ -0,0 +1,138 @@
+"""
+Tests for the materialized progress statistics.
+
+This file contains tests to ensure that:
+1. Image/Mask signals keep the counters exact
+2. The stats endpoint reads the counters
+3. reconcile_stats repairs drift
+"""
+import os
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image, Mask, StatCounter
+from api.utils import progress_stats
+
+
+class ProgressStatsTests(APITestCase):
+    """
+    Test cases for ProgressStatsView and the counters behind it.
+    """
+    def setUp(self):
+        """Set up test data."""
+        self.images = [
+            Image.objects.create(
+                file=f'images/stats_{index}.jpg',
+                original_filename=f'stats_{index}.jpg',
+                width=800,
+                height=600
+            )
+            for index in range(3)
+        ]
+
+    def create_mask(self, image, annotator='alice'):
+        """Create a mask for an image."""
+        return Mask.objects.create(
+            file=f'masks/{image.original_filename}.png',
+            image=image,
+            original_width=800,
+            original_height=600,
+            annotator=annotator
+        )
+
+    def get_stats(self):
+        """Fetch the stats endpoint."""
+        response = self.client.get(reverse('progress-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_counts_images_and_masks(self):
+        """Test totals, masked/unmasked and per-annotator counts."""
+        self.create_mask(self.images[0], 'alice')
+        self.create_mask(self.images[0], 'bob')
+        self.create_mask(self.images[1], 'alice')
+
+        stats = self.get_stats()
+        self.assertEqual(stats['images'], {'total': 3, 'masked': 2, 'unmasked': 1})
+        self.assertEqual(stats['masks']['total'], 3)
+        self.assertEqual(stats['masks']['per_annotator'], {'alice': 2, 'bob': 1})
+        today = timezone.localdate().isoformat()
+        self.assertEqual(stats['masks']['per_day'], {today: 3})
+
+    def test_deletes_keep_counts_exact(self):
+        """Test that cascading deletes don't double-count unmasking."""
+        self.create_mask(self.images[0])
+        self.create_mask(self.images[0])
+        self.create_mask(self.images[1])
+
+        self.images[0].delete()
+        stats = self.get_stats()
+        self.assertEqual(stats['images'], {'total': 2, 'masked': 1, 'unmasked': 1})
+        self.assertEqual(stats['masks']['total'], 1)
+
+        Mask.objects.filter(image=self.images[1]).delete()
+        self.assertEqual(self.get_stats()['images']['masked'], 0)
+
+    def test_mask_signals_update_loaded_image(self):
+        """Test that the image instance a mask was saved with carries the new flag."""
+        image = Image.objects.get(pk=self.images[2].pk)
+        mask = self.create_mask(image)
+        self.assertTrue(mask.image.has_mask)
+
+        image.width = 1024
+        image.save()
+        self.assertTrue(Image.objects.get(pk=image.pk).has_mask)
+
+        mask.delete()
+        self.assertFalse(image.has_mask)
+        self.assertEqual(self.get_stats()['images']['masked'], 0)
+
+    def test_mask_save_credits_lease_holder(self):
+        """Test that MaskSaveView credits the annotator holding the lease."""
+        claim = self.client.post(reverse('queue-claim'), {'annotator': 'carol'}).data
+        mask_file = SimpleUploadedFile('stats_mask.png', b'PNG mask content', content_type='image/png')
+        response = self.client.post(
+            reverse('mask-save'),
+            {'file': mask_file, 'image': claim['image']['id']},
+            format='multipart'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['annotator'], 'carol')
+        self.assertEqual(self.get_stats()['masks']['per_annotator'], {'carol': 1})
+
+    def test_reconcile_repairs_drift(self):
+        """Test that the reconcile command rewrites drifted counters."""
+        self.create_mask(self.images[0])
+        StatCounter.objects.filter(key='images.total').update(value=99)
+        Image.objects.filter(pk=self.images[1].pk).update(has_mask=True)
+
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+
+        self.assertIn('images.total: 99 -> 3', out.getvalue())
+        self.assertEqual(self.get_stats()['images'], {'total': 3, 'masked': 1, 'unmasked': 2})
+        self.assertFalse(Image.objects.get(pk=self.images[1].pk).has_mask)
+
+    def test_reconcile_updates_counters_in_place(self):
+        """Test that reconcile keeps existing counter rows and zeroes stale ones."""
+        StatCounter.objects.create(key='masks.annotator.ghost', value=4)
+        StatCounter.objects.filter(key='images.total').update(value=99)
+        pks = dict(StatCounter.objects.values_list('key', 'pk'))
+
+        drift = progress_stats.reconcile(Image, Mask, StatCounter)
+
+        self.assertEqual(drift['images.total'], (99, 3))
+        self.assertEqual(drift['masks.annotator.ghost'], (4, 0))
+        self.assertEqual(dict(StatCounter.objects.filter(key__in=pks).values_list('key', 'pk')), pks)
+        self.assertEqual(StatCounter.objects.get(key='masks.annotator.ghost').value, 0)
+
+    def tearDown(self):
+        """Clean up mask files written through the API."""
+        for mask in Mask.objects.all():
+            if mask.file and os.path.exists(mask.file.path):
+                os.remove(mask.file.path)
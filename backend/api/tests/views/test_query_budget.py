@@ -0,0 +1,118 @@
+"""
+Test file for per-view query budgets.
+
+This file contains tests to ensure that:
+1. List and detail endpoints stay within their budgets at any row count
+2. Query shapes collapse IN lists and ignore transaction control
+3. A request over its budget raises in strict mode and logs otherwise
+4. A query shape repeated in one request is flagged as an N+1 pattern
+"""
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from api.models import Image, Mask
+from api.utils.query_budget import QueryBudgetExceeded, QueryLog, capture_queries, shape
+
+
+def create_images(count, start=0):
+    """Create images, every other one with a mask."""
+    for i in range(start, start + count):
+        image = Image.objects.create(file=f'q{i}.jpg', original_filename=f'q{i}.jpg', width=4, height=3)
+        if i % 2:
+            Mask.objects.create(file=f'q{i}.png', image=image, original_width=4, original_height=3)
+
+
+class ViewBudgetTest(TestCase):
+    """Test class for the budgets declared on list and detail views"""
+
+    def assert_constant_queries(self, url, params=None, budget=3):
+        """Check a GET stays within budget, cold and warm, for 2 and 20 rows."""
+        counts = []
+        for rows in (2, 18):
+            create_images(rows, start=len(counts) * 100)
+            for clear in (True, False):
+                if clear:
+                    cache.clear()
+                with capture_queries() as log:
+                    response = self.client.get(url, params or {})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(log.check(budget), [])
+                counts.append(len(log))
+        # Cold requests cost the same whatever the row count
+        self.assertEqual(counts[0], counts[2])
+
+    def test_image_list(self):
+        """Test that the image list takes at most 3 queries"""
+        self.assert_constant_queries(reverse('image-list'))
+
+    def test_image_list_expanded(self):
+        """Test that embedding masks adds no per-row queries"""
+        self.assert_constant_queries(reverse('image-list'), {'expand': 'masks'})
+
+    def test_mask_list(self):
+        """Test that the mask list takes at most 3 queries"""
+        self.assert_constant_queries(reverse('mask-list'), {'expand': 'image'})
+
+    def test_async_image_list(self):
+        """Test that the async image list takes at most 3 queries"""
+        self.assert_constant_queries(reverse('async-image-list'))
+
+
+class QueryShapeTest(SimpleTestCase):
+    """Test class for query shapes and repeat detection"""
+
+    def test_in_lists_collapse(self):
+        """Test that IN lists of any length have the same shape"""
+        self.assertEqual(
+            shape('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            shape('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+    def test_repeated(self):
+        """Test that shapes at the threshold are reported, transaction control is not"""
+        log = QueryLog()
+        log.queries = ['SELECT 1 WHERE id = %s'] * 5 + ['SAVEPOINT "s1"'] * 5 + ['SELECT 2'] * 4
+
+        self.assertEqual(log.repeated(5), {'SELECT 1 WHERE id = %s': 5})
+        self.assertEqual(log.check(budget=20, threshold=5), [
+            'query repeated 5 times (possible N+1): SELECT 1 WHERE id = %s',
+        ])
+        self.assertEqual(log.check(budget=10, threshold=6), ['14 queries, budget is 10'])
+
+
+def n_plus_one_snapshot():
+    """A stand-in stats snapshot querying once per image."""
+    return {image.pk: image.masks.count() for image in Image.objects.all()}
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+    """Test class for budget enforcement on requests"""
+
+    def setUp(self):
+        create_images(6)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_over_budget_raises_when_strict(self):
+        """Test that exceeding a view's budget fails the request in strict mode"""
+        with patch('api.views.progress_stats.read_stats', n_plus_one_snapshot):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'budget is 2'):
+                self.client.get(reverse('progress-stats'))
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_n_plus_one_logged(self):
+        """Test that a repeated query shape is logged outside strict mode"""
+        with patch('api.views.serializer_cache.stats.snapshot', n_plus_one_snapshot):
+            with self.assertLogs('api.queries', 'WARNING') as logs:
+                response = self.client.get(reverse('cache-stats'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('GET /api/cache/stats/: query repeated 6 times (possible N+1)', logs.output[0])
+        self.assertIn('api_mask', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_within_budget_is_quiet(self):
+        """Test that requests within budget log nothing"""
+        with self.assertNoLogs('api.queries'):
+            self.client.get(reverse('image-list'))
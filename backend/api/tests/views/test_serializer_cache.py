@@ -0,0 +1,124 @@
+"""
+Tests for the serialized-representation cache.
+
+This file contains tests to ensure that:
+1. List and detail endpoints reuse cached fragments
+2. Writes retire only their own row's fragment, in every process
+3. The stats endpoint reports hits and misses
+4. Fragments expire after SERIALIZER_CACHE_TIMEOUT
+"""
+from unittest.mock import patch
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from django.utils import timezone
+from api.models import Image, Mask
+from api.utils import serializer_cache
+
+
+class SerializerCacheTests(APITestCase):
+    """
+    Test cases for the per-object serializer cache.
+    """
+    def setUp(self):
+        """Set up test data and start from an empty cache."""
+        serializer_cache.get_cache().clear()
+        serializer_cache.stats.reset()
+
+        self.image1 = Image.objects.create(
+            file='images/test_image1.jpg',
+            original_filename='test_image1.jpg',
+            width=800,
+            height=600
+        )
+        self.image2 = Image.objects.create(
+            file='images/test_image2.jpg',
+            original_filename='test_image2.jpg',
+            width=1024,
+            height=768
+        )
+
+    def test_list_populates_and_reuses_fragments(self):
+        """Test that a second list request is served from cached fragments."""
+        url = reverse('image-list')
+        self.client.get(url)
+        self.assertEqual(serializer_cache.stats.snapshot()['image']['misses'], 2)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(serializer_cache.stats.snapshot()['image']['hits'], 2)
+
+    def test_save_retires_only_its_fragment(self):
+        """Test that saving an image drops its old fragment and keeps the others."""
+        self.client.get(reverse('image-list'))
+        cache = serializer_cache.get_cache()
+        old_key = serializer_cache.cache_key('image', self.image1.pk, self.image1.updated_at)
+        self.assertIsNotNone(cache.get(old_key))
+
+        self.image1.width = 640
+        self.image1.save()
+
+        self.assertIsNone(cache.get(old_key))
+        response = self.client.get(reverse('image-list'))
+        widths = {row['id']: row['width'] for row in response.data}
+        self.assertEqual(widths[self.image1.pk], 640)
+        snapshot = serializer_cache.stats.snapshot()['image']
+        self.assertEqual((snapshot['hits'], snapshot['misses']), (1, 3))
+
+    def test_delete_invalidates_mask_fragment(self):
+        """Test that deleting a mask drops its fragment from the list."""
+        mask = Mask.objects.create(
+            file='masks/test_image1.png',
+            image=self.image1,
+            original_width=800,
+            original_height=600
+        )
+        url = reverse('mask-list')
+        self.assertEqual(len(self.client.get(url).data), 1)
+
+        mask.delete()
+
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+    def test_stats_endpoint(self):
+        """Test that the stats endpoint reports hit rates."""
+        url = reverse('image-list')
+        self.client.get(url)
+        self.client.get(url)
+
+        response = self.client.get(reverse('cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['image']['hits'], 2)
+        self.assertEqual(response.data['image']['misses'], 2)
+        self.assertEqual(response.data['image']['hit_rate'], 0.5)
+
+    def test_stale_fragment_in_other_process_not_served(self):
+        """Test that a write made elsewhere retires fragments cached here."""
+        self.client.get(reverse('image-list'))
+
+        # Another worker updates the image; its signals never reach this cache
+        Image.objects.filter(pk=self.image1.pk).update(width=320, updated_at=timezone.now())
+
+        response = self.client.get(reverse('image-list'))
+        widths = {row['id']: row['width'] for row in response.data}
+        self.assertEqual(widths[self.image1.pk], 320)
+
+    @override_settings(SERIALIZER_CACHE_TIMEOUT=30)
+    def test_fragments_expire(self):
+        """Test that fragments are stored with the configured timeout."""
+        with patch.object(LocMemCache, 'set_many', autospec=True, return_value=[]) as set_many:
+            self.client.get(reverse('image-list'))
+
+        self.assertEqual(set_many.call_args.args[2], 30)
+
+    def test_deploy_check_flags_process_local_cache(self):
+        """Test that `check --deploy` warns about a per-process cache."""
+        self.assertEqual([message.id for message in serializer_cache.check_shared_cache()], ['api.W001'])
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/0',
+        }}):
+            self.assertEqual(serializer_cache.check_shared_cache(), [])
@@ -0,0 +1,113 @@
+"""
+Test file for per-request phase timing.
+
+This file contains tests to ensure that:
+1. No Server-Timing header is added while timing is disabled
+2. Upload, mask save and list responses report their phases
+3. Instrumented requests log one structured timing line
+4. Nested phases report their own time only
+"""
+import io
+import time
+from PIL import Image as PILImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from api.models import Image, Mask
+from api.utils.timing import PhaseTimer
+
+
+def make_jpeg(name='timed.jpg'):
+    """Build a real JPEG upload."""
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (16, 12), 'green').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+def phase_names(response):
+    """Return the phase names listed in a Server-Timing header."""
+    return [entry.split(';')[0].strip() for entry in response['Server-Timing'].split(',')]
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingTest(TestCase):
+    """Test class for Server-Timing headers and timing logs"""
+
+    def tearDown(self):
+        """Remove stored files"""
+        for mask in Mask.objects.all():
+            mask.delete()
+        for image in Image.objects.all():
+            image.delete()
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        """Test that responses carry no header while timing is off"""
+        response = self.client.get(reverse('image-list'))
+
+        self.assertNotIn('Server-Timing', response)
+
+    def test_upload_phases(self):
+        """Test that an upload reports each pipeline phase and logs them"""
+        with self.assertLogs('api.timing', 'INFO') as logs:
+            response = self.client.post(reverse('image-upload'), {'file': make_jpeg()})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            phase_names(response),
+            ['parse', 'admission', 'convert', 'exif', 'storage', 'db', 'serialize', 'render', 'total'],
+        )
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertEqual((record.method, record.status), ('POST', 201))
+        self.assertIn('convert', record.phases_ms)
+        self.assertIn('/api/images/upload/ 201 total=', record.getMessage())
+
+    def test_mask_save_phases(self):
+        """Test that a mask save separates the file write from the database work"""
+        image = Image.objects.create(file=make_jpeg(), original_filename='timed.jpg', width=16, height=12)
+
+        with self.assertLogs('api.timing', 'INFO'):
+            response = self.client.post(reverse('mask-save'), {
+                'file': SimpleUploadedFile('mask.png', b'PNG', content_type='image/png'),
+                'image': image.id,
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(phase_names(response), ['parse', 'db', 'storage', 'serialize', 'render', 'total'])
+
+    def test_list_phases(self):
+        """Test that list responses time the version lookup, serialization and rendering"""
+        with self.assertLogs('api.timing', 'INFO'):
+            response = self.client.get(reverse('mask-list'))
+
+        self.assertEqual(phase_names(response), ['versions', 'serialize', 'render', 'total'])
+
+    async def test_async_upload_phases(self):
+        """Test that the async upload reports its decode pool phase"""
+        with self.assertLogs('api.timing', 'INFO'):
+            response = await self.async_client.post(reverse('async-image-upload'), {'file': make_jpeg()})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            phase_names(response),
+            ['parse', 'admission', 'decode', 'storage', 'db', 'serialize', 'render', 'total'],
+        )
+
+
+class PhaseTimerTests(SimpleTestCase):
+    """Tests for phase accounting."""
+
+    def test_nested_phases_report_self_time(self):
+        timer = PhaseTimer()
+
+        with timer.phase('outer'):
+            with timer.phase('inner'):
+                time.sleep(0.02)
+        with timer.phase('inner'):
+            time.sleep(0.01)
+
+        self.assertLess(timer.phases['outer'], 0.01)
+        self.assertGreaterEqual(timer.phases['inner'], 0.03)
+        self.assertTrue(timer.header(0.05).endswith('total;dur=50.0'))
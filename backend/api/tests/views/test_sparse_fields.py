@@ -0,0 +1,89 @@
+"""
+Tests for sparse fieldsets and embedded relations.
+
+This file contains tests to ensure that:
+1. ?fields= limits both the output and the columns read from the database
+2. ?expand= embeds related objects without N+1 queries
+3. Unknown field or relation names are rejected
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image, Mask
+
+
+class SparseFieldsTests(APITestCase):
+    """
+    Test cases for fields/expand on the image and mask endpoints.
+    """
+    def setUp(self):
+        """Set up test data."""
+        self.images = []
+        for index in range(4):
+            image = Image.objects.create(
+                file=f'images/sparse_{index}.jpg',
+                original_filename=f'sparse_{index}.jpg',
+                width=800,
+                height=600
+            )
+            for version in range(2):
+                Mask.objects.create(
+                    file=f'masks/sparse_{index}_{version}.png',
+                    image=image,
+                    original_width=800,
+                    original_height=600
+                )
+            self.images.append(image)
+
+    def test_fields_limit_output_and_columns(self):
+        """Test that only the requested fields are returned and selected."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('image-list'), {'fields': 'id,image_url'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {'id', 'image_url'})
+        image_query = [q['sql'] for q in queries if 'FROM "api_image"' in q['sql']][-1]
+        self.assertNotIn('metadata_json', image_query)
+
+    def test_expand_masks_without_n_plus_one(self):
+        """Test that embedding masks costs one extra query regardless of row count."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('image-list'), {'fields': 'id', 'expand': 'masks'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(len(response.data[0]['masks']), 2)
+        mask_queries = [q for q in queries if 'FROM "api_mask"' in q['sql']]
+        self.assertEqual(len(mask_queries), 1)
+
+    def test_expand_image_on_masks(self):
+        """Test embedding the image in the mask list with a join."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('mask-list'), {'fields': 'id', 'expand': 'image'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 8)
+        self.assertEqual(response.data[0]['image']['id'], self.images[0].id)
+        self.assertEqual(len([q for q in queries if 'FROM "api_mask"' in q['sql']]), 1)
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "api_image"' in q['sql']])
+
+    def test_detail_expand_changes_etag_dependencies(self):
+        """Test that expanded detail responses are invalidated by mask writes."""
+        url = reverse('image-detail', args=[self.images[0].id])
+        etag = self.client.get(url, {'expand': 'masks'})['ETag']
+
+        Mask.objects.filter(image=self.images[0]).first().delete()
+
+        response = self.client.get(url, {'expand': 'masks'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['masks']), 1)
+
+    def test_unknown_names_rejected(self):
+        """Test that unknown fields and relations return 400."""
+        response = self.client.get(reverse('image-list'), {'fields': 'id,secret', 'expand': 'owner'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+        self.assertIn('expand', response.data)
@@ -0,0 +1,117 @@
+"""
+Tests for the annotation work queue endpoints.
+
+This file contains tests to ensure the work queue:
+1. Leases each unmasked image to one annotator at a time
+2. Skips masked and actively leased images
+3. Renews and releases leases
+4. Releases the lease when a mask is saved
+"""
+import os
+from datetime import timedelta
+from django.urls import reverse
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework import status
+from rest_framework.test import APITestCase
+from api.models import Image, Mask, ImageLease
+
+
+class WorkQueueTests(APITestCase):
+    """
+    Test cases for QueueClaimView and QueueLeaseView.
+    """
+    def setUp(self):
+        """Set up test data."""
+        self.images = [
+            Image.objects.create(
+                file=f'images/queue_{index}.jpg',
+                original_filename=f'queue_{index}.jpg',
+                width=800,
+                height=600
+            )
+            for index in range(3)
+        ]
+        self.claim_url = reverse('queue-claim')
+
+    def test_claims_are_exclusive(self):
+        """Test that successive claims hand out different images."""
+        first = self.client.post(self.claim_url, {'annotator': 'alice'})
+        second = self.client.post(self.claim_url, {'annotator': 'bob'})
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data['image']['id'], self.images[0].id)
+        self.assertEqual(second.data['image']['id'], self.images[1].id)
+        self.assertEqual(second.data['holder'], 'bob')
+
+    def test_skips_masked_images_and_empties(self):
+        """Test that masked images are never handed out."""
+        Mask.objects.create(
+            file='masks/queue_0.png',
+            image=self.images[0],
+            original_width=800,
+            original_height=600
+        )
+        claimed = [self.client.post(self.claim_url).data['image']['id'] for _ in range(2)]
+        self.assertEqual(claimed, [self.images[1].id, self.images[2].id])
+
+        response = self.client.post(self.claim_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_expired_lease_is_reclaimed(self):
+        """Test that an expired lease returns the image to the queue."""
+        ImageLease.objects.create(
+            image=self.images[0],
+            holder='stale',
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        response = self.client.post(self.claim_url, {'annotator': 'alice'})
+
+        self.assertEqual(response.data['image']['id'], self.images[0].id)
+        self.assertEqual(ImageLease.objects.get(image=self.images[0]).holder, 'alice')
+
+    def test_prefetch_hints(self):
+        """Test that a claim can return hints for the next images."""
+        response = self.client.post(self.claim_url, {'prefetch': 5})
+
+        hint_ids = [hint['id'] for hint in response.data['prefetch']]
+        self.assertEqual(hint_ids, [self.images[1].id, self.images[2].id])
+
+    def test_renew_and_release(self):
+        """Test renewing and releasing a lease."""
+        claim = self.client.post(self.claim_url).data
+        url = reverse('queue-lease', args=[claim['token']])
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ImageLease.objects.exists())
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_mask_save_releases_lease(self):
+        """Test that saving a mask releases the image's lease."""
+        claim = self.client.post(self.claim_url).data
+        mask_file = SimpleUploadedFile(
+            name='queue_mask.png',
+            content=b'PNG mask content',
+            content_type='image/png'
+        )
+        response = self.client.post(
+            reverse('mask-save'),
+            {'file': mask_file, 'image': claim['image']['id']},
+            format='multipart'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(ImageLease.objects.filter(token=claim['token']).exists())
+
+    def tearDown(self):
+        """Clean up mask files written by the save test."""
+        for mask in Mask.objects.all():
+            if mask.file and os.path.exists(mask.file.path):
+                os.remove(mask.file.path)
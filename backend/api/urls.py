@@ -6,12 +6,20 @@ This file defines the URL patterns for our mask generator API endpoints:
 - Mask saving
 - Image retrieval
 - Listing all images
+- Bulk image lookup by ID
+- Streaming the image catalog as JSON Lines
 - Listing all masks
 - Checking if an image has a mask
+- Annotation work queue (claim, renew, release)
+- Annotation progress statistics
+- Serializer cache statistics
+- Upload admission control statistics
+- Async (ASGI) variants of upload, mask saving and listing
 """
 from django.urls import path
 from rest_framework.urlpatterns import format_suffix_patterns
 from . import views
+from . import async_views
 
 # Create URL patterns for our API endpoints
 urlpatterns = [
@@ -19,11 +27,28 @@ urlpatterns = [
     path('images/upload/', views.ImageUploadView.as_view(), name='image-upload'),
     path('images/<int:pk>/', views.ImageDetailView.as_view(), name='image-detail'),
     path('images/', views.ImageListView.as_view(), name='image-list'),
+    path('images/bulk/', views.ImageBulkView.as_view(), name='image-bulk'),
+    path('images/export/', views.ImageExportView.as_view(), name='image-export'),
     
     # Mask endpoints
     path('masks/save/', views.MaskSaveView.as_view(), name='mask-save'),
     path('masks/', views.MaskListView.as_view(), name='mask-list'),
     path('masks/check/<str:filename>/', views.MaskCheckView.as_view(), name='mask-check'),
+    
+    # Work queue endpoints
+    path('queue/claim/', views.QueueClaimView.as_view(), name='queue-claim'),
+    path('queue/leases/<uuid:token>/', views.QueueLeaseView.as_view(), name='queue-lease'),
+    
+    # Monitoring endpoints
+    path('stats/', views.ProgressStatsView.as_view(), name='progress-stats'),
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache-stats'),
+    path('admission/stats/', views.AdmissionStatsView.as_view(), name='admission-stats'),
+    
+    # Async endpoints - same payloads, for deployments under an ASGI server
+    path('async/images/upload/', async_views.AsyncImageUploadView.as_view(), name='async-image-upload'),
+    path('async/images/', async_views.AsyncImageListView.as_view(), name='async-image-list'),
+    path('async/masks/save/', async_views.AsyncMaskSaveView.as_view(), name='async-mask-save'),
+    path('async/masks/', async_views.AsyncMaskListView.as_view(), name='async-mask-list'),
 ]
 
 # Add format suffix patterns to support different formats (.json, etc)
@@ -0,0 +1,279 @@
+"""
+Admission control for CPU- and memory-heavy image work.
+
+Decoding (and re-encoding MPO uploads as JPEG) costs memory proportional to
+the image's pixel count, so a burst of large uploads can overcommit a worker.
+Uploads are therefore admitted against a pixels-in-flight budget:
+1. estimate_pixels - read the image header (cheap) to learn its size
+2. PixelBudget.admit - wait, first come first served, until the pixels fit
+   under UPLOAD_MAX_PIXELS_IN_FLIGHT (aadmit waits on the event loop, so
+   queued async requests hold no thread)
+3. If UPLOAD_MAX_QUEUED requests are already waiting, or the wait exceeds
+   UPLOAD_QUEUE_TIMEOUT, Saturated is raised and the views answer
+   503 Service Unavailable with a Retry-After estimate
+
+The budget is per process; snapshot() reports its queue depth and counters,
+and the process-wide budget publishes them to the metrics registry.
+"""
+import asyncio
+import collections
+import contextlib
+import math
+import threading
+import time
+from PIL import Image as PILImage
+from django.conf import settings
+from . import metrics, timing
+
+
+class Saturated(Exception):
+    """Raised when work can't be admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server is busy, retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+def estimate_pixels(image_file):
+    """
+    Return an image's pixel count from its header, without decoding it.
+
+    Unreadable files count as a single pixel; they fail fast when decoded.
+    """
+    try:
+        image_file.seek(0)
+        with PILImage.open(image_file) as image:
+            width, height = image.size
+        return width * height
+    except Exception:
+        return 1
+    finally:
+        image_file.seek(0)
+
+
+class _LoopWaiter:
+    """A queue ticket for a coroutine, woken through its event loop."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+
+class PixelBudget:
+    """
+    A first-come-first-served semaphore weighted by pixel count.
+
+    A single image larger than the whole budget is admitted on its own once
+    everything ahead of it has finished, rather than being refused forever.
+    """
+
+    def __init__(self, max_pixels, max_queued, queue_timeout, on_change=None):
+        self.max_pixels = max_pixels
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.on_change = on_change
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._pixels = 0
+        self._running = 0
+        self._average_seconds = None
+        self._counts = {'admitted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+
+    def _fits(self, pixels):
+        return self._running == 0 or self._pixels + pixels <= self.max_pixels
+
+    def _retry_after(self):
+        """Estimate when a slot frees up, from recent work durations."""
+        if self._average_seconds is None:
+            return 1
+        backlog = (len(self._queue) + 1) / max(self._running, 1)
+        return min(60, max(1, math.ceil(self._average_seconds * backlog)))
+
+    def _enter(self, pixels, ticket):
+        """
+        Admit pixels straight away, or queue the ticket if they must wait.
+
+        Called with the condition held. Returns the reserved pixels, or None
+        if the ticket was queued.
+        """
+        if not self._queue and self._fits(pixels):
+            return self._admit(pixels)
+        if len(self._queue) >= self.max_queued:
+            self._counts['rejected'] += 1
+            raise Saturated(self._retry_after())
+        self._queue.append(ticket)
+        self._counts['queued'] += 1
+        self._changed()
+        return None
+
+    def _leave(self, ticket):
+        # Called with the condition held
+        self._queue.remove(ticket)
+        self._changed()
+        # The next in line may fit now, or become the head
+        self._notify()
+
+    def _notify(self):
+        """Wake every waiter, threads and event loops alike (condition held)."""
+        self._condition.notify_all()
+        for ticket in self._queue:
+            if isinstance(ticket, _LoopWaiter):
+                ticket.loop.call_soon_threadsafe(ticket.event.set)
+
+    def acquire(self, pixels):
+        """
+        Reserve pixels, waiting in line if the budget is used up.
+
+        Args:
+            pixels: The pixels to reserve
+
+        Returns:
+            The number of pixels reserved (pass it to release)
+
+        Raises:
+            Saturated: If the queue is full or the wait timed out
+        """
+        pixels = min(max(pixels, 1), self.max_pixels)
+        with self._condition:
+            ticket = object()
+            reserved = self._enter(pixels, ticket)
+            if reserved is not None:
+                return reserved
+
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._queue[0] is not ticket or not self._fits(pixels):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counts['timed_out'] += 1
+                        raise Saturated(self._retry_after())
+                    self._condition.wait(remaining)
+            finally:
+                self._leave(ticket)
+            return self._admit(pixels)
+
+    async def aacquire(self, pixels):
+        """
+        Async variant of acquire.
+
+        The caller waits on an asyncio event, so a queued request holds no
+        thread; releases from any thread wake it through its event loop. If
+        the task is cancelled while queued it simply leaves the line.
+        """
+        pixels = min(max(pixels, 1), self.max_pixels)
+        ticket = _LoopWaiter(asyncio.get_running_loop())
+        with self._condition:
+            reserved = self._enter(pixels, ticket)
+            if reserved is not None:
+                return reserved
+
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                with self._condition:
+                    if self._queue[0] is ticket and self._fits(pixels):
+                        self._leave(ticket)
+                        return self._admit(pixels)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counts['timed_out'] += 1
+                        raise Saturated(self._retry_after())
+                    ticket.event.clear()
+                try:
+                    await asyncio.wait_for(ticket.event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Timed out or cancelled while queued
+            with self._condition:
+                if ticket in self._queue:
+                    self._leave(ticket)
+            raise
+
+    def _admit(self, pixels):
+        self._pixels += pixels
+        self._running += 1
+        self._counts['admitted'] += 1
+        self._changed()
+        return pixels
+
+    def _changed(self):
+        # Called with the condition held
+        if self.on_change is not None:
+            self.on_change(self._snapshot())
+
+    def release(self, pixels, seconds=None):
+        """Return reserved pixels, recording how long the work took."""
+        with self._condition:
+            self._pixels -= pixels
+            self._running -= 1
+            if seconds is not None:
+                if self._average_seconds is None:
+                    self._average_seconds = seconds
+                else:
+                    self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+            self._changed()
+            self._notify()
+
+    @contextlib.contextmanager
+    def admit(self, pixels):
+        """Hold pixels of the budget for the duration of a with-block."""
+        with timing.phase('admission'):
+            reserved = self.acquire(pixels)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(reserved, time.monotonic() - start)
+
+    @contextlib.asynccontextmanager
+    async def aadmit(self, pixels):
+        """Async variant of admit; waiting takes no thread (see aacquire)."""
+        with timing.phase('admission'):
+            reserved = await self.aacquire(pixels)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(reserved, time.monotonic() - start)
+
+    def snapshot(self):
+        """Return the current queue depth, pixels in flight and counters."""
+        with self._condition:
+            return self._snapshot()
+
+    def _snapshot(self):
+        return {
+            'max_pixels': self.max_pixels,
+            'pixels_in_flight': self._pixels,
+            'running': self._running,
+            'queue_depth': len(self._queue),
+            'max_queued': self.max_queued,
+            'average_seconds': self._average_seconds,
+            **self._counts,
+        }
+
+
+_lock = threading.Lock()
+_budget = None
+
+
+def get_budget():
+    """Return the process-wide upload budget, built from settings on first use."""
+    global _budget
+    with _lock:
+        if _budget is None:
+            _budget = PixelBudget(
+                max_pixels=getattr(settings, 'UPLOAD_MAX_PIXELS_IN_FLIGHT', 150_000_000),
+                max_queued=getattr(settings, 'UPLOAD_MAX_QUEUED', 32),
+                queue_timeout=getattr(settings, 'UPLOAD_QUEUE_TIMEOUT', 10),
+                on_change=metrics.publish_admission,
+            )
+        return _budget
+
+
+def reset():
+    """Drop the budget so the next use re-reads settings."""
+    global _budget
+    with _lock:
+        _budget = None
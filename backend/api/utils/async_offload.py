@@ -0,0 +1,100 @@
+"""
+Executors for the async views of the mask_generator API.
+
+Async views must never block the event loop, so this module moves work off it:
+1. CPU-bound image decoding runs in a bounded thread or process pool
+   (ASYNC_DECODE_POOL / ASYNC_DECODE_WORKERS), with at most
+   ASYNC_MAX_PENDING_DECODES decodes admitted at once per event loop
+2. File reads and writes run in a separate I/O thread pool
+   (ASYNC_IO_WORKERS), so slow disks or object stores never wait behind
+   decodes or the ORM's single sync thread; storages that keep an index in
+   the database (mask pack files) run through sync_to_async instead
+"""
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+_lock = threading.Lock()
+_executors = {}
+_decode_slots = weakref.WeakKeyDictionary()
+
+
+def get_decode_executor():
+    """Return the shared executor for CPU-bound decoding."""
+    with _lock:
+        if 'decode' not in _executors:
+            workers = getattr(settings, 'ASYNC_DECODE_WORKERS', None) or os.cpu_count() or 1
+            if getattr(settings, 'ASYNC_DECODE_POOL', 'thread') == 'process':
+                _executors['decode'] = ProcessPoolExecutor(max_workers=workers)
+            else:
+                _executors['decode'] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='decode'
+                )
+        return _executors['decode']
+
+
+def get_io_executor():
+    """Return the shared thread pool for blocking file I/O."""
+    with _lock:
+        if 'io' not in _executors:
+            _executors['io'] = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_IO_WORKERS', 32), thread_name_prefix='media-io'
+            )
+        return _executors['io']
+
+
+def _get_decode_slots():
+    """Return the semaphore bounding in-flight decodes on the running loop."""
+    loop = asyncio.get_running_loop()
+    slots = _decode_slots.get(loop)
+    if slots is None:
+        slots = _decode_slots[loop] = asyncio.Semaphore(
+            getattr(settings, 'ASYNC_MAX_PENDING_DECODES', 64)
+        )
+    return slots
+
+
+async def run_decode(func, *args):
+    """
+    Run a CPU-bound function in the decode pool.
+
+    With a process pool, `func` and its arguments must be picklable.
+    """
+    async with _get_decode_slots():
+        return await asyncio.get_running_loop().run_in_executor(get_decode_executor(), func, *args)
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking I/O function in the I/O thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(
+        get_io_executor(), partial(func, *args, **kwargs)
+    )
+
+
+async def run_storage(storage, func, *args, **kwargs):
+    """
+    Run a blocking storage call off the event loop.
+
+    A storage with a pack store reads and writes its index through the ORM,
+    so its calls go through sync_to_async: the queries then use a connection
+    Django manages and count towards the request's query budget and
+    metrics. Other storages only touch files and use the I/O pool.
+    """
+    if getattr(storage, 'pack_store', None) is not None:
+        return await sync_to_async(partial(func, *args, **kwargs))()
+    return await run_io(func, *args, **kwargs)
+
+
+def shutdown():
+    """Shut down the executors (they are recreated on next use)."""
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
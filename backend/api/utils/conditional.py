@@ -0,0 +1,184 @@
+"""
+Conditional GET utilities for the mask_generator API.
+
+This module provides:
+1. Lookup of the per-table change versions maintained by model signals
+2. Strong ETag and Last-Modified derivation from those versions
+3. A decorator that answers unchanged polls with 304 Not Modified
+   (for both sync and async view methods)
+
+ETags cover the query string and the negotiated media type as well, so
+?fields=, filters and the browsable API each get their own validator.
+Last-Modified has one-second resolution; it is only sent (and only used to
+answer If-Modified-Since) once the second of the latest write has passed,
+so a second write in the same second can't be hidden behind a 304.
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, urlencode
+from . import timing
+
+
+def get_table_versions(tables):
+    """
+    Fetch the current change version for each of the given tables.
+
+    Args:
+        tables: Iterable of logical table names (e.g. ['image', 'mask'])
+
+    Returns:
+        A dictionary mapping each table name to a (version, updated_at) tuple.
+        Tables that have never changed report version 0 and no timestamp.
+    """
+    # Imported here to avoid a circular import with api.models
+    from ..models import ChangeVersion
+
+    versions = {table: (0, None) for table in tables}
+    rows = ChangeVersion.objects.filter(table__in=versions.keys()).values_list(
+        'table', 'version', 'updated_at'
+    )
+    for table, version, updated_at in rows:
+        versions[table] = (version, updated_at)
+    return versions
+
+
+async def aget_table_versions(tables):
+    """Async version of get_table_versions."""
+    from ..models import ChangeVersion
+
+    versions = {table: (0, None) for table in tables}
+    rows = ChangeVersion.objects.filter(table__in=versions.keys()).values_list(
+        'table', 'version', 'updated_at'
+    )
+    async for table, version, updated_at in rows:
+        versions[table] = (version, updated_at)
+    return versions
+
+
+def build_etag(prefix, versions, variant=''):
+    """
+    Build a strong ETag from a resource prefix and table versions.
+
+    Args:
+        prefix: A string identifying the resource (e.g. 'image-list')
+        versions: The dictionary returned by get_table_versions
+        variant: What else selects the representation (see request_variant);
+                 included as a short digest
+
+    Returns:
+        A quoted strong ETag such as '"image-list.image7.mask3.1a2b3c4d5e6f"'
+    """
+    parts = [prefix] + [f"{table}{versions[table][0]}" for table in sorted(versions)]
+    if variant:
+        parts.append(hashlib.sha256(variant.encode()).hexdigest()[:12])
+    return '"' + '.'.join(parts) + '"'
+
+
+def request_variant(request):
+    """
+    Describe the parts of a request that change the response body: the
+    normalized query string (parameters sorted by name) and the negotiated
+    media type.
+    """
+    query = urlencode(sorted(request.GET.lists(), key=lambda item: item[0]), doseq=True)
+    media_type = getattr(request, 'accepted_media_type', None) or 'application/json'
+    return f"{query}|{media_type}"
+
+
+def build_last_modified(versions):
+    """
+    Return the most recent change timestamp across the given table versions.
+
+    Args:
+        versions: The dictionary returned by get_table_versions
+
+    Returns:
+        A timezone-aware datetime, or None if none of the tables has changed yet
+    """
+    timestamps = [updated_at for _, updated_at in versions.values() if updated_at]
+    if not timestamps:
+        return None
+    return max(timestamps)
+
+
+def conditional_on(*tables, prefix=None, extra_tables=None):
+    """
+    Decorator adding ETag/Last-Modified handling to an APIView GET method.
+
+    The decorated handler is only invoked when the client's validators don't
+    match the current table versions, so unchanged polls skip serialization
+    and all queries except the version lookup.
+
+    Args:
+        *tables: The logical table names the response depends on
+        prefix: Optional resource prefix for the ETag; defaults to the view
+                class name plus any URL kwargs
+        extra_tables: Optional callable taking the request and returning
+                      further tables this particular response depends on
+                      (e.g. masks embedded with ?expand=masks)
+
+    Returns:
+        The decorator
+    """
+    def depends_on(request):
+        tables_needed = set(tables)
+        if extra_tables is not None:
+            tables_needed.update(extra_tables(request))
+        return tables_needed
+
+    def check(view, request, kwargs, versions):
+        """Return (early response or None, etag, last-modified timestamp)."""
+        resource = prefix or view.__class__.__name__
+        if kwargs:
+            resource += '-' + '-'.join(f"{key}{value}" for key, value in sorted(kwargs.items()))
+        etag = build_etag(resource, versions, request_variant(request))
+        last_modified = build_last_modified(versions)
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+        if last_modified_ts is not None and last_modified_ts >= int(time.time()):
+            # Another write could still land in this second with the same timestamp
+            last_modified_ts = None
+
+        # Return 304/412 early if the client's copy is still current
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified_ts
+        )
+        if not_modified is not None and not_modified.status_code == 304:
+            not_modified['ETag'] = etag
+        return not_modified, etag, last_modified_ts
+
+    def finish(response, etag, last_modified_ts):
+        # Only successful responses carry validators
+        if response.status_code == 200:
+            response['ETag'] = etag
+            patch_vary_headers(response, ['Accept'])
+            if last_modified_ts is not None:
+                response['Last-Modified'] = http_date(last_modified_ts)
+        return response
+
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+            @wraps(method)
+            async def async_wrapper(view, request, *args, **kwargs):
+                with timing.phase('versions'):
+                    versions = await aget_table_versions(depends_on(request))
+                not_modified, etag, last_modified_ts = check(view, request, kwargs, versions)
+                if not_modified is not None:
+                    return not_modified
+                response = await method(view, request, *args, **kwargs)
+                return finish(response, etag, last_modified_ts)
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            with timing.phase('versions'):
+                versions = get_table_versions(depends_on(request))
+            not_modified, etag, last_modified_ts = check(view, request, kwargs, versions)
+            if not_modified is not None:
+                return not_modified
+            response = method(view, request, *args, **kwargs)
+            return finish(response, etag, last_modified_ts)
+        return wrapper
+    return decorator
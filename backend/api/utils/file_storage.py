@@ -5,16 +5,23 @@ This module provides utilities for secure file storage, including:
 1. Custom storage classes
 2. File naming conventions
 3. File validation
+4. Optional hash-prefix sharding of the directory layout
+5. Optional S3-compatible object storage (see object_storage.py)
+6. Optional append-only pack files for masks (see pack_storage.py)
 """
 import os
 import uuid
 import re
+import hashlib
 from django.core.files.storage import FileSystemStorage
 from django.conf import settings
 from django.utils.text import slugify
+from .object_storage import ObjectStorageMixin, get_client
+from . import timing
+from .pack_storage import PackStorageMixin, PackStore
 
 
-class SecureFileStorage(FileSystemStorage):
+class SecureFileStorage(ObjectStorageMixin, FileSystemStorage):
     """
     A custom file storage class that implements secure file storage practices.
     
@@ -22,9 +29,13 @@ class SecureFileStorage(FileSystemStorage):
     - Generates secure random filenames
     - Validates file types
     - Organizes files in appropriate directories
+    - Optionally shards files into hash-prefix subdirectories (e.g. ab/cd/name.jpg)
+      so no single directory grows past a few thousand entries
+    - Optionally keeps files in an S3-compatible object store instead of on disk
     """
     
-    def __init__(self, location=None, base_url=None, file_types=None):
+    def __init__(self, location=None, base_url=None, file_types=None, shard_depth=None,
+                 backend=None):
         """
         Initialize the storage with optional location and allowed file types.
         
@@ -32,14 +43,82 @@ class SecureFileStorage(FileSystemStorage):
             location: The directory where files will be stored
             base_url: The base URL for accessing files
             file_types: List of allowed file extensions (e.g., ['.jpg', '.jpeg'])
+            shard_depth: Number of two-hex-digit directory levels to shard into
+                         (defaults to settings.MEDIA_SHARD_DEPTH; 0 keeps a flat layout)
+            backend: 'filesystem' or 's3' (defaults to settings.MEDIA_STORAGE_BACKEND).
+                     With 's3', files are stored in settings.MEDIA_OBJECT_STORAGE under
+                     a key prefix mirroring the location relative to MEDIA_ROOT
         """
         if location is None:
             location = settings.MEDIA_ROOT
         if base_url is None:
             base_url = settings.MEDIA_URL
+        if shard_depth is None:
+            shard_depth = getattr(settings, 'MEDIA_SHARD_DEPTH', 0)
+            
+        if backend is None:
+            backend = getattr(settings, 'MEDIA_STORAGE_BACKEND', 'filesystem')
             
         self.file_types = file_types
+        self.shard_depth = shard_depth
         super().__init__(location, base_url)
+        
+        if backend == 's3':
+            self.object_store = get_client()
+            prefix = os.path.relpath(location, settings.MEDIA_ROOT).replace(os.sep, '/')
+            self.key_prefix = '' if prefix == '.' else prefix
+        elif backend != 'filesystem':
+            raise ValueError(f"Unknown storage backend {backend!r}")
+    
+    # Set by MaskStorage when mask pack files are enabled
+    pack_store = None
+    
+    def save(self, name, content, max_length=None):
+        """Save a file, timed as the request's 'storage' phase."""
+        with timing.phase('storage'):
+            return super().save(name, content, max_length=max_length)
+    
+    def delete_file(self, name):
+        """
+        Delete a stored file, bypassing any pack index.
+        
+        This never queries the database, so unlike delete() it is safe to call
+        from plain worker threads; packed blobs must be dropped separately
+        (see PackStore.delete_many).
+        
+        Returns:
+            True if the file existed
+        """
+        if not SecureFileStorage.exists(self, name):
+            return False
+        SecureFileStorage.delete(self, name)
+        return True
+    
+    @property
+    def is_local(self):
+        """True if every file is a plain file under `location` (no object store or packs)."""
+        return self.object_store is None and self.pack_store is None
+    
+    def shard_name(self, name):
+        """
+        Return the storage path for a filename under the sharded layout.
+        
+        The shard directories come from a hash of the file's base name, so the
+        same name always maps to the same location. With a shard depth of 0
+        the base name is returned unchanged (flat layout).
+        
+        Args:
+            name: A filename, with or without existing shard directories
+            
+        Returns:
+            The sharded relative path, e.g. 'ab/cd/photo.jpg'
+        """
+        base_name = os.path.basename(name)
+        if not self.shard_depth:
+            return base_name
+        digest = hashlib.md5(base_name.encode('utf-8')).hexdigest()
+        shards = [digest[level * 2:level * 2 + 2] for level in range(self.shard_depth)]
+        return '/'.join(shards + [base_name])
     
     def get_valid_name(self, name):
         """
@@ -74,8 +153,8 @@ class SecureFileStorage(FileSystemStorage):
         Returns:
             The original filename
         """
-        # First sanitize the name
-        name = self.get_valid_name(name)
+        # First sanitize the name, then place it in its shard directory
+        name = self.shard_name(self.get_valid_name(name))
         
         # If the file exists, delete it
         if self.exists(name):
@@ -119,16 +198,33 @@ class ImageStorage(SecureFileStorage):
         return f"{safe_name}{ext.lower()}"
 
 
-class MaskStorage(SecureFileStorage):
-    """Storage class specifically for masks."""
+class MaskStorage(PackStorageMixin, SecureFileStorage):
+    """
+    Storage class specifically for masks.
     
-    def __init__(self):
+    With settings.MASK_PACK_STORE enabled, new masks are appended to pack
+    files instead of being written as one file each.
+    """
+    
+    def __init__(self, packed=None):
         """Initialize with mask-specific settings."""
         super().__init__(
             location=os.path.join(settings.MEDIA_ROOT, 'masks'),
             base_url=f"{settings.MEDIA_URL}masks/",
             file_types=['.png', '.jpg', '.jpeg']
         )
+        
+        if packed is None:
+            packed = getattr(settings, 'MASK_PACK_STORE', False)
+        if packed:
+            if self.object_store is not None:
+                raise ValueError("Mask pack files can't be combined with object storage")
+            self.pack_store = PackStore(
+                'masks',
+                getattr(settings, 'MASK_PACK_DIR', os.path.join(settings.MEDIA_ROOT, 'packs')),
+                max_pack_bytes=getattr(settings, 'MASK_PACK_MAX_BYTES', 256 * 1024 * 1024),
+                fsync=getattr(settings, 'MASK_PACK_FSYNC', False),
+            )
     
     def get_valid_name(self, name):
         """
@@ -0,0 +1,259 @@
+"""
+Idempotency keys for the mask_generator API's write endpoints.
+
+Clients that time out and retry an upload or mask save would otherwise have
+the work redone and a duplicate row created. A client may send an
+`Idempotency-Key` header (any unique string, e.g. a UUID per logical
+request); the first request with a key is processed and its response stored
+in the IdempotencyKey table, and retries with the same key get the stored
+response back without reprocessing:
+1. The key is reserved before the handler runs (unique per scope and key)
+2. A retry while the first request is still running gets 409 Conflict
+3. A retry with a different payload under the same key gets 422
+4. Final responses are replayed for IDEMPOTENCY_TTL seconds: 2xx, and the
+   validation errors 400, 409 and 422. Anything else (5xx, other 4xx,
+   exceptions, and 400s a view marks with unhandled() because they come from
+   its catch-all exception handler) releases the key so it can be retried
+5. Reservations of requests that never completed (e.g. a crashed worker)
+   lapse after IDEMPOTENCY_LOCK_SECONDS
+
+Requests without the header are handled as before.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+from datetime import timedelta
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from ..renderers import FastJSONRenderer
+
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Expired rows are purged on every this many reservations in a process
+PURGE_INTERVAL = 100
+
+# Client errors that a retry of the same payload would get again
+FINAL_CLIENT_ERRORS = {
+    status.HTTP_400_BAD_REQUEST, status.HTTP_409_CONFLICT, status.HTTP_422_UNPROCESSABLE_ENTITY,
+}
+
+_reservations = itertools.count(1)
+
+
+def fingerprint(request):
+    """
+    Hash what identifies a request's payload: form fields and uploaded files.
+
+    Files are identified by name, size and content type rather than hashed,
+    so checking a retry costs no extra pass over a large upload.
+    """
+    digest = hashlib.sha256()
+    for name, values in sorted(request.POST.lists()):
+        digest.update(json.dumps([name, values]).encode())
+    for name, files in sorted(request.FILES.lists()):
+        for uploaded_file in files:
+            digest.update(json.dumps(
+                [name, uploaded_file.name, uploaded_file.size, uploaded_file.content_type]
+            ).encode())
+    return digest.hexdigest()
+
+
+def purge_expired():
+    """Delete idempotency records past their expiry; returns how many."""
+    from ..models import IdempotencyKey
+
+    return IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def reserve(scope, key, request_fingerprint):
+    """
+    Reserve a key for a new request, or return the existing record for it.
+
+    Returns:
+        None if the caller should process the request, else the IdempotencyKey
+        record of the earlier request with this key
+    """
+    from ..models import IdempotencyKey
+
+    if next(_reservations) % PURGE_INTERVAL == 0:
+        purge_expired()
+
+    now = timezone.now()
+    lock_seconds = getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 300)
+    for _ in range(2):
+        IdempotencyKey.objects.filter(scope=scope, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=request_fingerprint,
+                    expires_at=now + timedelta(seconds=lock_seconds),
+                )
+            return None
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is not None:
+                return record
+            # The other request released the key meanwhile; try again
+    return IdempotencyKey.objects.filter(scope=scope, key=key).first()
+
+
+def unhandled(response):
+    """
+    Mark a view's reply to an unexpected exception as not final.
+
+    Such errors may well not happen again, so the key is released rather
+    than the error being replayed to every retry.
+    """
+    response.idempotency_final = False
+    return response
+
+
+def is_final(response):
+    """Whether a response should be stored and replayed to retries."""
+    if not getattr(response, 'idempotency_final', True):
+        return False
+    return 200 <= response.status_code < 300 or response.status_code in FINAL_CLIENT_ERRORS
+
+
+def complete(scope, key, status_code, data):
+    """Store a finished request's final response."""
+    from ..models import IdempotencyKey
+
+    records = IdempotencyKey.objects.filter(scope=scope, key=key, status_code__isnull=True)
+    ttl = getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60)
+    records.update(
+        status_code=status_code, response=data,
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    )
+
+
+def release(scope, key):
+    """Release a reservation whose request raised or whose response isn't final."""
+    from ..models import IdempotencyKey
+
+    IdempotencyKey.objects.filter(scope=scope, key=key, status_code__isnull=True).delete()
+
+
+def invalid_key(key):
+    """Return the (status code, data, headers) reply for an overlong key, or None."""
+    if len(key) > MAX_KEY_LENGTH:
+        return (status.HTTP_400_BAD_REQUEST,
+                {'error': f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}, {})
+    return None
+
+
+def early_response(request_fingerprint, record):
+    """
+    Decide how to answer a request whose key was seen before.
+
+    Returns:
+        A (status code, data, headers) tuple
+    """
+    if record.fingerprint != request_fingerprint:
+        return (status.HTTP_422_UNPROCESSABLE_ENTITY,
+                {'error': f"{HEADER} was already used for a different request"}, {})
+    if record.status_code is None:
+        return (status.HTTP_409_CONFLICT,
+                {'error': f"A request with this {HEADER} is still being processed"},
+                {'Retry-After': '1'})
+    return record.status_code, record.response, {'Idempotent-Replayed': 'true'}
+
+
+def response_data(response):
+    """Return the JSON payload of a DRF Response or a rendered JSON HttpResponse."""
+    if isinstance(response, Response):
+        return response.data
+    return json.loads(response.content) if response.content else None
+
+
+def render(status_code, data, headers):
+    """Render an early reply for the async views."""
+    response = HttpResponse(
+        FastJSONRenderer().render(data), status=status_code, content_type='application/json'
+    )
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def idempotent(scope):
+    """
+    Decorator adding Idempotency-Key handling to a view's POST method.
+
+    Works on DRF APIView methods (replies are Responses) and on the async
+    views (replies are rendered with FastJSONRenderer). Sync and async
+    variants of an endpoint should share a scope so a retry against either
+    finds the first request.
+
+    Args:
+        scope: Name of the endpoint keys are unique within, e.g. 'image-upload'
+
+    Returns:
+        The decorator
+    """
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+            @wraps(method)
+            async def async_wrapper(view, request, *args, **kwargs):
+                key = request.headers.get(HEADER)
+                if not key:
+                    return await method(view, request, *args, **kwargs)
+
+                if invalid_key(key):
+                    return render(*invalid_key(key))
+                # Parsing the multipart body reads the upload; keep it off the loop
+                from .async_offload import run_io
+                request_fingerprint = await run_io(fingerprint, request)
+                record = await sync_to_async(reserve)(scope, key, request_fingerprint)
+                if record is not None:
+                    return render(*early_response(request_fingerprint, record))
+
+                try:
+                    response = await method(view, request, *args, **kwargs)
+                except BaseException:
+                    await sync_to_async(release)(scope, key)
+                    raise
+                if is_final(response):
+                    await sync_to_async(complete)(scope, key, response.status_code, response_data(response))
+                else:
+                    await sync_to_async(release)(scope, key)
+                return response
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return method(view, request, *args, **kwargs)
+
+            if invalid_key(key):
+                code, data, headers = invalid_key(key)
+                return Response(data, status=code, headers=headers)
+            request_fingerprint = fingerprint(request)
+            record = reserve(scope, key, request_fingerprint)
+            if record is not None:
+                code, data, headers = early_response(request_fingerprint, record)
+                return Response(data, status=code, headers=headers)
+
+            try:
+                response = method(view, request, *args, **kwargs)
+            except BaseException:
+                release(scope, key)
+                raise
+            if is_final(response):
+                complete(scope, key, response.status_code, response_data(response))
+            else:
+                release(scope, key)
+            return response
+        return wrapper
+    return decorator
+
@@ -1,9 +1,12 @@
 import os
 import io
 import tempfile
+from datetime import datetime
 from PIL import Image, ExifTags
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
-from django.core.files.base import ContentFile
+from django.utils import timezone
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.base import ContentFile, File
+from . import memory, timing
 
 
 def convert_mpo_to_jpeg(image_file):
@@ -17,30 +20,31 @@ def convert_mpo_to_jpeg(image_file):
         A new UploadedFile object with the converted image if it was MPO,
         or the original file if it was already JPEG
     """
-    # Open the image with PIL
-    if isinstance(image_file, InMemoryUploadedFile):
-        # For in-memory files
-        image = Image.open(io.BytesIO(image_file.read()))
-        # Reset file pointer
-        image_file.seek(0)
-    elif isinstance(image_file, TemporaryUploadedFile):
-        # For files saved to disk
-        image = Image.open(image_file.temporary_file_path())
-    else:
-        # For other file types
-        image = Image.open(image_file)
-    
-    # Check if the image is MPO format
-    if image.format == 'MPO':
+    # Open the image with PIL (only the header is read until pixels are needed)
+    image = open_image(image_file)
+    try:
+        # Check if the image is MPO format
+        if image.format != 'MPO':
+            # If it's not MPO, return the original file
+            return image_file
+        
+        # Create a new file name based on the original
+        new_name = os.path.splitext(image_file.name)[0] + '.jpg'
+        
+        # Decoding would exceed the memory budget: copy the first frame's
+        # JPEG stream out instead, or decode it at reduced resolution
+        if memory.decoded_bytes(image) > memory.get_budget():
+            content = extract_first_frame(image_file, image)
+            if content is None:
+                content = encode_reduced(image, memory.get_budget())
+            return ContentFile(content, name=new_name)
+        
         # MPO files contain multiple images, we'll extract the first one
         # Create a temporary file to save the converted image
         with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
             # Save the first image as JPEG
             image.save(temp_file.name, 'JPEG')
             
-            # Create a new file name based on the original
-            new_name = os.path.splitext(image_file.name)[0] + '.jpg'
-            
             # Create a new uploaded file
             with open(temp_file.name, 'rb') as f:
                 content = f.read()
@@ -51,9 +55,108 @@ def convert_mpo_to_jpeg(image_file):
             # Create a new file with the converted content
             converted_file = ContentFile(content, name=new_name)
             return converted_file
+    finally:
+        # Reset file pointer
+        image_file.seek(0)
+
+
+def open_image(image_file):
+    """
+    Open an uploaded image with PIL without copying it into memory.
+    
+    Args:
+        image_file: An UploadedFile (or other Django File) object
+        
+    Returns:
+        A lazily decoded PIL image
+    """
+    if isinstance(image_file, TemporaryUploadedFile):
+        # For files saved to disk
+        return Image.open(image_file.temporary_file_path())
+    # In-memory and other files are read in place
+    image_file.seek(0)
+    return Image.open(image_file)
+
+
+def extract_first_frame(image_file, image):
+    """
+    Copy the first frame of an MPO file as a plain JPEG, without decoding it.
     
-    # If it's not MPO, return the original file
-    return image_file
+    The frame is stored verbatim at the start of the file; only its MPF
+    (APP2) index segment is dropped so it no longer claims further frames.
+    
+    Args:
+        image_file: The MPO upload
+        image: The opened PIL image (for its MP index)
+        
+    Returns:
+        The JPEG bytes, or None if the MP index can't be used
+    """
+    try:
+        entry = image.mpinfo[0xB002][0]
+        size = entry['Size']
+        if entry['DataOffset'] != 0 or size <= 4:
+            return None
+    except (AttributeError, KeyError, IndexError, TypeError):
+        return None
+    
+    image_file.seek(0)
+    if image_file.read(2) != b'\xff\xd8':
+        return None
+    output = io.BytesIO()
+    output.write(b'\xff\xd8')
+    remaining = size - 2
+    # Copy header segments, dropping the MPF one, until the scan starts
+    while remaining >= 4:
+        header = image_file.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            return None
+        marker, length = header[1], int.from_bytes(header[2:4], 'big')
+        segment = image_file.read(length - 2)
+        remaining -= length + 2
+        if not (marker == 0xE2 and segment.startswith(b'MPF\x00')):
+            output.write(header)
+            output.write(segment)
+        if marker == 0xDA:
+            break
+    else:
+        return None
+    # Entropy-coded data through the end of the frame, in chunks
+    while remaining > 0:
+        chunk = image_file.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            return None
+        output.write(chunk)
+        remaining -= len(chunk)
+    return output.getvalue()
+
+
+def encode_reduced(image, budget):
+    """
+    Decode a JPEG-based image at the largest 1/2, 1/4 or 1/8 scale whose
+    pixels fit in the budget (the scaling happens inside libjpeg, so the full
+    frame is never allocated) and encode it as JPEG.
+    
+    Args:
+        image: An opened, not yet decoded PIL image
+        budget: The memory budget in bytes
+        
+    Returns:
+        The JPEG bytes
+    """
+    full_size = image.size
+    for scale in (2, 4, 8):
+        size = (full_size[0] // scale, full_size[1] // scale)
+        if size[0] * size[1] * 3 <= budget:
+            break
+    image.draft('RGB', size)
+    memory.logger.warning(
+        "Decoding %sx%s image at %sx%s to stay within the memory budget",
+        full_size[0], full_size[1], image.size[0], image.size[1],
+    )
+    output = io.BytesIO()
+    image.save(output, 'JPEG')
+    return output.getvalue()
 
 
 def extract_image_metadata(image_file):
@@ -66,18 +169,8 @@ def extract_image_metadata(image_file):
     Returns:
         A dictionary containing image metadata
     """
-    # Open the image with PIL
-    if isinstance(image_file, InMemoryUploadedFile):
-        # For in-memory files
-        image = Image.open(io.BytesIO(image_file.read()))
-        # Reset file pointer
-        image_file.seek(0)
-    elif isinstance(image_file, TemporaryUploadedFile):
-        # For files saved to disk
-        image = Image.open(image_file.temporary_file_path())
-    else:
-        # For other file types
-        image = Image.open(image_file)
+    # Open the image with PIL (only the header is read)
+    image = open_image(image_file)
     
     # Extract basic metadata
     metadata = {
@@ -105,9 +198,55 @@ def extract_image_metadata(image_file):
         # EXIF data might not be available or readable
         pass
     
+    # Reset file pointer
+    image_file.seek(0)
     return metadata
 
 
+def extract_indexed_fields(metadata):
+    """
+    Pull the frequently queried EXIF fields out of a metadata dictionary.
+    
+    These values are stored in indexed columns on the Image model so
+    queries like "all images from camera X" don't have to parse JSON.
+    
+    Args:
+        metadata: A metadata dictionary as returned by extract_image_metadata
+        
+    Returns:
+        A dictionary with camera_make, camera_model, taken_at and orientation
+        (each None when missing or unparseable)
+    """
+    exif = (metadata or {}).get('exif') or {}
+    
+    def clean_text(value):
+        # EXIF strings are often NUL-padded or space-padded
+        if not isinstance(value, str):
+            return None
+        value = value.replace('\x00', '').strip()
+        return value[:255] or None
+    
+    taken_at = None
+    raw_taken_at = exif.get('DateTimeOriginal')
+    if isinstance(raw_taken_at, str):
+        try:
+            taken_at = datetime.strptime(raw_taken_at.strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+            taken_at = timezone.make_aware(taken_at, timezone.get_default_timezone())
+        except ValueError:
+            taken_at = None
+    
+    orientation = exif.get('Orientation')
+    if not isinstance(orientation, int) or isinstance(orientation, bool) or not 1 <= orientation <= 8:
+        orientation = None
+    
+    return {
+        'camera_make': clean_text(exif.get('Make')),
+        'camera_model': clean_text(exif.get('Model')),
+        'taken_at': taken_at,
+        'orientation': orientation,
+    }
+
+
 def process_uploaded_image(image_file):
     """
     Process an uploaded image file - convert if needed and extract metadata.
@@ -118,10 +257,40 @@ def process_uploaded_image(image_file):
     Returns:
         A tuple containing (processed_file, metadata)
     """
-    # First convert MPO to JPEG if needed
-    processed_file = convert_mpo_to_jpeg(image_file)
+    with memory.profile('process_uploaded_image'):
+        # First convert MPO to JPEG if needed
+        with timing.phase('convert'):
+            processed_file = convert_mpo_to_jpeg(image_file)
+        
+        # Then extract metadata
+        with timing.phase('exif'):
+            metadata = extract_image_metadata(processed_file)
+    
+    return processed_file, metadata
+
+def process_image_file(path, name):
+    """
+    Process an upload stored on disk - convert if needed and extract metadata.
     
-    # Then extract metadata
-    metadata = extract_image_metadata(processed_file)
+    Unlike process_uploaded_image this takes and returns plain values, so it
+    can run in a process pool; the upload itself is read from disk rather
+    than passed in as bytes.
     
-    return processed_file, metadata
\ No newline at end of file
+    Args:
+        path: The path of the uploaded file's contents
+        name: The uploaded file's name
+        
+    Returns:
+        A tuple containing (converted bytes or None if unchanged, file name, metadata)
+    """
+    with open(path, 'rb') as f:
+        upload = File(f, name=name)
+        with memory.profile('process_image_file'):
+            processed_file = convert_mpo_to_jpeg(upload)
+            processed_file.seek(0)
+            metadata = extract_image_metadata(processed_file)
+        
+        if processed_file is upload:
+            return None, name, metadata
+        processed_file.seek(0)
+        return processed_file.read(), processed_file.name, metadata
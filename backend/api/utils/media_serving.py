@@ -0,0 +1,218 @@
+"""
+Media file serving for the mask_generator API.
+
+This module serves stored images and masks outside of DEBUG mode:
+1. Requests are confined to the image and mask storages and, if
+   MEDIA_REQUIRE_AUTH is on (it is off by default), to logged-in users
+2. The transfer is handed to the web server (X-Accel-Redirect / X-Sendfile)
+   or streamed with FileResponse, which uses the OS sendfile where the WSGI
+   server supports it
+3. Single byte ranges are answered with 206 Partial Content
+4. Responses are always revalidated with ETag/Last-Modified: stored names
+   are derived from upload names, and a re-saved mask keeps its name, so a
+   URL doesn't identify one version of the content
+"""
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+SERVE_MODES = ('python', 'x-accel-redirect', 'x-sendfile')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def requires_auth():
+    """
+    Whether media may only be fetched by authenticated users.
+
+    Opt-in with settings.MEDIA_REQUIRE_AUTH. It relies on Django's session
+    login, so only enable it where clients log in and send the session cookie
+    with media requests; there is no HTTP auth scheme to challenge with, so
+    anonymous requests get 403 like DRF's SessionAuthentication.
+    """
+    return getattr(settings, 'MEDIA_REQUIRE_AUTH', False)
+
+
+def get_storages():
+    """Return the storages media may be served from, keyed by URL directory."""
+    # Imported here to avoid a circular import with api.models
+    from ..models import Image, Mask
+
+    return {
+        'images': Image._meta.get_field('file').storage,
+        'masks': Mask._meta.get_field('file').storage,
+    }
+
+
+def resolve(path):
+    """
+    Map a media URL path to its storage and storage-relative name.
+
+    Only files inside the image and mask storages can be resolved; anything
+    else (including traversal attempts) raises Http404.
+
+    Args:
+        path: The path below MEDIA_URL, e.g. 'images/ab/cd/photo.jpg'
+
+    Returns:
+        A (storage, name) tuple
+    """
+    directory, _, name = path.partition('/')
+    storage = get_storages().get(directory)
+    parts = name.split('/')
+    if storage is None or not name or any(part in ('', '.', '..') for part in parts) or '\\' in name:
+        raise Http404("Media file not found")
+    return storage, name
+
+
+def parse_range(header, size):
+    """
+    Parse a Range header against a file size.
+
+    Only a single byte range is supported; multi-range requests are answered
+    with the full file, which RFC 9110 allows.
+
+    Args:
+        header: The Range header value (may be None)
+        size: The file size in bytes
+
+    Returns:
+        None for a full response, a (start, end) inclusive tuple for a
+        satisfiable range, or False if the range can't be satisfied
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """Return True if a Range request's If-Range validator (if any) still holds."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+class RangeFile:
+    """A read-only view of `length` bytes of a file starting at `start`."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def set_cache_headers(response):
+    """Let clients and proxies keep media, but only reuse it after revalidating."""
+    patch_cache_control(
+        response, public=True, no_cache=True,
+        max_age=getattr(settings, 'MEDIA_MAX_AGE', 0)
+    )
+
+
+def serve_media(request, path):
+    """
+    Serve a stored image or mask.
+
+    Args:
+        request: The HttpRequest (GET or HEAD)
+        path: The path below MEDIA_URL
+
+    Returns:
+        An HttpResponse that streams, offloads or redirects to the file
+    """
+    if requires_auth() and not request.user.is_authenticated:
+        return HttpResponseForbidden()
+
+    storage, name = resolve(path)
+    if storage.object_store is not None and storage.object_store.options['PUBLIC_URL']:
+        # The bucket serves the file itself
+        return HttpResponseRedirect(storage.url(name))
+
+    try:
+        size = storage.size(name)
+        modified = storage.get_modified_time(name)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404("Media file not found")
+
+    last_modified = modified.timestamp() if modified else 0
+    etag = quote_etag(f"{int(last_modified):x}-{size:x}")
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is None:
+        response = _transfer(request, storage, name, size, content_type, etag, last_modified)
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    set_cache_headers(response)
+    return response
+
+
+def _transfer(request, storage, name, size, content_type, etag, last_modified):
+    """Build the response carrying the file body (or its offload header)."""
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', 'python')
+    if mode not in SERVE_MODES:
+        raise ValueError(f"Unknown MEDIA_SERVE_MODE {mode!r}; expected one of {SERVE_MODES}")
+
+    if storage.is_local and mode != 'python':
+        # The web server handles the transfer, including byte ranges
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+            relative = os.path.relpath(storage.path(name), settings.MEDIA_ROOT).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative
+        else:
+            response.headers['X-Sendfile'] = storage.path(name)
+        return response
+
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        response = FileResponse(storage.open(name), content_type=content_type)
+        response.headers['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(storage.open(name), start, length), content_type=content_type)
+        response.status_code = 206
+        response.headers['Content-Length'] = str(length)
+        response.headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
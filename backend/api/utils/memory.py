@@ -0,0 +1,103 @@
+"""
+Memory guards and allocation profiling for image processing.
+
+Decoding an image costs about 3 bytes per pixel before anything else is
+allocated, so one 100 MP upload can grow a worker by hundreds of megabytes:
+1. decoded_bytes - estimate what decoding an image would take
+2. get_budget - the per-request limit (settings.UPLOAD_MEMORY_BUDGET);
+   image_processing switches images over it to paths that don't decode the
+   full frame (see convert_mpo_to_jpeg)
+3. profile - opt-in tracemalloc profiling (settings.PROFILE_IMAGE_MEMORY):
+   logs the peak traced memory of a block and the source lines holding the
+   most new memory at its end to the 'api.memory' logger
+
+tracemalloc slows allocation down noticeably and traces the whole process,
+so profiling is meant for diagnosing one worker, not for normal operation;
+concurrent profiled blocks share one trace and report overlapping peaks.
+"""
+import contextlib
+import logging
+import threading
+import tracemalloc
+from django.conf import settings
+
+
+logger = logging.getLogger('api.memory')
+
+BYTES_PER_PIXEL = {'1': 1, 'L': 1, 'P': 1, 'RGB': 3, 'YCbCr': 3, 'LAB': 3, 'HSV': 3, 'I;16': 2}
+
+_lock = threading.Lock()
+# Profiled blocks currently running, and whether this module started tracing
+_depth = 0
+_started = False
+
+
+def decoded_bytes(image):
+    """Return the memory a PIL image's pixels take once decoded."""
+    return image.width * image.height * BYTES_PER_PIXEL.get(image.mode, 4)
+
+
+def get_budget():
+    """Return the per-request decode memory budget in bytes."""
+    return getattr(settings, 'UPLOAD_MEMORY_BUDGET', 256 * 1024 * 1024)
+
+
+def is_profiling_enabled():
+    """Whether image processing is profiled (settings.PROFILE_IMAGE_MEMORY)."""
+    return getattr(settings, 'PROFILE_IMAGE_MEMORY', False)
+
+
+@contextlib.contextmanager
+def profile(label):
+    """
+    Profile the allocations of a with-block when profiling is enabled.
+
+    Tracing starts with the first profiled block and stops once no profiled
+    block is running any more (in whatever order overlapping blocks end),
+    unless it was already running (e.g. under `python -X tracemalloc`).
+    """
+    global _depth, _started
+    if not is_profiling_enabled():
+        yield
+        return
+
+    with _lock:
+        if _depth == 0:
+            _started = not tracemalloc.is_tracing()
+            if _started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        _depth += 1
+        before = tracemalloc.take_snapshot()
+    try:
+        yield
+    finally:
+        with _lock:
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            _depth -= 1
+            if _depth == 0 and _started:
+                tracemalloc.stop()
+                _started = False
+        report(label, peak, after.compare_to(before, 'lineno'))
+
+
+def report(label, peak, differences):
+    """Log a block's peak traced memory and its largest new allocations."""
+    top = [
+        difference for difference in differences
+        if difference.size_diff > 0 and difference.traceback[0].filename != tracemalloc.__file__
+    ][:getattr(settings, 'PROFILE_IMAGE_MEMORY_TOP', 10)]
+    allocations = [
+        {
+            'location': f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+            'bytes': difference.size_diff,
+            'count': difference.count_diff,
+        }
+        for difference in top
+    ]
+    logger.info(
+        "%s peak=%.1fMB %s", label, peak / 1e6,
+        ' '.join(f"{entry['location']}=+{entry['bytes'] / 1e6:.1f}MB" for entry in allocations),
+        extra={'label': label, 'peak_bytes': peak, 'allocations': allocations},
+    )
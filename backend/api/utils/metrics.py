@@ -0,0 +1,479 @@
+"""
+Prometheus metrics for the mask_generator API.
+
+A small in-process registry of counters, gauges and histograms, rendered in
+the Prometheus text exposition format (version 0.0.4) by the /metrics view.
+
+With several worker processes (gunicorn, uvicorn --workers) each process
+only sees its own observations, so values can be kept in a shared directory
+instead (settings.METRICS_DIR):
+1. Every process appends its samples to its own memory-mapped file in the
+   directory (counter-<pid>.db, gauge-<pid>.db); an update is a dictionary
+   lookup and an 8-byte write, no locking between processes
+2. A scrape, served by any worker, reads every file and merges them:
+   counters and histograms are summed over all files (including those of
+   exited workers, so totals never go backwards), gauges are summed over
+   the files of live processes only
+
+Empty the directory when the service (re)starts, as with prometheus_client's
+multiprocess mode. Without METRICS_DIR values live in process memory.
+
+Scrape-time collectors (register_collector) add values read on demand, such
+as the work queue backlog from the database.
+
+MetricsMiddleware records each request's latency and database query count
+under its URL name; count_queries is installed on every database connection
+to do the counting.
+"""
+import contextvars
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+PIXEL_BUCKETS = (1e5, 1e6, 4e6, 12e6, 24e6, 48e6, 100e6)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_INITIAL_FILE_SIZE = 1024 * 1024
+
+
+class MmapValues:
+    """
+    A str -> float dictionary stored in a memory-mapped file.
+
+    Layout: an 8-byte header holding the number of bytes used, then entries
+    of (int32 key length, key padded to 8-byte alignment, float64 value).
+    Entries are only appended, and the header is updated after the entry is
+    written, so readers in other processes never see a partial entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.truncate(_INITIAL_FILE_SIZE)
+            size = _INITIAL_FILE_SIZE
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from('i', self._map, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            struct.pack_into('i', self._map, 0, self._used)
+        self._positions = {key: position for key, _, position in self._entries(self._map, self._used)}
+
+    @staticmethod
+    def _entries(buffer, used):
+        position = 8
+        while position < used:
+            length = struct.unpack_from('i', buffer, position)[0]
+            padded = length + (8 - (length + 4) % 8)
+            key = bytes(buffer[position + 4:position + 4 + length]).decode('utf-8')
+            value_position = position + 4 + padded
+            yield key, struct.unpack_from('d', buffer, value_position)[0], value_position
+            position = value_position + 8
+
+    @classmethod
+    def read(cls, path):
+        """Return every (key, value) in a file, without mapping it for writing."""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < 8:
+            return []
+        used = struct.unpack_from('i', data, 0)[0]
+        return [(key, value) for key, value, _ in cls._entries(data, used)]
+
+    def _position(self, key):
+        position = self._positions.get(key)
+        if position is None:
+            encoded = key.encode('utf-8')
+            padding = 8 - (len(encoded) + 4) % 8
+            entry = struct.pack(f'i{len(encoded) + padding}sd', len(encoded), encoded + b' ' * padding, 0.0)
+            while self._used + len(entry) > self._capacity:
+                self._capacity *= 2
+                self._file.truncate(self._capacity)
+                self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), self._capacity)
+            self._map[self._used:self._used + len(entry)] = entry
+            position = self._positions[key] = self._used + 4 + len(encoded) + padding
+            self._used += len(entry)
+            struct.pack_into('i', self._map, 0, self._used)
+        return position
+
+    def add(self, key, amount):
+        position = self._position(key)
+        value = struct.unpack_from('d', self._map, position)[0]
+        struct.pack_into('d', self._map, position, value + amount)
+
+    def set(self, key, value):
+        struct.pack_into('d', self._map, self._position(key), value)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class MemoryValues:
+    """The single-process stand-in for MmapValues."""
+
+    def __init__(self):
+        self.values = {}
+
+    def add(self, key, amount):
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class ValueStore:
+    """
+    Where this process's counter and gauge values are kept.
+
+    Files are opened lazily and reopened after a fork, so each worker
+    process writes its own files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stores = {}
+        self._directory = None
+
+    def _store(self, kind):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if self._pid != os.getpid() or self._directory != directory:
+            self._pid = os.getpid()
+            self._directory = directory
+            self._stores = {}
+        store = self._stores.get(kind)
+        if store is None:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                store = MmapValues(os.path.join(directory, f"{kind}-{self._pid}.db"))
+            else:
+                store = MemoryValues()
+            self._stores[kind] = store
+        return store
+
+    def add(self, kind, key, amount):
+        with self._lock:
+            self._store(kind).add(key, amount)
+
+    def set(self, kind, key, value):
+        with self._lock:
+            self._store(kind).set(key, value)
+
+    def collect(self):
+        """
+        Return merged {key: value} dictionaries for counters and gauges.
+        """
+        with self._lock:
+            directory = getattr(settings, 'METRICS_DIR', None)
+            if not directory:
+                return {
+                    kind: dict(self._store(kind).values) for kind in ('counter', 'gauge')
+                }
+        merged = {'counter': {}, 'gauge': {}}
+        if not os.path.isdir(directory):
+            return merged
+        for filename in os.listdir(directory):
+            kind, _, rest = filename.partition('-')
+            if kind not in merged or not rest.endswith('.db'):
+                continue
+            if kind == 'gauge' and not _pid_alive(int(rest[:-3])):
+                continue
+            for key, value in MmapValues.read(os.path.join(directory, filename)):
+                merged[kind][key] = merged[kind].get(key, 0.0) + value
+        return merged
+
+    def reset(self):
+        """Forget this process's values (tests only; files are left alone)."""
+        with self._lock:
+            self._pid = None
+            self._stores = {}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+store = ValueStore()
+_registry = {}
+_collectors = []
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class Metric:
+    """Base class for registered metrics."""
+    kind = 'counter'
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return {name: str(value) for name, value in labels.items()}
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        store.add('counter', _key(self.name + '_total', self._labels(labels)), amount)
+
+
+class Gauge(Metric):
+    """A value that goes up and down; summed over live worker processes."""
+    kind = 'gauge'
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        store.set('gauge', _key(self.name, self._labels(labels)), value)
+
+
+class Histogram(Metric):
+    """A distribution of observations over fixed buckets."""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        for bound in self.buckets:
+            if value <= bound:
+                # Buckets are stored individually and made cumulative when rendered
+                store.add('counter', _key(self.name + '_bucket', {**labels, 'le': _format(bound)}), 1)
+                break
+        store.add('counter', _key(self.name + '_sum', labels), value)
+        store.add('counter', _key(self.name + '_count', labels), 1)
+
+
+def register_collector(collector):
+    """
+    Register a callable returning extra (name, type, help, [(labels, value)])
+    tuples, evaluated at each scrape.
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{label}="{_escape(str(text))}"' for label, text in labels)
+        return f"{name}{{{rendered}}} {_format(value)}"
+    return f"{name} {_format(value)}"
+
+
+def generate_latest():
+    """Render every metric in the Prometheus text exposition format."""
+    values = store.collect()
+    samples = {}
+    for kind, entries in values.items():
+        for key, value in entries.items():
+            name, labels = json.loads(key)
+            samples.setdefault(name, []).append(([tuple(pair) for pair in labels], value))
+
+    lines = []
+    for metric in sorted(_registry.values(), key=lambda m: m.name):
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        if isinstance(metric, Histogram):
+            lines.extend(_render_histogram(metric, samples))
+            continue
+        sample_name = metric.name + '_total' if isinstance(metric, Counter) else metric.name
+        for labels, value in sorted(samples.get(sample_name, [])):
+            lines.append(_sample(sample_name, labels, value))
+
+    for collector in _collectors:
+        for name, type_name, documentation, collected in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for labels, value in collected:
+                lines.append(_sample(name, sorted(labels.items()), value))
+    return '\n'.join(lines) + '\n'
+
+
+def _render_histogram(metric, samples):
+    """Yield the cumulative bucket, sum and count lines of a histogram."""
+    buckets = {}
+    for labels, value in samples.get(metric.name + '_bucket', []):
+        series = tuple(pair for pair in labels if pair[0] != 'le')
+        bound = dict(labels)['le']
+        buckets.setdefault(series, {})[bound] = value
+    sums = {tuple(labels): value for labels, value in samples.get(metric.name + '_sum', [])}
+    counts = {tuple(labels): value for labels, value in samples.get(metric.name + '_count', [])}
+
+    for series in sorted(counts):
+        cumulative = 0.0
+        for bound in metric.buckets:
+            cumulative += buckets.get(series, {}).get(_format(bound), 0.0)
+            yield _sample(metric.name + '_bucket', series + (('le', _format(bound)),), cumulative)
+        yield _sample(metric.name + '_sum', series, sums.get(series, 0.0))
+        yield _sample(metric.name + '_count', series, counts[series])
+
+
+# The API's metrics
+
+REQUEST_SECONDS = Histogram(
+    'api_request_duration_seconds', 'Request latency by view.', ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'api_request_db_queries', 'Database queries per request by view.', ['view'],
+    buckets=QUERY_BUCKETS,
+)
+UPLOAD_BYTES = Histogram(
+    'api_upload_bytes', 'Size of uploaded image files.', buckets=BYTES_BUCKETS,
+)
+UPLOAD_PIXELS = Histogram(
+    'api_upload_pixels', 'Pixel count of uploaded images.', buckets=PIXEL_BUCKETS,
+)
+DECODE_SECONDS = Histogram(
+    'api_decode_duration_seconds', 'Time to convert and read metadata of an upload.', ['format'],
+)
+MASK_BYTES = Histogram(
+    'api_mask_bytes', 'Size of saved mask files.', buckets=BYTES_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'api_serializer_cache_requests',
+    'Serializer cache lookups by kind and result; hit ratio = hit / (hit + miss).',
+    ['kind', 'result'],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'api_upload_admission_queue_depth', 'Uploads waiting for decode admission.',
+)
+ADMISSION_RUNNING = Gauge(
+    'api_upload_admission_running', 'Uploads currently decoding.',
+)
+ADMISSION_PIXELS = Gauge(
+    'api_upload_admission_pixels_in_flight', 'Pixels of the uploads currently decoding.',
+)
+ADMISSION_REJECTED = Counter(
+    'api_upload_admission_rejected', 'Uploads refused with 503 because decoding was saturated.',
+)
+
+
+def publish_admission(snapshot):
+    """Record an upload budget snapshot (called by the budget on every change)."""
+    ADMISSION_QUEUE_DEPTH.set(snapshot['queue_depth'])
+    ADMISSION_RUNNING.set(snapshot['running'])
+    ADMISSION_PIXELS.set(snapshot['pixels_in_flight'])
+
+
+@register_collector
+def work_queue_collector():
+    """Report the annotation work queue backlog, read from the database at scrape time."""
+    from django.utils import timezone
+    from ..models import ImageLease
+    from .work_queue import available_images
+
+    return [
+        ('api_work_queue_available_images', 'gauge',
+         'Unmasked images not leased to an annotator.', [({}, available_images().count())]),
+        ('api_work_queue_active_leases', 'gauge',
+         'Images currently leased to an annotator.',
+         [({}, ImageLease.objects.filter(expires_at__gt=timezone.now()).count())]),
+    ]
+
+
+_queries = contextvars.ContextVar('api_query_count', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper counting queries for the current request."""
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver adding count_queries to new connections."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class MetricsMiddleware:
+    """
+    Middleware recording request latency and query counts per view.
+
+    Requests are labelled with their URL name ('unmatched' for 404s outside
+    any route). Supports both sync and async (ASGI) request handling; the
+    query counter follows the request into sync_to_async threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = [0]
+        token = _queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, counter[0])
+        return response
+
+    async def __acall__(self, request):
+        counter = [0]
+        token = _queries.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, counter[0])
+        return response
+
+    def record(self, request, response, seconds, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        REQUEST_SECONDS.observe(seconds, view=view, method=request.method, status=response.status_code)
+        REQUEST_QUERIES.observe(queries, view=view)
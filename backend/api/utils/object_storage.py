@@ -0,0 +1,561 @@
+"""
+S3-compatible object storage for the mask_generator API.
+
+This module lets the SecureFileStorage classes keep media in an S3-compatible
+object store instead of on local disk. It only uses the standard library:
+1. ConnectionPool - keep-alive HTTP connections reused across requests
+2. ObjectStoreClient - SigV4-signed object operations, including multipart uploads
+3. ObjectFile - a lazily read file that fetches byte ranges on demand, so
+   sniffing an image header only downloads the first few kilobytes
+4. MetadataCache - a small TTL cache for exists()/size() lookups of objects
+   that exist; misses are never cached, so an object another worker has just
+   written is seen at once
+
+Writes and deletes through a client drop its cached entry, but the cache is
+per process: another worker's overwrite or delete can go unnoticed for up to
+METADATA_CACHE_TTL seconds, so keep it short (or 0) with several workers.
+
+Configuration lives in settings.MEDIA_OBJECT_STORAGE and is enabled with
+settings.MEDIA_STORAGE_BACKEND = 's3'.
+"""
+import hashlib
+import hmac
+import http.client
+import io
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from django.conf import settings
+from django.core.files.base import File
+
+
+DEFAULT_OPTIONS = {
+    'ENDPOINT_URL': 'http://127.0.0.1:9000',
+    'BUCKET': 'media',
+    'ACCESS_KEY': '',
+    'SECRET_KEY': '',
+    'REGION': 'us-east-1',
+    'PUBLIC_URL': None,
+    'MAX_CONNECTIONS': 16,
+    'TIMEOUT': 30,
+    'MULTIPART_THRESHOLD': 8 * 1024 * 1024,
+    'MULTIPART_CHUNK_SIZE': 8 * 1024 * 1024,
+    'MULTIPART_CONCURRENCY': 4,
+    'READ_CHUNK_SIZE': 256 * 1024,
+    'METADATA_CACHE_TTL': 5,
+    'METADATA_CACHE_SIZE': 10000,
+}
+
+
+class ObjectStoreError(IOError):
+    """Raised when the object store returns an unexpected response."""
+
+    def __init__(self, method, key, status, body=b''):
+        self.status = status
+        super().__init__(f"{method} {key} failed with HTTP {status}: {body[:200]!r}")
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of keep-alive HTTP(S) connections to one host.
+
+    Connections are created on demand up to `maxsize` idle connections;
+    busy threads beyond that open extra connections that are closed after use.
+    """
+
+    def __init__(self, endpoint_url, maxsize=16, timeout=30):
+        parts = urlsplit(endpoint_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=maxsize)
+
+    def _new_connection(self):
+        connection_class = (
+            http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        )
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Send a request on a pooled connection.
+
+        A request that fails on a reused connection (e.g. the server closed
+        an idle keep-alive socket) is retried once on a fresh connection.
+
+        Returns:
+            A (status, headers dict with lower-case names, body bytes) tuple
+        """
+        for attempt in range(2):
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._new_connection(), False
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, data
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class MetadataCache:
+    """
+    A small thread-safe TTL cache of metadata for objects that exist.
+    """
+
+    def __init__(self, ttl=5, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key):
+        """Return (hit, value) for a key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False, None
+            return True, entry[1]
+
+    def set(self, key, value):
+        """Store an object's metadata; None (a missing object) is not cached."""
+        if not self.ttl or value is None:
+            return
+        with self._lock:
+            if len(self._entries) >= self.maxsize:
+                # Cheap eviction: drop the oldest insertion
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def discard(self, key):
+        """Forget a key."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class ObjectStoreClient:
+    """
+    Minimal S3 API client with SigV4 signing and pooled connections.
+
+    Uses path-style addressing (endpoint/bucket/key), which every
+    S3-compatible server supports.
+    """
+
+    def __init__(self, options):
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self.bucket = self.options['BUCKET']
+        self.pool = ConnectionPool(
+            self.options['ENDPOINT_URL'],
+            maxsize=self.options['MAX_CONNECTIONS'],
+            timeout=self.options['TIMEOUT'],
+        )
+        self.metadata = MetadataCache(
+            ttl=self.options['METADATA_CACHE_TTL'],
+            maxsize=self.options['METADATA_CACHE_SIZE'],
+        )
+
+    # Signing
+
+    def _signing_key(self, datestamp):
+        key = ('AWS4' + self.options['SECRET_KEY']).encode('utf-8')
+        for part in (datestamp, self.options['REGION'], 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+        return key
+
+    def _signed_headers(self, method, path, query, body, extra_headers):
+        now = datetime.now(dt_timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = now.strftime('%Y%m%d')
+        payload_hash = hashlib.sha256(body or b'').hexdigest()
+
+        headers = {
+            'host': self.pool.netloc,
+            'x-amz-content-sha256': payload_hash,
+            'x-amz-date': amz_date,
+        }
+        signed_names = sorted(headers)
+        canonical_query = '&'.join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, value in sorted(query.items())
+        )
+        canonical_request = '\n'.join([
+            method,
+            path,
+            canonical_query,
+            ''.join(f"{name}:{headers[name]}\n" for name in signed_names),
+            ';'.join(signed_names),
+            payload_hash,
+        ])
+        scope = f"{datestamp}/{self.options['REGION']}/s3/aws4_request"
+        string_to_sign = '\n'.join([
+            'AWS4-HMAC-SHA256',
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+        ])
+        signature = hmac.new(
+            self._signing_key(datestamp), string_to_sign.encode('utf-8'), hashlib.sha256
+        ).hexdigest()
+        headers['authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={self.options['ACCESS_KEY']}/{scope}, "
+            f"SignedHeaders={';'.join(signed_names)}, Signature={signature}"
+        )
+        headers.update(extra_headers or {})
+        return headers
+
+    def _request(self, method, key, query=None, body=None, headers=None, expect=(200,)):
+        query = query or {}
+        path = quote(f"/{self.bucket}/{key}", safe='/~')
+        url = path
+        if query:
+            url += '?' + '&'.join(
+                f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}" if value else quote(name, safe='-_.~')
+                for name, value in sorted(query.items())
+            )
+        signed = self._signed_headers(method, path, query, body, headers)
+        if body is not None:
+            signed['content-length'] = str(len(body))
+        status, response_headers, data = self.pool.request(method, url, body=body, headers=signed)
+        if status not in expect:
+            raise ObjectStoreError(method, key, status, data)
+        return status, response_headers, data
+
+    # Object operations
+
+    def head(self, key):
+        """
+        Return metadata for an object, or None if it doesn't exist.
+
+        Objects that exist are cached for METADATA_CACHE_TTL seconds; misses
+        always go to the store.
+        """
+        hit, value = self.metadata.get(key)
+        if hit:
+            return value
+        status, headers, _ = self._request('HEAD', key, expect=(200, 404))
+        value = None
+        if status == 200:
+            value = {
+                'size': int(headers.get('content-length', 0)),
+                'etag': headers.get('etag'),
+                'last_modified': parsedate_to_datetime(headers['last-modified'])
+                if 'last-modified' in headers else None,
+            }
+        self.metadata.set(key, value)
+        return value
+
+    def get_range(self, key, start, end):
+        """
+        Read bytes start..end (inclusive) of an object.
+
+        Returns:
+            The bytes (possibly shorter than requested at end of object)
+        """
+        status, _, data = self._request(
+            'GET', key, headers={'range': f"bytes={start}-{end}"}, expect=(200, 206, 416)
+        )
+        if status == 416:
+            return b''
+        if status == 200:
+            # Server ignored the range; slice it ourselves
+            return data[start:end + 1]
+        return data
+
+    def put(self, key, data, content_type='application/octet-stream'):
+        """Upload an object in a single request."""
+        self.metadata.discard(key)
+        self._request('PUT', key, body=data, headers={'content-type': content_type})
+        self.metadata.discard(key)
+
+    def put_multipart(self, key, chunks, content_type='application/octet-stream'):
+        """
+        Upload an object in parts.
+
+        Parts are uploaded concurrently (up to MULTIPART_CONCURRENCY) over
+        pooled connections; the upload is aborted if any part fails.
+
+        Args:
+            key: The object key
+            chunks: Iterable of bytes, each at least 5 MB except the last
+        """
+        self.metadata.discard(key)
+        _, _, data = self._request(
+            'POST', key, query={'uploads': ''}, body=b'',
+            headers={'content-type': content_type}
+        )
+        upload_id = _find_xml_text(data, 'UploadId')
+
+        def upload_part(numbered_chunk):
+            number, chunk = numbered_chunk
+            _, headers, _ = self._request(
+                'PUT', key, query={'partNumber': str(number), 'uploadId': upload_id}, body=chunk
+            )
+            return number, headers.get('etag')
+
+        concurrency = self.options['MULTIPART_CONCURRENCY']
+        try:
+            parts = []
+            pending = []
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # Keep at most `concurrency` parts in memory at once
+                for numbered_chunk in enumerate(chunks, start=1):
+                    if len(pending) >= concurrency:
+                        parts.append(pending.pop(0).result())
+                    pending.append(executor.submit(upload_part, numbered_chunk))
+                parts.extend(future.result() for future in pending)
+            manifest = ''.join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in parts
+            )
+            self._request(
+                'POST', key, query={'uploadId': upload_id},
+                body=f"<CompleteMultipartUpload>{manifest}</CompleteMultipartUpload>".encode('utf-8')
+            )
+        except Exception:
+            self._request('DELETE', key, query={'uploadId': upload_id}, expect=(200, 204, 404))
+            raise
+        finally:
+            self.metadata.discard(key)
+
+    def delete(self, key):
+        """Delete an object (missing objects are ignored)."""
+        self.metadata.discard(key)
+        self._request('DELETE', key, expect=(200, 204, 404))
+        self.metadata.discard(key)
+
+
+def _find_xml_text(data, tag):
+    """Return the text of the first element named `tag` in an S3 XML response."""
+    for element in ElementTree.fromstring(data).iter():
+        if element.tag == tag or element.tag.endswith('}' + tag):
+            return element.text
+    raise ObjectStoreError('PARSE', tag, 0, data)
+
+
+class ObjectFile(File):
+    """
+    A read-only file backed by an object, fetched in ranges on demand.
+
+    Reads are served from a read-ahead buffer of READ_CHUNK_SIZE bytes, so
+    small header reads (e.g. PIL sniffing the format) cost one small request.
+    """
+
+    def __init__(self, client, key, name, chunk_size):
+        self._client = client
+        self._key = key
+        self._chunk_size = chunk_size
+        self._position = 0
+        self._buffer = b''
+        self._buffer_start = 0
+        self._size = None
+        self.mode = 'rb'
+        self.name = name
+        self.file = self
+
+    @property
+    def size(self):
+        if self._size is None:
+            metadata = self._client.head(self._key)
+            if metadata is None:
+                raise FileNotFoundError(self._key)
+            self._size = metadata['size']
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = self.size + offset
+        return self._position
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(self.size - self._position, 0)
+        result = bytearray()
+        while size > 0:
+            offset = self._position - self._buffer_start
+            if 0 <= offset < len(self._buffer):
+                piece = self._buffer[offset:offset + size]
+            else:
+                fetch = max(size, self._chunk_size)
+                self._buffer = self._client.get_range(self._key, self._position, self._position + fetch - 1)
+                self._buffer_start = self._position
+                if not self._buffer:
+                    break
+                piece = self._buffer[:size]
+            result += piece
+            self._position += len(piece)
+            size -= len(piece)
+        return bytes(result)
+
+    def chunks(self, chunk_size=None):
+        self.seek(0)
+        while True:
+            data = self.read(chunk_size or self._chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self._buffer = b''
+
+    @property
+    def closed(self):
+        return False
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(options=None):
+    """
+    Return a shared ObjectStoreClient for the given (or configured) options.
+
+    Storages pointing at the same endpoint and bucket share one connection pool.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or getattr(settings, 'MEDIA_OBJECT_STORAGE', {}))}
+    cache_key = (options['ENDPOINT_URL'], options['BUCKET'], options['ACCESS_KEY'])
+    with _clients_lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = _clients[cache_key] = ObjectStoreClient(options)
+        return client
+
+
+def _read_parts(content, part_size):
+    """
+    Yield a file's content in parts of exactly `part_size` bytes (except the last).
+
+    File.chunks() can't be used for this: in-memory uploads ignore the chunk size.
+    """
+    while True:
+        part = content.read(part_size)
+        if not part:
+            return
+        yield part
+
+
+class ObjectStorageMixin:
+    """
+    Storage mixin that moves file I/O to an object store when enabled.
+
+    Storages mixing this in before FileSystemStorage behave exactly like the
+    filesystem storage unless `self.object_store` is set, in which case files
+    live under `self.key_prefix` in the configured bucket.
+    """
+    object_store = None
+    key_prefix = ''
+
+    def _key(self, name):
+        name = name.replace('\\', '/').lstrip('/')
+        return f"{self.key_prefix}/{name}" if self.key_prefix else name
+
+    def _save(self, name, content):
+        if self.object_store is None:
+            return super()._save(name, content)
+
+        options = self.object_store.options
+        content_type = getattr(content, 'content_type', None) or 'application/octet-stream'
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        size = getattr(content, 'size', None)
+        if size is not None and size > options['MULTIPART_THRESHOLD']:
+            self.object_store.put_multipart(
+                self._key(name), _read_parts(content, options['MULTIPART_CHUNK_SIZE']), content_type
+            )
+        else:
+            self.object_store.put(self._key(name), b''.join(content.chunks()), content_type)
+        return name
+
+    def _open(self, name, mode='rb'):
+        if self.object_store is None:
+            return super()._open(name, mode)
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError("Object storage files can only be opened for reading")
+        return ObjectFile(
+            self.object_store, self._key(name), name, self.object_store.options['READ_CHUNK_SIZE']
+        )
+
+    def exists(self, name):
+        if self.object_store is None:
+            return super().exists(name)
+        return self.object_store.head(self._key(name)) is not None
+
+    def delete(self, name):
+        if self.object_store is None:
+            return super().delete(name)
+        self.object_store.delete(self._key(name))
+
+    def size(self, name):
+        if self.object_store is None:
+            return super().size(name)
+        metadata = self.object_store.head(self._key(name))
+        if metadata is None:
+            raise FileNotFoundError(name)
+        return metadata['size']
+
+    def get_modified_time(self, name):
+        if self.object_store is None:
+            return super().get_modified_time(name)
+        metadata = self.object_store.head(self._key(name))
+        if metadata is None:
+            raise FileNotFoundError(name)
+        return metadata['last_modified']
+
+    def url(self, name):
+        public_url = self.object_store and self.object_store.options['PUBLIC_URL']
+        if public_url:
+            return f"{public_url.rstrip('/')}/{quote(self._key(name))}"
+        return super().url(name)
+
+    def path(self, name):
+        if self.object_store is None:
+            return super().path(name)
+        raise NotImplementedError("Object storage files have no local filesystem path")
+
+    def listdir(self, path):
+        if self.object_store is None:
+            return super().listdir(path)
+        raise NotImplementedError("Listing is not supported on object storage")
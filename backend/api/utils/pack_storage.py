@@ -0,0 +1,358 @@
+"""
+Append-only pack files for small media blobs (used for masks).
+
+Instead of one file (and inode) per mask, encoded masks are appended to large
+pack files and located through a compact index in the PackedBlob table:
+1. PackStore.append - append a blob under a lock and record (pack, offset, length, sha256)
+2. PackStore.open - read a blob through a cached mmap of its pack
+3. PackStore.compact - copy live blobs out of mostly-superseded packs and
+   delete those packs, reclaiming the space of overwritten or deleted masks
+4. PackStorageMixin - plugs a PackStore into a Django storage; names not in
+   the index fall through to the regular files, so existing loose masks keep
+   working after packing is enabled
+
+Enabled with settings.MASK_PACK_STORE = True.
+"""
+import contextlib
+import hashlib
+import io
+import mmap
+import os
+import re
+import threading
+from django.core.files.base import File
+from django.db.models import Sum
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+PACK_NAME_RE = re.compile(r'^(?P<namespace>[\w\-]+)-(?P<number>\d{6})\.pack$')
+
+
+class BlobReader(io.RawIOBase):
+    """A read-only, seekable file over a slice of an mmap."""
+
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = len(self._view) + offset
+        return self._position
+
+    def readinto(self, buffer):
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+class PackStore:
+    """
+    Append-only blob store backed by pack files in one directory.
+
+    Appends are serialized with a thread lock plus an flock on a lock file,
+    so several worker processes can share a pack directory.
+    """
+
+    def __init__(self, namespace, directory, max_pack_bytes=256 * 1024 * 1024, fsync=False):
+        self.namespace = namespace
+        self.directory = directory
+        self.max_pack_bytes = max_pack_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._maps_lock = threading.Lock()
+        self._maps = {}
+        self._active = None
+
+    # Pack files
+
+    def pack_path(self, number):
+        return os.path.join(self.directory, f"{self.namespace}-{number:06d}.pack")
+
+    def pack_numbers(self):
+        """Return the numbers of this namespace's pack files, in order."""
+        if not os.path.isdir(self.directory):
+            return []
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = PACK_NAME_RE.match(name)
+            if match and match.group('namespace') == self.namespace:
+                numbers.append(int(match.group('number')))
+        return sorted(numbers)
+
+    def _open_for_append(self, size):
+        """
+        Return (number, file positioned at its end) of a pack with room for `size` bytes.
+
+        Only the newest pack takes appends (compaction never touches it), so a
+        pack kept open from earlier is dropped once another process has moved
+        on to a newer one or compaction has removed it. Call with the append
+        lock held.
+        """
+        numbers = self.pack_numbers()
+        newest = numbers[-1] if numbers else None
+        if self._active is not None:
+            number, pack = self._active
+            if number == newest:
+                # Other processes may have appended; always measure the real end
+                pack.seek(0, io.SEEK_END)
+                if pack.tell() + size <= self.max_pack_bytes or pack.tell() == 0:
+                    return number, pack
+            pack.close()
+            self._active = None
+
+        number = newest or 1
+        if numbers and os.path.getsize(self.pack_path(number)) + size > self.max_pack_bytes:
+            number += 1
+        pack = open(self.pack_path(number), 'ab')
+        pack.seek(0, io.SEEK_END)
+        self._active = (number, pack)
+        return number, pack
+
+    @contextlib.contextmanager
+    def _append_lock(self):
+        """Hold the cross-thread and (where flock exists) cross-process append lock."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, f"{self.namespace}.lock"), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, data):
+        """Append bytes to a pack and return (number, offset)."""
+        with self._append_lock():
+            return self._write_locked(data)
+
+    def _write_locked(self, data):
+        number, pack = self._open_for_append(len(data))
+        offset = pack.tell()
+        pack.write(data)
+        pack.flush()
+        if self.fsync:
+            os.fsync(pack.fileno())
+        return number, offset
+
+    def _view(self, number, offset, length):
+        """Return a memoryview of a blob, (re)mapping its pack as needed."""
+        if not length:
+            return memoryview(b'')
+        with self._maps_lock:
+            mapped = self._maps.get(number)
+            if mapped is None or len(mapped) < offset + length:
+                with open(self.pack_path(number), 'rb') as f:
+                    # Superseded maps are not closed: open readers may still use them
+                    mapped = self._maps[number] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)[offset:offset + length]
+
+    def _forget(self, number):
+        with self._maps_lock:
+            self._maps.pop(number, None)
+
+    # Blob operations
+
+    def _index(self):
+        from ..models import PackedBlob
+
+        return PackedBlob.objects.filter(namespace=self.namespace)
+
+    def lookup(self, name):
+        """Return the index row for a name, or None."""
+        return self._index().filter(name=name).first()
+
+    def append(self, name, data):
+        """
+        Store a blob under a name, superseding any previous version.
+
+        Returns:
+            The PackedBlob index row
+        """
+        from ..models import PackedBlob
+
+        number, offset = self._write(data)
+        blob, _ = PackedBlob.objects.update_or_create(
+            namespace=self.namespace, name=name,
+            defaults={
+                'pack': number,
+                'offset': offset,
+                'length': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            },
+        )
+        return blob
+
+    def open(self, name):
+        """
+        Open a blob for reading, or return None if the name isn't packed.
+
+        A pack may be removed by compaction between the index lookup and the
+        mmap; the lookup is then retried once against the updated index.
+        """
+        for attempt in range(2):
+            blob = self.lookup(name)
+            if blob is None:
+                return None
+            try:
+                return BlobReader(self._view(blob.pack, blob.offset, blob.length))
+            except FileNotFoundError:
+                self._forget(blob.pack)
+                if attempt:
+                    raise
+
+    def delete(self, name):
+        """Drop a blob from the index (its bytes are reclaimed by compaction)."""
+        return self._index().filter(name=name).delete()[0] > 0
+
+    def delete_many(self, names, batch_size=500):
+        """
+        Drop several blobs from the index, returning the set of names that were packed.
+
+        Names are looked up in batches, so long lists stay under the
+        database's limit on query parameters.
+        """
+        deleted = set()
+        names = list(names)
+        for start in range(0, len(names), batch_size):
+            found = self._index().filter(name__in=names[start:start + batch_size])
+            batch = set(found.values_list('name', flat=True))
+            if batch:
+                found.delete()
+                deleted |= batch
+        return deleted
+
+    def names(self):
+        """Return a dictionary of every packed name to the time it was stored."""
+        return dict(self._index().values_list('name', 'stored_at'))
+
+    def compact(self, min_garbage_ratio=0.5, dry_run=False):
+        """
+        Rewrite packs whose superseded bytes exceed min_garbage_ratio.
+
+        Live blobs are verified against their hash and appended to the current
+        pack; each index row is only repointed if it still refers to the old
+        location, so blobs replaced during compaction are not resurrected.
+        Each pack is rewritten under the append lock, so no process appends
+        while it is copied, and the newest pack (the only one appends go to)
+        is never compacted. A pack is only deleted once no index row points
+        into it any more.
+
+        Returns:
+            A dictionary with the packs rewritten and bytes reclaimed
+        """
+        numbers = self.pack_numbers()
+        live = dict(
+            self._index().values('pack').annotate(live=Sum('length')).values_list('pack', 'live')
+        )
+        result = {'packs': 0, 'blobs': 0, 'reclaimed_bytes': 0}
+
+        for number in numbers[:-1]:
+            size = os.path.getsize(self.pack_path(number))
+            live_bytes = live.get(number) or 0
+            if not size or (size - live_bytes) / size < min_garbage_ratio:
+                continue
+            if dry_run:
+                result['packs'] += 1
+                result['reclaimed_bytes'] += size - live_bytes
+                continue
+
+            with self._append_lock():
+                if number == self.pack_numbers()[-1]:
+                    continue
+                for blob in self._index().filter(pack=number).order_by('offset').iterator():
+                    view = self._view(number, blob.offset, blob.length)
+                    data = bytes(view)
+                    view.release()
+                    if hashlib.sha256(data).hexdigest() != blob.sha256:
+                        raise IOError(f"Pack {number} is corrupt: {blob.name} fails its hash check")
+                    new_pack, new_offset = self._write_locked(data)
+                    result['blobs'] += self._index().filter(
+                        pk=blob.pk, pack=number, offset=blob.offset
+                    ).update(pack=new_pack, offset=new_offset)
+
+                # An index update racing with the copy leaves the pack for the next run
+                if self._index().filter(pack=number).exists():
+                    continue
+                self._forget(number)
+                os.remove(self.pack_path(number))
+                result['packs'] += 1
+                result['reclaimed_bytes'] += size - live_bytes
+        return result
+
+
+class PackStorageMixin:
+    """
+    Storage mixin that stores new files in a PackStore when enabled.
+
+    Storages mixing this in behave exactly like their base class unless
+    `self.pack_store` is set. Packed names are resolved through the index
+    first; names that aren't packed fall through to the base storage.
+    """
+    pack_store = None
+
+    def _save(self, name, content):
+        if self.pack_store is None:
+            return super()._save(name, content)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        self.pack_store.append(name, b''.join(content.chunks()))
+        return name
+
+    def _open(self, name, mode='rb'):
+        if self.pack_store is not None:
+            if 'w' in mode or 'a' in mode or '+' in mode:
+                raise ValueError("Packed files can only be opened for reading")
+            reader = self.pack_store.open(name)
+            if reader is not None:
+                return File(reader, name=name)
+        return super()._open(name, mode)
+
+    def exists(self, name):
+        if self.pack_store is not None and self.pack_store.lookup(name) is not None:
+            return True
+        return super().exists(name)
+
+    def delete(self, name):
+        if self.pack_store is not None:
+            self.pack_store.delete(name)
+        return super().delete(name)
+
+    def size(self, name):
+        if self.pack_store is not None:
+            blob = self.pack_store.lookup(name)
+            if blob is not None:
+                return blob.length
+        return super().size(name)
+
+    def get_modified_time(self, name):
+        if self.pack_store is not None:
+            blob = self.pack_store.lookup(name)
+            if blob is not None:
+                return blob.stored_at
+        return super().get_modified_time(name)
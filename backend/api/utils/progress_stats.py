@@ -0,0 +1,169 @@
+"""
+Annotation progress statistics for the mask_generator API.
+
+Counters are kept in the StatCounter table and maintained incrementally from
+Image/Mask signals, so the dashboard reads them with one query instead of
+downloading the full image and mask lists:
+1. images.total / images.masked - the image catalog and how much is done
+2. masks.total - all saved masks
+3. masks.day.<YYYY-MM-DD> - masks saved per day
+4. masks.annotator.<name> - masks saved per annotator
+
+reconcile() recomputes every counter from the source tables and is run
+periodically by the reconcile_stats management command to repair any drift
+(e.g. after raw SQL deletes that bypass signals).
+"""
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+IMAGES_TOTAL = 'images.total'
+IMAGES_MASKED = 'images.masked'
+MASKS_TOTAL = 'masks.total'
+MASKS_DAY_PREFIX = 'masks.day.'
+MASKS_ANNOTATOR_PREFIX = 'masks.annotator.'
+
+# Room left in StatCounter.key after the longest prefix
+MAX_ANNOTATOR_LENGTH = 200
+
+
+def day_key(moment):
+    """Return the per-day counter key for a timestamp."""
+    return f"{MASKS_DAY_PREFIX}{timezone.localdate(moment).isoformat()}"
+
+
+def annotator_key(annotator):
+    """Return the per-annotator counter key (empty names count as anonymous)."""
+    return f"{MASKS_ANNOTATOR_PREFIX}{(annotator or 'anonymous')[:MAX_ANNOTATOR_LENGTH]}"
+
+
+def mask_keys(mask):
+    """Return the counter keys a single mask contributes to."""
+    return [MASKS_TOTAL, day_key(mask.created_at), annotator_key(mask.annotator)]
+
+
+def read_stats():
+    """
+    Read the dashboard statistics from the counters with a single query.
+
+    Returns:
+        A dictionary with image totals and mask totals per day and annotator
+    """
+    from ..models import StatCounter
+
+    counters = dict(StatCounter.objects.values_list('key', 'value'))
+    per_day = {
+        key[len(MASKS_DAY_PREFIX):]: value
+        for key, value in sorted(counters.items())
+        if key.startswith(MASKS_DAY_PREFIX) and value
+    }
+    per_annotator = {
+        key[len(MASKS_ANNOTATOR_PREFIX):]: value
+        for key, value in sorted(counters.items())
+        if key.startswith(MASKS_ANNOTATOR_PREFIX) and value
+    }
+    total = counters.get(IMAGES_TOTAL, 0)
+    masked = counters.get(IMAGES_MASKED, 0)
+    return {
+        'images': {
+            'total': total,
+            'masked': masked,
+            'unmasked': total - masked,
+        },
+        'masks': {
+            'total': counters.get(MASKS_TOTAL, 0),
+            'per_day': per_day,
+            'per_annotator': per_annotator,
+        },
+    }
+
+
+def compute_counters(Image, Mask):
+    """
+    Compute the exact value of every counter from the source tables.
+
+    The model classes are passed in so migrations can call this with
+    historical models.
+
+    Returns:
+        A dictionary mapping counter key to value
+    """
+    counters = {
+        IMAGES_TOTAL: Image.objects.count(),
+        IMAGES_MASKED: Image.objects.filter(masks__isnull=False).distinct().count(),
+        MASKS_TOTAL: Mask.objects.count(),
+    }
+    per_day = (
+        Mask.objects.annotate(day=TruncDate('created_at'))
+        .values('day').annotate(count=Count('id')).order_by()
+    )
+    for row in per_day:
+        counters[f"{MASKS_DAY_PREFIX}{row['day'].isoformat()}"] = row['count']
+    per_annotator = Mask.objects.values('annotator').annotate(count=Count('id')).order_by()
+    for row in per_annotator:
+        key = annotator_key(row['annotator'])
+        counters[key] = counters.get(key, 0) + row['count']
+    return counters
+
+
+def lock_counters(StatCounter):
+    """
+    Block counter writes until the current transaction ends.
+
+    On PostgreSQL the table is locked, so increments and the creation of new
+    counter rows both wait; reads carry on. SQLite already holds the database
+    write lock for the whole transaction (transaction_mode IMMEDIATE), and
+    other backends lock the existing rows with SELECT ... FOR UPDATE.
+    """
+    connection = connections[router.db_for_write(StatCounter)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOCK TABLE {connection.ops.quote_name(StatCounter._meta.db_table)} "
+                f"IN SHARE ROW EXCLUSIVE MODE"
+            )
+    else:
+        list(StatCounter.objects.select_for_update().values_list('pk', flat=True))
+
+
+def reconcile(Image, Mask, StatCounter):
+    """
+    Rewrite all counters (and Image.has_mask flags) from the source tables.
+
+    The counters are locked first, so increments made by concurrent writers
+    wait for the new values instead of being overwritten by them. Drifted
+    counters are updated in place and missing ones created; counters with
+    nothing left to count are set to zero.
+
+    Returns:
+        A dictionary of {key: (old value, new value)} for counters that drifted
+    """
+    with transaction.atomic():
+        lock_counters(StatCounter)
+
+        # Repair the flags the masked counter relies on
+        Image.objects.filter(has_mask=True, masks__isnull=True).update(has_mask=False)
+        Image.objects.filter(has_mask=False, masks__isnull=False).update(has_mask=True)
+
+        expected = compute_counters(Image, Mask)
+        current = {
+            key: (pk, value) for pk, key, value in StatCounter.objects.values_list('pk', 'key', 'value')
+        }
+
+        drift = {}
+        changed = []
+        for key in set(expected) | set(current):
+            pk, old = current.get(key, (None, 0))
+            new = expected.get(key, 0)
+            if old != new:
+                drift[key] = (old, new)
+                if pk is not None:
+                    changed.append(StatCounter(pk=pk, key=key, value=new))
+
+        StatCounter.objects.bulk_update(changed, ['value'], batch_size=500)
+        StatCounter.objects.bulk_create(
+            [StatCounter(key=key, value=value) for key, value in expected.items() if key not in current]
+        )
+    return drift
@@ -0,0 +1,179 @@
+"""
+Per-view database query budgets for the mask_generator API.
+
+Serializer fields that follow a relation can quietly turn a list endpoint
+into one query per row. Views therefore declare how many queries a request
+may make, independent of how many rows it returns:
+
+    @query_budget(3)
+    def get(self, request, format=None):
+        ...
+
+QueryBudgetMiddleware records every query of a request (record_query is
+installed on each database connection) and, once the response is ready:
+1. Compares the count with the view's declared budget
+2. Looks for N+1 patterns: one query shape (SQL with its IN lists collapsed)
+   run QUERY_REPEAT_THRESHOLD or more times
+3. Logs a warning to 'api.queries' for each problem, or raises
+   QueryBudgetExceeded when settings.QUERY_BUDGET_STRICT is on (as it is
+   under pytest and `manage.py test`, so a regression fails the test that
+   triggers it)
+
+Tests can also check a block of code directly with capture_queries() and
+QueryLog.check().
+"""
+import collections
+import contextlib
+import contextvars
+import logging
+import re
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+logger = logging.getLogger('api.queries')
+
+# Every active QueryLog, outermost first; nested captures all see a query
+_logs = contextvars.ContextVar('api_query_logs', default=())
+
+# IN (%s, %s, ...) lists vary in length with the rows involved
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+# Transaction control repeats by design (nested atomic blocks)
+_TRANSACTION_CONTROL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a request breaks its query budget."""
+
+
+def query_budget(max_queries):
+    """
+    Declare the most queries a view method may make per request.
+
+    The budget is read by QueryBudgetMiddleware; the method is not wrapped.
+    """
+    def decorator(method):
+        method.query_budget = max_queries
+        return method
+    return decorator
+
+
+def shape(sql):
+    """Return a query's shape: its SQL with IN lists collapsed."""
+    return _IN_LIST.sub('(%s...)', sql)
+
+
+class QueryLog:
+    """The SQL of the queries run while it is active."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=None):
+        """
+        Return {shape: count} for shapes run at least `threshold` times
+        (default settings.QUERY_REPEAT_THRESHOLD).
+        """
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 5)
+        counts = collections.Counter(
+            shape(sql) for sql in self.queries if not sql.lstrip().upper().startswith(_TRANSACTION_CONTROL)
+        )
+        return {sql: count for sql, count in counts.items() if count >= threshold}
+
+    def check(self, budget=None, threshold=None):
+        """
+        Return a list of problems: the budget being exceeded, then each
+        repeated query shape. An empty list means the queries are fine.
+        """
+        problems = []
+        if budget is not None and len(self) > budget:
+            problems.append(f"{len(self)} queries, budget is {budget}")
+        for sql, count in self.repeated(threshold).items():
+            problems.append(f"query repeated {count} times (possible N+1): {sql}")
+        return problems
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding queries to the active QueryLog."""
+    for log in _logs.get():
+        log.queries.append(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to new connections."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextlib.contextmanager
+def capture_queries():
+    """
+    Record the queries run inside a with-block:
+
+        with capture_queries() as log:
+            self.client.get(url)
+        self.assertEqual(log.check(budget=3), [])
+    """
+    log = QueryLog()
+    token = _logs.set(_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        _logs.reset(token)
+
+
+def view_budget(request):
+    """Return the budget declared on the view method handling a request, or None."""
+    match = getattr(request, 'resolver_match', None)
+    view_class = getattr(getattr(match, 'func', None), 'view_class', None)
+    method = getattr(view_class, request.method.lower(), None)
+    return getattr(method, 'query_budget', None)
+
+
+class QueryBudgetMiddleware:
+    """
+    Middleware enforcing declared query budgets and flagging N+1 patterns.
+
+    Supports both sync and async (ASGI) request handling; the query log
+    follows the request into sync_to_async threads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with capture_queries() as log:
+            response = self.get_response(request)
+        self.check(request, log)
+        return response
+
+    async def __acall__(self, request):
+        with capture_queries() as log:
+            response = await self.get_response(request)
+        self.check(request, log)
+        return response
+
+    def check(self, request, log):
+        problems = log.check(view_budget(request))
+        if not problems:
+            return
+        message = f"{request.method} {request.path}: " + '; '.join(problems)
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message, extra={
+            'method': request.method,
+            'path': request.path,
+            'queries': len(log),
+            'budget': view_budget(request),
+        })
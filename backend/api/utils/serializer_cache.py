@@ -0,0 +1,246 @@
+"""
+Serialized-representation cache for the mask_generator API.
+
+This module caches the output of ImageSerializer/MaskSerializer per object
+using Django's cache framework:
+1. Fragments are keyed by kind, primary key and the row's updated_at, so a
+   write retires only that row's fragment, in all workers, whether or not
+   they share the cache
+2. The model signals drop the superseded fragment on save and delete;
+   entries also expire after SERIALIZER_CACHE_TIMEOUT seconds, which bounds
+   the space held by fragments retired without a signal (bulk updates)
+3. List endpoints assemble their payload from cached fragments
+4. Hit/miss counters are kept for the stats and metrics endpoints
+
+A process-local cache (LocMemCache) stays correct, but each worker then
+fills its own copy; check_shared_cache warns about it under `check --deploy`.
+"""
+import threading
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from . import metrics
+
+
+KEY_PREFIX = 'api:serialized'
+
+
+def get_cache():
+    """Return the cache backend used for serialized fragments."""
+    return caches[getattr(settings, 'SERIALIZER_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    """Return how long fragments are kept, in seconds."""
+    return getattr(settings, 'SERIALIZER_CACHE_TIMEOUT', 300)
+
+
+def cache_key(kind, pk, updated_at):
+    """
+    Build the cache key for one serialized object.
+
+    Args:
+        kind: The object kind (e.g. 'image', 'mask')
+        pk: The object's primary key
+        updated_at: The row's updated_at
+
+    Returns:
+        The cache key string
+    """
+    return f"{KEY_PREFIX}:{kind}:{pk}:{int(updated_at.timestamp() * 1_000_000)}"
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """System check (registered for `check --deploy`) warning when fragments are cached per process."""
+    backend = settings.CACHES.get(getattr(settings, 'SERIALIZER_CACHE_ALIAS', 'default'), {}).get('BACKEND', '')
+    if backend.endswith(('LocMemCache', 'DummyCache')):
+        return [checks.Warning(
+            "The serializer cache is local to each process, so every worker caches its own fragments.",
+            hint="Set CACHE_BACKEND to 'redis' or 'memcached' for multi-worker deployments.",
+            id='api.W001',
+        )]
+    return []
+
+
+class CacheStats:
+    """
+    Thread-safe hit/miss counters, kept per object kind.
+
+    Counters are per process; each worker reports its own hit rate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, kind, hits=0, misses=0):
+        """Add hits and misses for a kind."""
+        with self._lock:
+            counts = self._counts.setdefault(kind, {'hits': 0, 'misses': 0})
+            counts['hits'] += hits
+            counts['misses'] += misses
+        if hits:
+            metrics.CACHE_REQUESTS.inc(hits, kind=kind, result='hit')
+        if misses:
+            metrics.CACHE_REQUESTS.inc(misses, kind=kind, result='miss')
+
+    def snapshot(self):
+        """Return a copy of the counters with hit rates."""
+        with self._lock:
+            result = {}
+            for kind, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                result[kind] = {
+                    'hits': counts['hits'],
+                    'misses': counts['misses'],
+                    'hit_rate': counts['hits'] / total if total else 0.0,
+                }
+            return result
+
+    def reset(self):
+        """Clear all counters."""
+        with self._lock:
+            self._counts = {}
+
+
+stats = CacheStats()
+
+
+def serialize_one(obj, serializer_class, kind):
+    """
+    Return the serialized representation of a single object, using the cache.
+
+    Args:
+        obj: The model instance (with its updated_at loaded)
+        serializer_class: The serializer to use on a cache miss
+        kind: The object kind used for the cache key
+
+    Returns:
+        A dictionary with the serialized data
+    """
+    cache = get_cache()
+    key = cache_key(kind, obj.pk, obj.updated_at)
+    data = cache.get(key)
+    if data is not None:
+        stats.record(kind, hits=1)
+        return data
+
+    stats.record(kind, misses=1)
+    data = dict(serializer_class(obj).data)
+    cache.set(key, data, get_timeout())
+    return data
+
+
+def serialize_many(queryset, serializer_class, kind):
+    """
+    Serialize a queryset, assembling the result from cached fragments.
+
+    Only primary keys and updated_at are read for the full queryset; complete
+    rows are loaded and serialized just for the objects missing from the cache.
+
+    Args:
+        queryset: The queryset to serialize
+        serializer_class: The serializer to use on cache misses
+        kind: The object kind used for cache keys
+
+    Returns:
+        A list of dictionaries in queryset order
+    """
+    cache = get_cache()
+    keys = {pk: cache_key(kind, pk, updated_at)
+            for pk, updated_at in queryset.values_list('pk', 'updated_at')}
+    cached = cache.get_many(list(keys.values()))
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    stats.record(kind, hits=len(keys) - len(missing), misses=len(missing))
+
+    if missing:
+        fresh = {}
+        for obj in queryset.filter(pk__in=missing):
+            # Cached under the updated_at just read, in case the row changed in between
+            fresh[cache_key(kind, obj.pk, obj.updated_at)] = cached[keys[obj.pk]] = dict(
+                serializer_class(obj).data
+            )
+        cache.set_many(fresh, get_timeout())
+
+    # Rows deleted between the two queries simply drop out of the result
+    return [cached[key] for key in keys.values() if key in cached]
+
+
+async def aserialize_many(queryset, serializer_class, kind):
+    """
+    Async version of serialize_many, using the async ORM and cache APIs.
+
+    Serializing a cache miss must not touch the database (e.g. through a
+    related field); the serializers cached here only read local columns.
+    """
+    cache = get_cache()
+    keys = {pk: cache_key(kind, pk, updated_at)
+            async for pk, updated_at in queryset.values_list('pk', 'updated_at')}
+    cached = await cache.aget_many(list(keys.values()))
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    stats.record(kind, hits=len(keys) - len(missing), misses=len(missing))
+
+    if missing:
+        fresh = {}
+        async for obj in queryset.filter(pk__in=missing):
+            fresh[cache_key(kind, obj.pk, obj.updated_at)] = cached[keys[obj.pk]] = dict(
+                serializer_class(obj).data
+            )
+        await cache.aset_many(fresh, get_timeout())
+
+    return [cached[key] for key in keys.values() if key in cached]
+
+
+def serialize_bulk(queryset, pks, serializer_class, kind):
+    """
+    Serialize the objects with the given primary keys, using the cache.
+
+    One query reads the keys' updated_at and cached fragments are fetched
+    with one get_many; the remaining objects are loaded with a single
+    in_bulk query and serialized in one pass.
+
+    Args:
+        queryset: The base queryset to look the objects up in
+        pks: The primary keys to look up
+        serializer_class: The serializer to use on cache misses
+        kind: The object kind used for cache keys
+
+    Returns:
+        A dictionary mapping each found primary key to its serialized data
+    """
+    cache = get_cache()
+    keys = {pk: cache_key(kind, pk, updated_at)
+            for pk, updated_at in queryset.filter(pk__in=pks).values_list('pk', 'updated_at')}
+    cached = cache.get_many(list(keys.values()))
+
+    result = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in keys if pk not in result]
+    stats.record(kind, hits=len(result), misses=len(missing))
+
+    if missing:
+        objects = list(queryset.in_bulk(missing).values())
+        serialized = serializer_class(objects, many=True).data
+        fresh = {}
+        for obj, data in zip(objects, serialized):
+            result[obj.pk] = fresh[cache_key(kind, obj.pk, obj.updated_at)] = dict(data)
+        cache.set_many(fresh, get_timeout())
+
+    return result
+
+
+def invalidate(kind, pk, updated_at):
+    """
+    Drop the cached fragment for one version of an object.
+
+    Called from the model signals with the updated_at a row had before it
+    was saved or deleted, so superseded fragments don't wait out their
+    timeout. Readers never need it: a changed row has a new key anyway.
+
+    Args:
+        kind: The object kind
+        pk: The object's primary key
+        updated_at: The updated_at the fragment was cached under
+    """
+    get_cache().delete(cache_key(kind, pk, updated_at))
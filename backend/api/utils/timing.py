@@ -0,0 +1,130 @@
+"""
+Per-request phase timing for the mask_generator API.
+
+Views wrap the expensive steps of a request in named phases:
+
+    with timing.phase('decode'):
+        ...
+
+When settings.SERVER_TIMING is on, ServerTimingMiddleware starts a timer for
+each request and, once the response is ready:
+1. Adds a Server-Timing header (shown in the browser's network panel), e.g.
+   `Server-Timing: parse;dur=1.4, decode;dur=48.2, db;dur=3.1, total;dur=55.0`
+2. Logs one line per instrumented request to the 'api.timing' logger, with
+   the phases also attached as structured `extra` fields
+
+Phases nest; each reports its own time excluding nested phases, so e.g. the
+storage write inside a model save isn't counted again under 'db'. When
+timing is off, phase() returns a shared no-op context manager.
+"""
+import contextlib
+import contextvars
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+logger = logging.getLogger('api.timing')
+
+_timer = contextvars.ContextVar('api_phase_timer', default=None)
+_noop = contextlib.nullcontext()
+
+
+class PhaseTimer:
+    """Accumulates the self time of named phases for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Each frame is [name, start, time spent in nested phases]
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def header(self, total):
+        """Format the phases and the total as a Server-Timing header value."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ', '.join(entries)
+
+
+def phase(name):
+    """Time a block as the named phase of the current request (a no-op when timing is off)."""
+    timer = _timer.get()
+    if timer is None:
+        return _noop
+    return timer.phase(name)
+
+
+def is_enabled():
+    """Whether requests are timed (settings.SERVER_TIMING)."""
+    return getattr(settings, 'SERVER_TIMING', False)
+
+
+class ServerTimingMiddleware:
+    """
+    Middleware adding Server-Timing headers and timing log lines.
+
+    Supports both sync and async (ASGI) request handling.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+        timer = PhaseTimer()
+        token = _timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _timer.reset(token)
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        if not is_enabled():
+            return await self.get_response(request)
+        timer = PhaseTimer()
+        token = _timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timer.reset(token)
+        return self.finish(request, response, timer)
+
+    def finish(self, request, response, timer):
+        total = time.perf_counter() - timer.started
+        response['Server-Timing'] = timer.header(total)
+        if timer.phases:
+            phases_ms = {name: round(seconds * 1000, 1) for name, seconds in timer.phases.items()}
+            logger.info(
+                "%s %s %s total=%.1fms %s", request.method, request.path, response.status_code,
+                total * 1000, ' '.join(f"{name}={ms}ms" for name, ms in phases_ms.items()),
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'total_ms': round(total * 1000, 1),
+                    'phases_ms': phases_ms,
+                },
+            )
+        return response
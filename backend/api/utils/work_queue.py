@@ -0,0 +1,194 @@
+"""
+Annotation work queue for the mask_generator API.
+
+This module hands out unmasked images to annotators one at a time:
+1. Claiming atomically leases the next unmasked, unleased image
+2. Leases are time-bounded and can be renewed while the annotator works
+3. Leases are released explicitly or when a mask is saved for the image
+
+On databases with SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL) concurrent
+claimers skip each other's rows. Elsewhere (SQLite) a compare-and-set on the
+lease row gives the same guarantee: exactly one claimer wins each image.
+"""
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError
+from django.utils import timezone
+
+
+# How many candidate images a claim tries before giving up under contention
+MAX_CLAIM_ATTEMPTS = 10
+
+# Upper bound on next-image hints returned with a claim
+MAX_PREFETCH_HINTS = 50
+
+
+def lease_duration():
+    """Return the configured lease length as a timedelta."""
+    return timedelta(seconds=getattr(settings, 'WORK_QUEUE_LEASE_SECONDS', 300))
+
+
+def available_images(now=None):
+    """
+    Return a queryset of images that have no mask and no active lease.
+
+    Args:
+        now: The reference time for lease expiry (defaults to the current time)
+
+    Returns:
+        A queryset ordered by upload order (oldest first)
+    """
+    from ..models import Image
+
+    now = now or timezone.now()
+    return (
+        Image.objects.filter(has_mask=False)
+        .exclude(lease__expires_at__gt=now)
+        .order_by('id')
+    )
+
+
+def _take_lease(image_id, holder, now):
+    """
+    Try to lease one image with a compare-and-set.
+
+    An expired lease row is only overwritten if it is still expired when the
+    UPDATE runs; a missing row is created under the unique image constraint.
+
+    Returns:
+        The ImageLease on success, or None if another claimer won the image
+    """
+    from ..models import ImageLease
+
+    expires_at = now + lease_duration()
+    token = uuid.uuid4()
+    taken = ImageLease.objects.filter(image_id=image_id, expires_at__lte=now).update(
+        holder=holder, token=token, leased_at=now, expires_at=expires_at
+    )
+    if taken:
+        return ImageLease.objects.get(token=token)
+
+    try:
+        with transaction.atomic():
+            return ImageLease.objects.create(
+                image_id=image_id, holder=holder, token=token,
+                leased_at=now, expires_at=expires_at
+            )
+    except IntegrityError:
+        # Someone else holds an active lease on this image
+        return None
+
+
+def claim_next_image(holder=''):
+    """
+    Atomically lease the next unmasked image.
+
+    Args:
+        holder: Identifier of the annotator claiming the image
+
+    Returns:
+        The new ImageLease, or None if no image is available
+    """
+    now = timezone.now()
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            image_id = (
+                available_images(now)
+                .select_for_update(skip_locked=True, of=('self',))
+                .values_list('id', flat=True)
+                .first()
+            )
+            if image_id is None:
+                return None
+            return _take_lease(image_id, holder, now)
+
+    # Without row locks, race on the lease row itself and move on when we lose
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        image_id = available_images(now).values_list('id', flat=True).first()
+        if image_id is None:
+            return None
+        lease = _take_lease(image_id, holder, now)
+        if lease is not None:
+            return lease
+    return None
+
+
+def renew_lease(token):
+    """
+    Extend an active lease.
+
+    Args:
+        token: The lease token returned when the image was claimed
+
+    Returns:
+        The renewed ImageLease, or None if the lease no longer exists or expired
+    """
+    from ..models import ImageLease
+
+    now = timezone.now()
+    renewed = ImageLease.objects.filter(token=token, expires_at__gt=now).update(
+        expires_at=now + lease_duration()
+    )
+    if not renewed:
+        return None
+    return ImageLease.objects.select_related('image').get(token=token)
+
+
+def release_lease(token):
+    """
+    Release a lease so its image returns to the queue.
+
+    Args:
+        token: The lease token returned when the image was claimed
+
+    Returns:
+        True if a lease was released, False otherwise
+    """
+    from ..models import ImageLease
+
+    deleted, _ = ImageLease.objects.filter(token=token).delete()
+    return bool(deleted)
+
+
+def release_image(image_id):
+    """
+    Release any lease on an image, e.g. once a mask has been saved for it.
+
+    Args:
+        image_id: The primary key of the image
+    """
+    from ..models import ImageLease
+
+    ImageLease.objects.filter(image_id=image_id).delete()
+
+
+async def arelease_image(image_id):
+    """Async version of release_image."""
+    from ..models import ImageLease
+
+    await ImageLease.objects.filter(image_id=image_id).adelete()
+
+
+def prefetch_hints(after_id, count):
+    """
+    Return the images a client is likely to be handed next.
+
+    These are hints only; the images are not leased.
+
+    Args:
+        after_id: Only consider images after this primary key
+        count: Maximum number of hints (capped at MAX_PREFETCH_HINTS)
+
+    Returns:
+        A list of {'id', 'image_url'} dictionaries
+    """
+    if count <= 0:
+        return []
+    count = min(count, MAX_PREFETCH_HINTS)
+    images = available_images().filter(id__gt=after_id).only('id', 'file')[:count]
+    return [
+        {'id': image.id, 'image_url': image.file.url if image.file else None}
+        for image in images
+    ]
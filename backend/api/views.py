@@ -3,15 +3,129 @@ Views for the mask_generator API.
 
 These views handle the HTTP requests for our API endpoints.
 """
+import logging
+import time
+from datetime import datetime
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Image, Mask
-from .serializers import ImageSerializer, MaskSerializer
+from .models import Image, Mask, ImageLease
+from .serializers import ImageSerializer, MaskSerializer, ImageLeaseSerializer
+from .renderers import FastJSONRenderer
 from .utils.image_processing import process_uploaded_image
+from .utils.conditional import conditional_on
+from .utils.idempotency import idempotent, unhandled
+from .utils.query_budget import query_budget
+from .utils import serializer_cache
+from .utils import work_queue
+from .utils import progress_stats
+from .utils import admission
+from .utils import metrics
+from .utils import timing
+from .utils.media_serving import serve_media
 import os
 
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_timestamp(value):
+    """
+    Parse an ISO date or datetime query parameter into an aware datetime.
+    
+    Returns:
+        The datetime, or None if the value can't be parsed
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is None:
+                return None
+            parsed = datetime.combine(parsed_date, datetime.min.time())
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_default_timezone())
+    return parsed
+
+
+def filter_images(queryset, params):
+    """
+    Apply EXIF metadata filters from query parameters to an Image queryset.
+    
+    Args:
+        queryset: The Image queryset to narrow
+        params: The request's query parameters
+        
+    Returns:
+        A tuple of (filtered queryset, errors dictionary)
+    """
+    errors = {}
+    
+    for field in ('camera_make', 'camera_model'):
+        if field in params:
+            queryset = queryset.filter(**{field: params[field]})
+    
+    if 'orientation' in params:
+        try:
+            queryset = queryset.filter(orientation=int(params['orientation']))
+        except ValueError:
+            errors['orientation'] = ["Must be an integer"]
+    
+    for param, lookup in (('taken_after', 'taken_at__gte'), ('taken_before', 'taken_at__lt')):
+        if param in params:
+            timestamp = _parse_timestamp(params[param])
+            if timestamp is None:
+                errors[param] = ["Must be an ISO 8601 date or datetime"]
+            else:
+                queryset = queryset.filter(**{lookup: timestamp})
+    
+    return queryset, errors
+
+
+def _split_list(value):
+    """Split a comma-separated query parameter into names (None if absent)."""
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def get_sparse_options(request, serializer_class):
+    """
+    Read the ?fields= and ?expand= query parameters for a serializer.
+    
+    Args:
+        request: The incoming request (DRF or plain Django)
+        serializer_class: A serializer using DynamicFieldsMixin
+        
+    Returns:
+        A tuple of (fields or None, expand list, errors dictionary)
+    """
+    fields = _split_list(request.GET.get('fields'))
+    expand = _split_list(request.GET.get('expand')) or []
+    return fields, expand, serializer_class.validate_options(fields, expand)
+
+
+def expanded_tables(relation_tables):
+    """
+    Build an extra_tables callable for conditional_on from ?expand=.
+    
+    Args:
+        relation_tables: Mapping of expandable relation name to table name
+    """
+    def tables_for(request):
+        expand = _split_list(request.GET.get('expand')) or []
+        return [relation_tables[name] for name in expand if name in relation_tables]
+    return tables_for
+
+
 class ImageUploadView(APIView):
     """
     View for handling image uploads.
@@ -20,10 +134,18 @@ class ImageUploadView(APIView):
     saves them to the media directory, and returns the image data.
     
     Allowed file types: JPEG, MPO (will be converted to JPEG)
+    
+    Decoding is admitted against the upload pixel budget; when it is
+    saturated the request fails fast with 503 and a Retry-After header.
+    Retries sent with the same Idempotency-Key header get the first response.
     """
+    @query_budget(14)
+    @idempotent('image-upload')
     def post(self, request, format=None):
-        # Check if a file was uploaded
-        if 'file' not in request.FILES:
+        # Check if a file was uploaded (reading request.FILES parses the multipart body)
+        with timing.phase('parse'):
+            has_file = 'file' in request.FILES
+        if not has_file:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
             
         uploaded_file = request.FILES['file']
@@ -36,34 +158,46 @@ class ImageUploadView(APIView):
         
         try:
             # Process the uploaded file - convert MPO to JPEG if needed and extract metadata
-            processed_file, metadata = process_uploaded_image(uploaded_file)
+            pixels = admission.estimate_pixels(uploaded_file)
+            metrics.UPLOAD_BYTES.observe(uploaded_file.size)
+            metrics.UPLOAD_PIXELS.observe(pixels)
+            with admission.get_budget().admit(pixels):
+                started = time.perf_counter()
+                processed_file, metadata = process_uploaded_image(uploaded_file)
+                decode_seconds = time.perf_counter() - started
             
             # Check if the file was originally MPO
             is_mpo = uploaded_file.name.lower().endswith('.mpo') or (
                 'format' in metadata and metadata['format'] == 'MPO'
             )
+            metrics.DECODE_SECONDS.observe(decode_seconds, format='mpo' if is_mpo else 'jpeg')
             
             # Create the image object with the processed file and extracted metadata
-            image = Image.objects.create(
-                file=processed_file,
-                original_filename=uploaded_file.name,
-                width=metadata['width'],
-                height=metadata['height'],
-                is_mpo=is_mpo,
-            )
-            
-            # Store the metadata
-            image.set_metadata(metadata)
-            image.save()
+            # in one INSERT (the file write inside is timed as the 'storage' phase)
+            with timing.phase('db'):
+                image = Image(
+                    file=processed_file,
+                    original_filename=uploaded_file.name,
+                    width=metadata['width'],
+                    height=metadata['height'],
+                    is_mpo=is_mpo,
+                )
+                image.set_metadata(metadata)
+                image.save()
             
             # Use serializer just for the response
-            serializer = ImageSerializer(image)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            with timing.phase('serialize'):
+                data = ImageSerializer(image).data
+            return Response(data, status=status.HTTP_201_CREATED)
             
+        except admission.Saturated as e:
+            metrics.ADMISSION_REJECTED.inc()
+            return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': str(e.retry_after)})
         except Exception as e:
             # Handle any errors during processing or saving
-            print(f"Error processing/saving image: {str(e)}")
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            logger.warning("Error processing/saving image %s: %s", uploaded_file.name, e)
+            return unhandled(Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST))
 
 
 class ImageListView(APIView):
@@ -72,16 +206,142 @@ class ImageListView(APIView):
     
     This endpoint returns a list of all images stored in the system,
     including their URLs, dimensions, and other metadata.
+    Responses carry ETag/Last-Modified so unchanged polls get a 304, and
+    the payload is assembled from cached per-image fragments.
+    
+    Optional query parameters filter on the indexed EXIF columns:
+        camera_make, camera_model: Exact match on EXIF Make / Model
+        orientation: EXIF Orientation (1-8)
+        taken_after, taken_before: ISO date or datetime bounds on DateTimeOriginal
+    
+    Optional query parameters shape the output:
+        fields: Comma-separated fields to return (only those columns are read)
+        expand: 'masks' to embed each image's masks (prefetched in one query)
     """
+    @query_budget(3)
+    @conditional_on('image', extra_tables=expanded_tables({'masks': 'mask'}))
     def get(self, request, format=None):
-        # Get all images
-        images = Image.objects.all()
+        # Get all images, narrowed by any metadata filters
+        images, errors = filter_images(Image.objects.all(), request.query_params)
+        fields, expand, option_errors = get_sparse_options(request, ImageSerializer)
+        errors.update(option_errors)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Serialize the images
-        serializer = ImageSerializer(images, many=True)
+        # The queries run lazily, so their time is part of the 'serialize' phase
+        with timing.phase('serialize'):
+            if fields is None and not expand:
+                # Serialize the images, reusing cached fragments where possible
+                data = serializer_cache.serialize_many(images, ImageSerializer, 'image')
+            else:
+                # Custom shapes aren't cached; read only what the shape needs
+                images = ImageSerializer.optimize_queryset(images, fields, expand)
+                data = ImageSerializer(images, many=True, fields=fields, expand=expand).data
         
         # Return the serialized data
-        return Response(serializer.data)
+        return Response(data)
+
+
+class ImageBulkView(APIView):
+    """
+    View for looking up many images at once.
+    
+    This endpoint resolves a batch of image IDs with a constant number of
+    queries and one serialization pass, returning the images in request order
+    together with the IDs that don't exist.
+    
+    GET takes ?ids=1,2,3 and POST takes {"ids": [1, 2, 3]}; both accept the
+    same fields/expand parameters as ImageListView (as query parameters).
+    At most BULK_LOOKUP_MAX_IDS ids may be requested at once.
+    """
+    @query_budget(3)
+    @conditional_on('image', extra_tables=expanded_tables({'masks': 'mask'}))
+    def get(self, request, format=None):
+        return self.lookup(request, _split_list(request.query_params.get('ids')))
+    
+    def post(self, request, format=None):
+        ids = request.data.get('ids')
+        if isinstance(ids, str):
+            ids = _split_list(ids)
+        return self.lookup(request, ids)
+    
+    def lookup(self, request, raw_ids):
+        errors = {}
+        ids = []
+        max_ids = getattr(settings, 'BULK_LOOKUP_MAX_IDS', 5000)
+        
+        if not raw_ids or not isinstance(raw_ids, list):
+            errors['ids'] = ["A non-empty list of image IDs is required"]
+        elif len(raw_ids) > max_ids:
+            errors['ids'] = [f"At most {max_ids} IDs may be requested at once"]
+        else:
+            try:
+                # Deduplicate while preserving request order
+                ids = list(dict.fromkeys(int(pk) for pk in raw_ids))
+            except (TypeError, ValueError):
+                errors['ids'] = ["IDs must be integers"]
+        
+        fields, expand, option_errors = get_sparse_options(request, ImageSerializer)
+        errors.update(option_errors)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        if fields is None and not expand:
+            found = serializer_cache.serialize_bulk(Image.objects.all(), ids, ImageSerializer, 'image')
+        else:
+            images = ImageSerializer.optimize_queryset(Image.objects.all(), fields, expand).in_bulk(ids)
+            serialized = ImageSerializer(list(images.values()), many=True,
+                                         fields=fields, expand=expand).data
+            found = dict(zip(images.keys(), serialized))
+        
+        return Response({
+            'results': [found[pk] for pk in ids if pk in found],
+            'missing': [pk for pk in ids if pk not in found],
+        })
+
+
+class ImageExportView(APIView):
+    """
+    View for streaming the whole image catalog as JSON Lines.
+    
+    Each line is one serialized image. Rows are read from the database in
+    chunks and written to the client as they are produced, so server memory
+    stays flat regardless of catalog size.
+    
+    Optional query parameters:
+        masks: When truthy (1/true/yes), embed each image's masks
+        Any of the ImageListView metadata filters
+    """
+    def get(self, request, format=None):
+        images, errors = filter_images(Image.objects.order_by('id'), request.query_params)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        include_masks = request.query_params.get('masks', '').lower() in ('1', 'true', 'yes')
+        if include_masks:
+            images = images.prefetch_related('masks')
+        
+        response = StreamingHttpResponse(
+            self.stream_lines(images, include_masks),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = 'attachment; filename="images.jsonl"'
+        return response
+    
+    @staticmethod
+    def stream_lines(images, include_masks):
+        """
+        Yield one encoded JSON line per image.
+        
+        With prefetch_related, each chunk's masks are fetched in one query.
+        """
+        renderer = FastJSONRenderer()
+        chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 500)
+        for image in images.iterator(chunk_size=chunk_size):
+            data = ImageSerializer(image).data
+            if include_masks:
+                data['masks'] = MaskSerializer(image.masks.all(), many=True).data
+            yield renderer.render(data) + b'\n'
 
 
 class MaskSaveView(APIView):
@@ -90,13 +350,17 @@ class MaskSaveView(APIView):
     
     This endpoint accepts mask files, associates them with existing images,
     and handles any necessary resizing metadata.
+    Retries sent with the same Idempotency-Key header get the first response.
     """
+    @query_budget(32)  # Includes the pack index write with MASK_PACK_STORE
+    @idempotent('mask-save')
     def post(self, request, format=None):
         # Validate required fields are present
         errors = {}
         
-        if 'file' not in request.FILES:
-            errors['file'] = ["No mask file provided"]
+        with timing.phase('parse'):
+            if 'file' not in request.FILES:
+                errors['file'] = ["No mask file provided"]
         
         if 'image' not in request.data:
             errors['image'] = ["Image ID is required"]
@@ -107,17 +371,25 @@ class MaskSaveView(APIView):
         # Validate image ID exists
         try:
             image_id = request.data.get('image')
-            image = Image.objects.get(pk=image_id)
+            with timing.phase('db'):
+                image = Image.objects.get(pk=image_id)
         except Image.DoesNotExist:
             return Response({'image': ["Image with this ID does not exist"]},
                           status=status.HTTP_400_BAD_REQUEST)
         
+        # Credit the mask to the named annotator, or to whoever leased the image
+        annotator = request.data.get('annotator')
+        if not annotator:
+            with timing.phase('db'):
+                annotator = ImageLease.objects.filter(image=image).values_list('holder', flat=True).first() or ''
+        
         # Create mask data object
         mask_data = {
             'file': request.FILES['file'],
             'image': image.id,
             'original_width': request.data.get('original_width', image.width),
-            'original_height': request.data.get('original_height', image.height)
+            'original_height': request.data.get('original_height', image.height),
+            'annotator': annotator,
         }
         
         # In a real implementation, we would handle mask resizing here if needed
@@ -125,25 +397,28 @@ class MaskSaveView(APIView):
         
         # Save the mask
         try:
-            # Get the original file name from the image
-            print(f"Creating mask for image: {image.original_filename}")
-            
-            # Create the mask object directly
-            mask = Mask.objects.create(
-                file=mask_data['file'],
-                image=image,
-                original_width=mask_data['original_width'],
-                original_height=mask_data['original_height']
-            )
-            
-            print(f"Created mask with filename: {mask.file.name}")
+            # Create the mask object directly (Mask.save names the file after the
+            # image; the file write inside is timed as the 'storage' phase)
+            with timing.phase('db'):
+                mask = Mask.objects.create(
+                    file=mask_data['file'],
+                    image=image,
+                    original_width=mask_data['original_width'],
+                    original_height=mask_data['original_height'],
+                    annotator=mask_data['annotator']
+                )
+                
+                # The image is no longer waiting in the work queue
+                work_queue.release_image(image.id)
+            metrics.MASK_BYTES.observe(mask_data['file'].size)
             
             # Return serialized data
-            serializer = MaskSerializer(mask)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            with timing.phase('serialize'):
+                data = MaskSerializer(mask).data
+            return Response(data, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return unhandled(Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST))
 
 
 class MaskListView(APIView):
@@ -152,16 +427,35 @@ class MaskListView(APIView):
     
     This endpoint returns a list of all masks stored in the system,
     including their URLs, associated images, and dimensions.
+    Responses carry ETag/Last-Modified so unchanged polls get a 304, and
+    the payload is assembled from cached per-mask fragments.
+    
+    Optional query parameters shape the output:
+        fields: Comma-separated fields to return (only those columns are read)
+        expand: 'image' to embed each mask's image (joined in the same query)
     """
+    @query_budget(3)
+    @conditional_on('mask', extra_tables=expanded_tables({'image': 'image'}))
     def get(self, request, format=None):
+        fields, expand, errors = get_sparse_options(request, MaskSerializer)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
         # Get all masks
         masks = Mask.objects.all()
         
-        # Serialize the masks
-        serializer = MaskSerializer(masks, many=True)
+        # The queries run lazily, so their time is part of the 'serialize' phase
+        with timing.phase('serialize'):
+            if fields is None and not expand:
+                # Serialize the masks, reusing cached fragments where possible
+                data = serializer_cache.serialize_many(masks, MaskSerializer, 'mask')
+            else:
+                # Custom shapes aren't cached; read only what the shape needs
+                masks = MaskSerializer.optimize_queryset(masks, fields, expand)
+                data = MaskSerializer(masks, many=True, fields=fields, expand=expand).data
         
         # Return the serialized data
-        return Response(serializer.data)
+        return Response(data)
 
 
 class MaskCheckView(APIView):
@@ -171,6 +465,7 @@ class MaskCheckView(APIView):
     This endpoint checks if a mask exists for a given image filename.
     It's used by the frontend to filter images that already have masks.
     """
+    @query_budget(1)
     def get(self, request, filename, format=None):
         # Strip any path and get just the filename without extension
         base_filename = os.path.splitext(os.path.basename(filename))[0]
@@ -190,17 +485,31 @@ class ImageDetailView(APIView):
     
     This endpoint returns detailed information about a specific image,
     including its file URL, dimensions, and other metadata.
+    Responses carry ETag/Last-Modified so unchanged polls get a 304.
+    Accepts the same fields/expand parameters as ImageListView.
     """
+    @query_budget(3)
+    @conditional_on('image', extra_tables=expanded_tables({'masks': 'mask'}))
     def get(self, request, pk, format=None):
+        fields, expand, errors = get_sparse_options(request, ImageSerializer)
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
-            # Attempt to retrieve the image by ID
-            image = Image.objects.get(pk=pk)
-            
-            # Serialize the image data
-            serializer = ImageSerializer(image)
+            if fields is None and not expand:
+                # Attempt to retrieve the image by ID
+                image = Image.objects.get(pk=pk)
+                
+                # Serialize the image data, reusing the cached fragment if present
+                data = serializer_cache.serialize_one(image, ImageSerializer, 'image')
+            else:
+                image = ImageSerializer.optimize_queryset(
+                    Image.objects.filter(pk=pk), fields, expand
+                ).get()
+                data = ImageSerializer(image, fields=fields, expand=expand).data
             
             # Return serialized data
-            return Response(serializer.data)
+            return Response(data)
             
         except Image.DoesNotExist:
             # Return 404 if image with given ID doesn't exist
@@ -208,3 +517,118 @@ class ImageDetailView(APIView):
                 {"error": f"Image with ID {pk} not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+
+class ProgressStatsView(APIView):
+    """
+    View for the annotation progress dashboard.
+    
+    This endpoint returns image totals (masked/unmasked) and mask counts per
+    day and per annotator. The numbers come from counters maintained by model
+    signals, so reads cost one query regardless of catalog size.
+    """
+    @query_budget(2)
+    @conditional_on('image', 'mask')
+    def get(self, request, format=None):
+        return Response(progress_stats.read_stats())
+
+
+class CacheStatsView(APIView):
+    """
+    View for reporting serialized-representation cache statistics.
+    
+    This endpoint returns per-kind hit/miss counters and hit rates
+    for the current worker process.
+    """
+    def get(self, request, format=None):
+        return Response(serializer_cache.stats.snapshot())
+
+
+class AdmissionStatsView(APIView):
+    """
+    View for reporting upload admission control.
+    
+    This endpoint returns the pixels in flight, queue depth and
+    admitted/rejected counters of the current worker process.
+    """
+    def get(self, request, format=None):
+        return Response(admission.get_budget().snapshot())
+
+
+class MetricsView(View):
+    """
+    View for Prometheus scraping.
+    
+    This endpoint returns request latency, upload, decode, mask, query count,
+    cache and queue metrics in the Prometheus text format, merged across
+    worker processes when METRICS_DIR is set.
+    """
+    http_method_names = ['get', 'head', 'options']
+    
+    def get(self, request):
+        return HttpResponse(metrics.generate_latest(), content_type=metrics.CONTENT_TYPE)
+
+
+class QueueClaimView(APIView):
+    """
+    View for claiming the next image from the annotation work queue.
+    
+    This endpoint atomically leases the next unmasked image to the caller,
+    so concurrent annotators are never handed the same image. Optionally
+    returns hints for the images likely to be handed out next.
+    
+    Request data:
+        annotator: Optional identifier of the annotator
+        prefetch: Optional number of next-image hints to return
+    """
+    def post(self, request, format=None):
+        try:
+            prefetch = int(request.data.get('prefetch', 0))
+        except (TypeError, ValueError):
+            return Response({'prefetch': ["Must be an integer"]},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        lease = work_queue.claim_next_image(holder=request.data.get('annotator', ''))
+        if lease is None:
+            # Nothing left to annotate (or everything is leased)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        
+        data = ImageLeaseSerializer(lease).data
+        data['prefetch'] = work_queue.prefetch_hints(lease.image_id, prefetch)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class QueueLeaseView(APIView):
+    """
+    View for renewing or releasing a work queue lease.
+    
+    POST renews the lease (annotator activity), DELETE releases it
+    so the image goes back to the queue.
+    """
+    def post(self, request, token, format=None):
+        lease = work_queue.renew_lease(token)
+        if lease is None:
+            return Response({'error': "Lease not found or expired"},
+                          status=status.HTTP_404_NOT_FOUND)
+        return Response(ImageLeaseSerializer(lease).data)
+    
+    def delete(self, request, token, format=None):
+        if not work_queue.release_lease(token):
+            return Response({'error': "Lease not found"},
+                          status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MediaView(View):
+    """
+    View for serving stored images and masks.
+    
+    Files are confined to the image and mask storages and handed to the web
+    server via X-Accel-Redirect/X-Sendfile when MEDIA_SERVE_MODE enables it;
+    otherwise they are streamed with a sendfile-capable FileResponse. Byte
+    ranges and conditional requests are supported.
+    """
+    http_method_names = ['get', 'head', 'options']
+    
+    def get(self, request, path):
+        return serve_media(request, path)
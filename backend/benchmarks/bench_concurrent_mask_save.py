@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Benchmark concurrent mask saves against the configured database.
+
+Runs MaskSaveView from several threads at once (each with its own database
+connection, as under a threaded server) against a throwaway file-backed
+database, and reports throughput, latency percentiles and how many saves
+failed with "database is locked".
+
+Usage (from the backend directory):
+    python benchmarks/bench_concurrent_mask_save.py --threads 8 --saves 50
+    python benchmarks/bench_concurrent_mask_save.py --threads 8 --no-tuning
+    DATABASE_PROFILE=postgres python benchmarks/bench_concurrent_mask_save.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mask_generator.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import OperationalError, connection  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from api.models import Image, Mask  # noqa: E402
+from api.views import MaskSaveView  # noqa: E402
+
+
+def percentile(values, fraction):
+    """Return the value at `fraction` of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def disable_tuning():
+    """Fall back to SQLite's defaults: no PRAGMAs, deferred transactions."""
+    settings.SQLITE_PRAGMAS = {}
+    options = connection.settings_dict['OPTIONS']
+    options.pop('transaction_mode', None)
+    options.pop('timeout', None)
+
+
+def save_masks(images, results, barrier):
+    """Save one mask per image through MaskSaveView, recording (seconds, outcome)."""
+    view = MaskSaveView.as_view()
+    factory = APIRequestFactory()
+    barrier.wait()
+    try:
+        for image in images:
+            request = factory.post('/api/masks/save/', {
+                'file': SimpleUploadedFile('mask.png', b'\x89PNG mask' * 64, content_type='image/png'),
+                'image': image.pk,
+            }, format='multipart')
+            start = time.perf_counter()
+            try:
+                response = view(request)
+                outcome = 'ok' if response.status_code == 201 else f"http {response.status_code}"
+            except OperationalError as e:
+                outcome = 'locked' if 'locked' in str(e) else 'error'
+            results.append((time.perf_counter() - start, outcome))
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent writers')
+    parser.add_argument('--saves', type=int, default=50, help='Masks saved per thread')
+    parser.add_argument('--no-tuning', action='store_true',
+                        help='Disable the SQLite PRAGMAs and IMMEDIATE transactions for comparison')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.TemporaryDirectory()
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(temp_dir.name, 'bench.sqlite3')
+        if args.no_tuning:
+            disable_tuning()
+    connection.creation.create_test_db(verbosity=0)
+
+    patchers = [
+        patch.object(model._meta.get_field('file').storage, 'location', os.path.join(temp_dir.name, name))
+        for model, name in ((Image, 'images'), (Mask, 'masks'))
+    ]
+    for patcher in patchers:
+        patcher.start()
+
+    try:
+        images = [
+            Image.objects.create(
+                file=SimpleUploadedFile(f'bench_{index}.jpg', b'jpeg', content_type='image/jpeg'),
+                original_filename=f'bench_{index}.jpg', width=64, height=48,
+            )
+            for index in range(args.threads * args.saves)
+        ]
+        connection.close()
+
+        results = []
+        barrier = threading.Barrier(args.threads)
+        threads = [
+            threading.Thread(target=save_masks, args=(images[index::args.threads], results, barrier))
+            for index in range(args.threads)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        for patcher in patchers:
+            patcher.stop()
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+        temp_dir.cleanup()
+
+    latencies = [seconds for seconds, _ in results]
+    outcomes = [outcome for _, outcome in results]
+    saved = outcomes.count('ok')
+    tuning = 'off' if args.no_tuning else 'on'
+    print(f"Database: {connection.vendor} (tuning {tuning}), {args.threads} threads x {args.saves} saves")
+    print(f"Saved:            {saved}/{len(results)} in {elapsed:.2f}s ({saved / elapsed:.1f} saves/s)")
+    print(f"Latency p50/p95:  {percentile(latencies, 0.5) * 1000:.1f} / "
+          f"{percentile(latencies, 0.95) * 1000:.1f} ms")
+    print(f"Database locked:  {outcomes.count('locked')}")
+    failures = len(results) - saved - outcomes.count('locked')
+    if failures:
+        print(f"Other failures:   {failures}")
+    return 0 if saved == len(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark JSON rendering of ImageListView payloads.
+
+Compares DRF's JSONRenderer with api.renderers.FastJSONRenderer on a
+synthetic image list that looks like the real one (serialized through
+ImageSerializer, with EXIF metadata), and checks both produce identical bytes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_renderers.py --images 5000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mask_generator.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from api.models import Image  # noqa: E402
+from api.renderers import FastJSONRenderer, orjson  # noqa: E402
+from api.serializers import ImageSerializer  # noqa: E402
+
+
+def build_payload(count):
+    """
+    Build a serialized image list without touching the database.
+
+    Args:
+        count: Number of images in the list
+
+    Returns:
+        The serializer data, as ImageListView would return it
+    """
+    now = timezone.now()
+    images = []
+    for index in range(count):
+        image = Image(
+            id=index + 1,
+            file=f'image_{index:07d}.jpg',
+            original_filename=f'IMG_{index:07d}.MPO',
+            width=4032,
+            height=3024,
+            is_mpo=index % 3 == 0,
+            uploaded_at=now - timedelta(seconds=index),
+        )
+        image.set_metadata({
+            'width': 4032,
+            'height': 3024,
+            'format': 'JPEG',
+            'exif': {
+                'Make': 'FUJIFILM',
+                'Model': 'FinePix REAL 3D W3',
+                'DateTimeOriginal': '2025:03:19 10:00:00',
+                'Orientation': 1,
+                'ExposureTime': '1/250',
+                'FNumber': '3.7',
+                'ISOSpeedRatings': 100,
+                'MakerNote': 'x' * 256,
+                37500 + index % 5: 'unknown tag',
+            },
+        })
+        images.append(image)
+    return ImageSerializer(images, many=True).data
+
+
+def measure(renderer, data, repeat):
+    """
+    Render `data` `repeat` times and return (best seconds, output bytes).
+    """
+    best = None
+    output = b''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = renderer.render(data, 'application/json', {})
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=5000, help='Images in the payload')
+    parser.add_argument('--repeat', type=int, default=5, help='Renders per renderer (best is kept)')
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed; FastJSONRenderer falls back to JSONRenderer.")
+
+    data = build_payload(args.images)
+    baseline_time, baseline_bytes = measure(JSONRenderer(), data, args.repeat)
+    fast_time, fast_bytes = measure(FastJSONRenderer(), data, args.repeat)
+
+    megabytes = len(baseline_bytes) / 1e6
+    print(f"Payload: {args.images} images, {megabytes:.2f} MB")
+    print(f"JSONRenderer:     {baseline_time * 1000:8.1f} ms  {megabytes / baseline_time:8.1f} MB/s")
+    print(f"FastJSONRenderer: {fast_time * 1000:8.1f} ms  {megabytes / fast_time:8.1f} MB/s")
+    print(f"Speedup:          {baseline_time / fast_time:8.1f}x")
+    print(f"Byte-identical:   {baseline_bytes == fast_bytes}")
+    return 0 if baseline_bytes == fast_bytes else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
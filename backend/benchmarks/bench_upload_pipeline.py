@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+Benchmark the image upload pipeline.
+
+Generates synthetic JPEG, MPO and PNG inputs (4:3, with EXIF) at several
+megapixel sizes and measures convert_mpo_to_jpeg, extract_image_metadata,
+process_uploaded_image and a full ImageUploadView round trip (multipart
+parsing, decoding, storage write and database insert) for each. Inputs are
+wrapped the way Django hands them to views: in memory up to
+FILE_UPLOAD_MAX_MEMORY_SIZE, spooled to a temporary file above it.
+
+Per case it records:
+    wall_ms       - median and best wall time over --repeat runs
+    cpu_ms        - median process CPU time (all threads)
+    peak_rss_mb   - peak resident set size during the runs (Linux: the
+                    high-water mark is reset before each case)
+    copied_bytes  - peak bytes allocated through Python (upload reads,
+                    BytesIO/ContentFile copies), from one traced run
+
+Results are written as JSON; --compare checks them against an earlier run
+and exits non-zero if any case got slower than --tolerance allows.
+
+Usage (from the backend directory):
+    python benchmarks/bench_upload_pipeline.py --sizes 1,12 --repeat 3
+    python benchmarks/bench_upload_pipeline.py --output after.json --compare before.json
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mask_generator.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import PIL  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from api.models import Image, Mask  # noqa: E402
+from api.utils.image_processing import (  # noqa: E402
+    convert_mpo_to_jpeg, extract_image_metadata, process_uploaded_image
+)
+from api.views import ImageUploadView  # noqa: E402
+
+
+CONTENT_TYPES = {'jpeg': 'image/jpeg', 'mpo': 'image/jpeg', 'png': 'image/png'}
+EXTENSIONS = {'jpeg': '.jpg', 'mpo': '.mpo', 'png': '.png'}
+
+
+def make_image_bytes(megapixels, kind):
+    """
+    Encode a synthetic 4:3 photo-like image.
+
+    Noise keeps the encoded size close to a real photo's; MPO files get a
+    second, shifted frame like a stereo camera's.
+    """
+    width = round(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = round(width * 3 / 4)
+    noise = PILImage.effect_noise((width, height), 48)
+    image = PILImage.merge('RGB', (
+        noise,
+        noise.transpose(PILImage.Transpose.FLIP_LEFT_RIGHT),
+        noise.transpose(PILImage.Transpose.FLIP_TOP_BOTTOM),
+    ))
+    exif = PILImage.Exif()
+    exif[0x010F] = 'FUJIFILM'  # Make
+    exif[0x0110] = 'FinePix REAL 3D W3'  # Model
+    exif[0x0132] = '2025:03:19 10:00:00'  # DateTime
+
+    buffer = io.BytesIO()
+    if kind == 'mpo':
+        second = image.transform(image.size, PILImage.Transform.AFFINE, (1, 0, 8, 0, 1, 0))
+        image.save(buffer, 'MPO', save_all=True, append_images=[second], exif=exif, quality=90)
+    elif kind == 'jpeg':
+        image.save(buffer, 'JPEG', exif=exif, quality=90)
+    else:
+        image.save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def make_upload(data, name, content_type):
+    """Wrap bytes the way Django's upload handlers would."""
+    if len(data) <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        return InMemoryUploadedFile(io.BytesIO(data), 'file', name, content_type, len(data), None)
+    upload = TemporaryUploadedFile(name, content_type, len(data), None)
+    upload.write(data)
+    upload.seek(0)
+    return upload
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark; returns False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def read_peak_rss():
+    """Return the peak RSS in bytes (since the last reset where supported)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(run, repeat):
+    """
+    Time `run` (a callable taking no arguments) and record its resource use.
+
+    Returns:
+        A dictionary of the metrics described in the module docstring
+    """
+    run()  # Warm up imports, plugin registration and caches
+    resettable = reset_peak_rss()
+    walls, cpus = [], []
+    for _ in range(repeat):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        run()
+        walls.append(time.perf_counter() - start)
+        cpus.append(time.process_time() - cpu_start)
+    peak_rss = read_peak_rss()
+
+    tracemalloc.start()
+    try:
+        run()
+        _, copied = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': statistics.median(walls) * 1000,
+        'best_wall_ms': min(walls) * 1000,
+        'cpu_ms': statistics.median(cpus) * 1000,
+        'peak_rss_mb': peak_rss / 1e6,
+        'peak_rss_is_per_case': resettable,
+        'copied_bytes': copied,
+    }
+
+
+def upload_round_trip(data, name, content_type):
+    """Post an upload through ImageUploadView and delete what it created."""
+    request = APIRequestFactory().post('/api/images/upload/', {
+        'file': make_upload(data, name, content_type),
+    }, format='multipart')
+    response = ImageUploadView.as_view()(request)
+    # The request handler would close (and unlink) spooled uploads
+    for uploaded_file in request.FILES.values():
+        uploaded_file.close()
+    if response.status_code != 201:
+        raise RuntimeError(f"Upload failed with {response.status_code}: {response.data}")
+    Image.objects.get(pk=response.data['id']).delete()
+
+
+def run_suite(sizes, kinds, repeat):
+    """Run every benchmark case and return the list of results."""
+    results = []
+    for megapixels in sizes:
+        for kind in kinds:
+            data = make_image_bytes(megapixels, kind)
+            name = f"bench_{megapixels}mp{EXTENSIONS[kind]}"
+            content_type = CONTENT_TYPES[kind]
+
+            def fresh_upload():
+                return make_upload(data, name, content_type)
+
+            cases = [
+                ('convert_mpo_to_jpeg', lambda: convert_mpo_to_jpeg(fresh_upload())),
+                ('extract_image_metadata', lambda: extract_image_metadata(fresh_upload())),
+                ('process_uploaded_image', lambda: process_uploaded_image(fresh_upload())),
+            ]
+            if kind != 'png':  # The upload endpoint only accepts JPEG and MPO
+                cases.append(('ImageUploadView', lambda: upload_round_trip(data, name, content_type)))
+
+            for function, run in cases:
+                result = {
+                    'name': f"{function}[{kind}-{megapixels}MP]",
+                    'function': function,
+                    'format': kind,
+                    'megapixels': megapixels,
+                    'input_bytes': len(data),
+                    **measure(run, repeat),
+                }
+                results.append(result)
+                print(f"{result['name']:<42} {result['wall_ms']:9.1f} ms  "
+                      f"cpu {result['cpu_ms']:9.1f} ms  rss {result['peak_rss_mb']:7.1f} MB  "
+                      f"copied {result['copied_bytes'] / 1e6:7.1f} MB")
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Print per-case wall time ratios against a baseline results file.
+
+    Returns:
+        The names of cases slower than the baseline by more than `tolerance`
+    """
+    with open(baseline_path) as f:
+        baseline = {result['name']: result for result in json.load(f)['results']}
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        before = baseline.get(result['name'])
+        if before is None:
+            continue
+        ratio = result['wall_ms'] / before['wall_ms'] if before['wall_ms'] else 1.0
+        flag = ''
+        if ratio > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(result['name'])
+        print(f"{result['name']:<42} {before['wall_ms']:9.1f} -> {result['wall_ms']:9.1f} ms "
+              f"({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,12,24,48', help='Comma-separated megapixel sizes')
+    parser.add_argument('--formats', default='jpeg,mpo,png', help='Comma-separated input formats')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (median is reported)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=1.2,
+                        help='Slowdown ratio counted as a regression (default: 1.2)')
+    args = parser.parse_args()
+
+    sizes = [float(size) if '.' in size else int(size) for size in args.sizes.split(',')]
+    kinds = args.formats.split(',')
+
+    temp_dir = tempfile.TemporaryDirectory()
+    connection.creation.create_test_db(verbosity=0)
+    patchers = [
+        patch.object(model._meta.get_field('file').storage, 'location', os.path.join(temp_dir.name, name))
+        for model, name in ((Image, 'images'), (Mask, 'masks'))
+    ]
+    for patcher in patchers:
+        patcher.start()
+    try:
+        results = run_suite(sizes, kinds, args.repeat)
+    finally:
+        for patcher in patchers:
+            patcher.stop()
+        connection.creation.destroy_test_db(connection.settings_dict['NAME'], verbosity=0)
+        temp_dir.cleanup()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'django': django.get_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed beyond {args.tolerance}x")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,9 +59,16 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',     # For handling form data
         'rest_framework.parsers.MultiPartParser',  # For handling file uploads (crucial for our image uploads)
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',  # orjson-backed when installed, plain JSONRenderer otherwise
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 MIDDLEWARE = [
+    'api.utils.timing.ServerTimingMiddleware',  # First, so 'total' covers the other middleware
+    'api.utils.metrics.MetricsMiddleware',
+    'api.utils.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware should be placed high in the list
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -95,14 +103,117 @@ WSGI_APPLICATION = 'mask_generator.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_PROFILE selects the backend:
+#   'sqlite' (default) - a local file, tuned for concurrent writers (see SQLITE_PRAGMAS)
+#   'postgres' - configured from the POSTGRES_* environment variables, with
+#                persistent connections; POSTGRES_POOL picks the pooling mode:
+#                'none' (persistent connections only), 'django' (psycopg's
+#                in-process pool) or 'pgbouncer' (an external transaction pooler)
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+
+if DATABASE_PROFILE == 'postgres':
+    POSTGRES_POOL = os.environ.get('POSTGRES_POOL', 'none')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'mask_generator'),
+            'USER': os.environ.get('POSTGRES_USER', 'mask_generator'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if POSTGRES_POOL == 'django':
+        # psycopg_pool keeps the connections; persistent connections must be off
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX_SIZE', '20')),
+            'timeout': 10,
+        }
+    elif POSTGRES_POOL == 'pgbouncer':
+        # Transaction pooling can't keep server-side cursors open across statements
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Seconds to wait for the write lock before "database is locked"
+                'timeout': 20,
+            },
+        }
     }
+    import django
+    if django.VERSION >= (5, 1):
+        # Take the write lock when a transaction starts, so concurrent writers
+        # queue on busy_timeout instead of failing on lock upgrade
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Applied to every new SQLite connection by api.utils.db_tuning
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,  # Milliseconds
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The serializer cache stores per-object API representations. CACHE_BACKEND
+# selects where:
+#   'locmem' (default) - per process; fine for one worker or development
+#   'redis' - shared by all workers, at REDIS_URL
+#   'memcached' - shared by all workers, at MEMCACHED_LOCATION (pymemcache)
+# Fragments are keyed by table ChangeVersion, so even per-process caches never
+# serve a fragment older than the last write; sharing only improves hit rates.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        }
+    }
+elif CACHE_BACKEND == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mask-generator',
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+            },
+        }
+    }
+
+SERIALIZER_CACHE_ALIAS = 'default'
+# Seconds a fragment is kept; writes retire fragments sooner through their version
+SERIALIZER_CACHE_TIMEOUT = 300
+
+# Rows fetched per database round trip by the streaming JSON Lines export
+EXPORT_CHUNK_SIZE = 500
+
+# Maximum number of IDs accepted by the bulk image lookup
+BULK_LOOKUP_MAX_IDS = 5000
+
+# Annotation work queue: how long a claimed image stays reserved without activity
+WORK_QUEUE_LEASE_SECONDS = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -144,6 +255,111 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'  # URL prefix for serving media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Where media files are stored on disk
 
+# Hash-prefix directory levels for images/masks (0 = flat, 2 = images/ab/cd/<name>).
+# After changing this, run `python manage.py shard_media` to move existing files.
+MEDIA_SHARD_DEPTH = int(os.environ.get('MEDIA_SHARD_DEPTH', '0'))
+
+# Per-request phase timing (api/utils/timing.py): Server-Timing response
+# headers plus one 'api.timing' log line per instrumented request
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+# Prometheus metrics served at /metrics (api/utils/metrics.py). With several
+# worker processes, point this at a directory shared by them (emptied on each
+# deploy) so a scrape sees every worker; unset keeps values in process memory.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+
+# Query budgets (api/utils/query_budget.py): views declare a maximum query
+# count per request, and a query shape run QUERY_REPEAT_THRESHOLD times in one
+# request is flagged as a likely N+1. Problems are logged to 'api.queries', or
+# raised when strict - as under `manage.py test` and pytest (conftest.py), so
+# regressions fail tests.
+QUERY_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_STRICT = sys.argv[1:2] == ['test'] or (
+    os.environ.get('QUERY_BUDGET_STRICT', '').lower() in ('1', 'true', 'yes')
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'api.queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'api.memory': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Upload admission control (api/utils/admission.py): decoding is admitted
+# against a per-process budget of pixels in flight (~3 bytes each once
+# decoded). Requests beyond UPLOAD_MAX_QUEUED waiting, or waiting longer than
+# UPLOAD_QUEUE_TIMEOUT seconds, get 503 with Retry-After.
+UPLOAD_MAX_PIXELS_IN_FLIGHT = int(os.environ.get('UPLOAD_MAX_PIXELS_IN_FLIGHT', 150_000_000))
+UPLOAD_MAX_QUEUED = 32
+UPLOAD_QUEUE_TIMEOUT = 10
+
+# Decode memory guard (api/utils/memory.py): MPO uploads whose decoded pixels
+# would exceed this many bytes have their first frame copied out as-is (or are
+# decoded at reduced resolution) instead of being fully decoded and re-encoded
+UPLOAD_MEMORY_BUDGET = int(os.environ.get('UPLOAD_MEMORY_BUDGET', 256 * 1024 * 1024))
+
+# Opt-in tracemalloc profiling of image processing: logs peak traced memory
+# and the PROFILE_IMAGE_MEMORY_TOP source lines holding the most new memory to
+# 'api.memory'. Slows allocation down; enable on one worker while diagnosing.
+PROFILE_IMAGE_MEMORY = os.environ.get('PROFILE_IMAGE_MEMORY', '').lower() in ('1', 'true', 'yes')
+PROFILE_IMAGE_MEMORY_TOP = 10
+
+# Idempotency-Key handling for upload and mask save (api/utils/idempotency.py):
+# how long (seconds) completed responses are replayed to retries, and how long
+# a key stays locked by a request that never completed
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_SECONDS = 300
+
+# Async views (api/async_views.py): CPU-bound decoding runs in a bounded pool
+# ('thread' or 'process'), file I/O in a separate thread pool
+ASYNC_DECODE_POOL = os.environ.get('ASYNC_DECODE_POOL', 'thread')
+ASYNC_DECODE_WORKERS = None  # Defaults to the CPU count
+ASYNC_MAX_PENDING_DECODES = 64  # Decodes admitted at once per event loop
+ASYNC_IO_WORKERS = 32
+
+# How MediaView sends files: 'python' (FileResponse, sendfile where the WSGI
+# server supports it), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd).
+# For nginx, map MEDIA_ACCEL_REDIRECT_PREFIX to MEDIA_ROOT in an `internal` location.
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'python')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+# Only serve media to users logged in with a Django session (anonymous requests
+# get 403). Off by default: the frontend sends no credentials with media requests.
+MEDIA_REQUIRE_AUTH = os.environ.get('MEDIA_REQUIRE_AUTH', '').lower() in ('1', 'true', 'yes')
+MEDIA_MAX_AGE = 0  # Media is revalidated with ETag/Last-Modified (names are reused)
+
+# Append new masks to large pack files (indexed in the PackedBlob table) instead
+# of one file per mask. Existing loose mask files stay readable. Reclaim the
+# space of overwritten masks with `python manage.py compact_packs`.
+MASK_PACK_STORE = os.environ.get('MASK_PACK_STORE', '').lower() in ('1', 'true', 'yes')
+MASK_PACK_DIR = os.path.join(MEDIA_ROOT, 'packs')
+MASK_PACK_MAX_BYTES = 256 * 1024 * 1024  # Start a new pack beyond this size
+MASK_PACK_FSYNC = False  # fsync every append (durable, but slower)
+
+# Where images and masks are kept: 'filesystem' (MEDIA_ROOT) or 's3' (any
+# S3-compatible object store, configured below)
+MEDIA_STORAGE_BACKEND = os.environ.get('MEDIA_STORAGE_BACKEND', 'filesystem')
+MEDIA_OBJECT_STORAGE = {
+    'ENDPOINT_URL': os.environ.get('MEDIA_S3_ENDPOINT_URL', 'http://127.0.0.1:9000'),
+    'BUCKET': os.environ.get('MEDIA_S3_BUCKET', 'mask-generator'),
+    'ACCESS_KEY': os.environ.get('MEDIA_S3_ACCESS_KEY', ''),
+    'SECRET_KEY': os.environ.get('MEDIA_S3_SECRET_KEY', ''),
+    'REGION': os.environ.get('MEDIA_S3_REGION', 'us-east-1'),
+    'PUBLIC_URL': os.environ.get('MEDIA_S3_PUBLIC_URL'),  # None serves through MEDIA_URL
+    'MAX_CONNECTIONS': 16,  # Pooled keep-alive connections
+    'MULTIPART_THRESHOLD': 8 * 1024 * 1024,  # Larger uploads use multipart
+    'MULTIPART_CHUNK_SIZE': 8 * 1024 * 1024,
+    'READ_CHUNK_SIZE': 256 * 1024,  # Ranged-read window for opened files
+    # Seconds exists()/size() results for existing objects are cached, per
+    # process: another worker's overwrite or delete shows after at most this long
+    'METADATA_CACHE_TTL': 5,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,14 @@
+"""
+Django settings for the test suite (used by pytest, see pyproject.toml).
+
+Tests must never touch the development data: the database is pytest-django's
+own test database rather than db.sqlite3, and media is written to a temporary
+directory instead of backend/media (conftest.py removes it afterwards).
+"""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='mask_generator_media_')
+MASK_PACK_DIR = os.path.join(MEDIA_ROOT, 'packs')
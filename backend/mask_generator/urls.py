@@ -4,15 +4,16 @@ URL configuration for mask_generator project.
 This file defines the top-level URL routing for the entire project, including:
 1. Django admin interface
 2. API endpoints
-3. Media file serving (in development)
+3. Media file serving
+4. Prometheus metrics
 
 For more details on Django URL routing, see:
 https://docs.djangoproject.com/en/5.1/topics/http/urls/
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from api.views import MediaView, MetricsView
 
 urlpatterns = [
     # Django admin interface
@@ -20,9 +21,13 @@ urlpatterns = [
     
     # API endpoints - we'll create api/urls.py to define these routes
     path('api/', include('api.urls')),
+    
+    # Prometheus scrape endpoint (see api/utils/metrics.py)
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
-# Add URL patterns for serving media files in development
-# In production, these would typically be served by the web server directly
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Media files are authorized by the API and then streamed or handed off to the
+# web server (see MEDIA_SERVE_MODE), with byte-range and cache header support
+urlpatterns += [
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", MediaView.as_view(), name='media'),
+]
@@ -2,14 +2,23 @@
 
 This script will be the way to reset the state on the tracking of completed images. In a future iteration,
 we should have a mechanism that allows users to re-upload images that they have previously completed so
-they can improve masks if needed without resetting the DB. For now, we just need to do a manual reset. This
-will not affect the actual images stored in the filesystem, just the tracking of completed images in the database.
+they can improve masks if needed without resetting the DB. For now, we just need to do a manual reset.
+
+Deleting through the ORM fires the per-row pre_delete handlers, which also remove each file from storage.
+For large databases pass --fast: rows are removed with batched raw DELETEs and files are removed on a
+thread pool (or kept with --keep-files), with progress reporting:
+
+    python remove_entries_from_db.py --force --fast --workers 16
+    python remove_entries_from_db.py --force --fast --keep-files
 """
 
 
 import os
 import sys
+import time
+import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import NoReturn, Optional
 
 # Configure logging
@@ -19,13 +28,127 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def clean_database(confirm: bool = False) -> None:
+def delete_in_batches(model, batch_size: int, on_batch) -> int:
+    """
+    Delete every row of a model with raw batched DELETEs, bypassing signals.
+    
+    Each batch reads the next `batch_size` primary keys and file names,
+    deletes that primary key range in one statement, and hands the names
+    to `on_batch`.
+    
+    Args:
+        model: The model whose table is emptied
+        batch_size: Rows deleted per statement
+        on_batch: Callable receiving (list of pks, list of file names) per batch
+    
+    Returns:
+        The number of rows deleted
+    """
+    from django.db import connection, transaction
+    
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk_column = connection.ops.quote_name(model._meta.pk.column)
+    deleted = 0
+    while True:
+        rows = list(model.objects.order_by('pk').values_list('pk', 'file')[:batch_size])
+        if not rows:
+            return deleted
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table} WHERE {pk_column} <= %s", [rows[-1][0]])
+                deleted += cursor.rowcount
+        on_batch([pk for pk, _ in rows], [name for _, name in rows if name])
+
+
+def fast_reset(batch_size: int = 5000, workers: int = 8, keep_files: bool = False) -> dict:
+    """
+    Delete all images, masks and leases without loading rows into Python.
+    
+    Bulk deletes skip the model signals, so afterwards the change versions are
+    bumped (changing the list ETags) and the progress counters are reconciled.
+    Cached serializer fragments of the deleted rows are never read again and
+    expire on their own.
+    
+    Args:
+        batch_size: Rows deleted per statement
+        workers: Threads removing files in parallel with the deletes
+        keep_files: If True, leave the files in storage (gc_media can remove them later)
+    
+    Returns:
+        A dictionary with the numbers of rows and files removed
+    """
+    from django.db import connection
+    from api.models import Image, Mask, ImageLease, IdempotencyKey, ChangeVersion, StatCounter
+    from api.utils import progress_stats
+    
+    totals = {'leases': 0, 'masks': 0, 'images': 0, 'files': 0}
+    started = time.monotonic()
+    
+    # Leases reference images and are few; clear them in one statement.
+    # Stored idempotent responses would replay rows that no longer exist.
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(ImageLease._meta.db_table)}")
+        totals['leases'] = cursor.rowcount
+        cursor.execute(f"DELETE FROM {connection.ops.quote_name(IdempotencyKey._meta.db_table)}")
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        file_jobs = []
+        
+        # Masks first: they reference images
+        for model, key in ((Mask, 'masks'), (Image, 'images')):
+            storage = model._meta.get_field('file').storage
+            total = model.objects.count()
+            
+            def on_batch(pks, names):
+                if not keep_files:
+                    # The pack index lives in the database, so drop packed blobs on
+                    # this thread; the workers only ever touch files
+                    packed = storage.pack_store.delete_many(names) if storage.pack_store else set()
+                    file_jobs.append(executor.submit(_remove_files, storage, names, packed))
+                totals[key] += len(pks)
+                elapsed = time.monotonic() - started
+                logger.info(f"{model.__name__}: {totals[key]}/{total} rows deleted "
+                            f"({totals[key] / elapsed if elapsed else 0:.0f} rows/s)")
+            
+            delete_in_batches(model, batch_size, on_batch)
+        
+        for job in file_jobs:
+            totals['files'] += job.result()
+    
+    ChangeVersion.bump('mask')
+    ChangeVersion.bump('image')
+    progress_stats.reconcile(Image, Mask, StatCounter)
+    
+    logger.info(f"Removed {totals['images']} images, {totals['masks']} masks, {totals['leases']} leases"
+                f" and {totals['files']} files in {time.monotonic() - started:.1f}s")
+    return totals
+
+
+def _remove_files(storage, names: list, packed: set = frozenset()) -> int:
+    """Delete stored files, returning how many existed (as files or as the `packed` blobs)."""
+    removed = 0
+    for name in names:
+        try:
+            if storage.delete_file(name) or name in packed:
+                removed += 1
+        except OSError as exc:
+            logger.warning(f"Could not remove {name}: {exc}")
+    return removed
+
+
+def clean_database(confirm: bool = False, fast: bool = False, keep_files: bool = False,
+                   batch_size: int = 5000, workers: int = 8) -> None:
     """
     Delete all Image and Mask objects from the database.
     
     Args:
         confirm: If True, performs deletion without confirmation prompt.
                If False (default), asks for user confirmation.
+        fast: If True, use batched raw deletes (see fast_reset) instead of
+              per-row ORM deletes
+        keep_files: With fast, leave the image and mask files in storage
+        batch_size: With fast, rows deleted per statement
+        workers: With fast, threads removing files
     
     Raises:
         ImportError: If Django or models cannot be imported
@@ -40,7 +163,7 @@ def clean_database(confirm: bool = False) -> None:
         django.setup()
         
         # Import models after Django setup
-        from api.models import Image, Mask
+        from api.models import Image, Mask, IdempotencyKey
         
         # Count objects before deletion
         image_count_before = Image.objects.count()
@@ -56,11 +179,15 @@ def clean_database(confirm: bool = False) -> None:
                 return
         
         # Perform deletion
-        logger.info("Deleting all masks...")
-        Mask.objects.all().delete()
-        
-        logger.info("Deleting all images...")
-        Image.objects.all().delete()
+        if fast:
+            fast_reset(batch_size=batch_size, workers=workers, keep_files=keep_files)
+        else:
+            logger.info("Deleting all masks...")
+            Mask.objects.all().delete()
+            
+            logger.info("Deleting all images...")
+            Image.objects.all().delete()
+            IdempotencyKey.objects.all().delete()
         
         # Count objects after deletion
         image_count_after = Image.objects.count()
@@ -84,13 +211,24 @@ def main() -> NoReturn:
     
     You can pass "--force" as an argument to skip confirmation prompt.
     """
-    force_deletion = "--force" in sys.argv
+    parser = argparse.ArgumentParser(description="Delete all images and masks from the database")
+    parser.add_argument('--force', action='store_true', help="Skip the confirmation prompt")
+    parser.add_argument('--fast', action='store_true',
+                        help="Use batched raw deletes and parallel file removal")
+    parser.add_argument('--keep-files', action='store_true',
+                        help="With --fast, leave image and mask files in storage")
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help="With --fast, rows deleted per statement (default: 5000)")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="With --fast, threads removing files (default: 8)")
+    args = parser.parse_args()
     
     try:
-        clean_database(confirm=force_deletion)
+        clean_database(confirm=args.force, fast=args.fast, keep_files=args.keep_files,
+                       batch_size=args.batch_size, workers=args.workers)
     except Exception as e:
         logger.error(f"Error: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
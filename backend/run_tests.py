@@ -11,7 +11,7 @@ from django.test.utils import get_runner
 
 if __name__ == "__main__":
     # Set up Django settings
-    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mask_generator.settings")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mask_generator.test_settings")
     django.setup()
     
     # Get the test runner